@@ -0,0 +1,232 @@
+"""
+Non-blocking logging pipeline.
+
+Loggers write to ``QueuedHandler``, which only puts the record on an in-memory
+queue; one listener thread drains it into the real handlers (console, the
+rotating file), so request threads never wait on file I/O or a handler lock.
+If the queue fills up, records are dropped and counted instead of blocking.
+
+Also here: ``JsonFormatter`` (one JSON object per line), ``RequestIdFilter``
+and ``RequestLogMiddleware`` (request id and duration on every record),
+``SamplingFilter`` (keep a fraction of noisy DEBUG records per logger) and
+``SizeAndTimeRotatingFileHandler``.
+"""
+import atexit
+import json
+import logging
+import os
+import queue
+import random
+import re
+import threading
+import time
+import uuid
+from contextvars import ContextVar
+from datetime import datetime, timedelta, timezone
+from logging.handlers import QueueHandler, QueueListener, RotatingFileHandler
+
+from asgiref.sync import iscoroutinefunction, markcoroutinefunction
+
+_request_id = ContextVar('request_id', default=None)
+
+# Attributes every LogRecord has; anything else on a record came from ``extra``
+_RECORD_ATTRS = set(vars(logging.LogRecord('', 0, '', 0, '', (), None))) | {'message', 'asctime'}
+
+
+def _get_handler(name):
+    if hasattr(logging, 'getHandlerByName'):
+        return logging.getHandlerByName(name)
+    return logging._handlers.get(name)
+
+
+class QueuedHandler(QueueHandler):
+    """
+    Use with dictConfig's ``'()'`` key; ``handlers`` names the handlers the
+    listener thread writes to.  dictConfig sets handlers up in name order, so
+    those must sort before this one.  The thread starts on the first record,
+    so it also starts in processes forked after configuration (runserver's
+    reloader).
+    """
+
+    def __init__(self, handlers=(), queue_size=10000):
+        super().__init__(queue.Queue(maxsize=queue_size))
+        # Strong references: the logging registry only holds handlers weakly
+        self.targets = []
+        for name in handlers:
+            handler = _get_handler(name)
+            if handler is None:
+                raise ValueError(f"Handler '{name}' is not configured yet; it must sort before the queue handler")
+            self.targets.append(handler)
+        self.listener = None
+        self.dropped = 0
+        self._start_lock = threading.Lock()
+        self._pid = None
+
+    def _ensure_listener(self):
+        if self.listener is not None and self._pid == os.getpid():
+            return
+        with self._start_lock:
+            if self.listener is not None and self._pid == os.getpid():
+                return
+            self.listener = QueueListener(self.queue, *self.targets, respect_handler_level=True)
+            self.listener.start()
+            self._pid = os.getpid()
+            atexit.register(self.stop)
+
+    def prepare(self, record):
+        # Resolve the message and traceback here, in the logging thread, but
+        # keep the record otherwise intact for the JSON formatter
+        record = logging.makeLogRecord(record.__dict__)
+        record.message = record.getMessage()
+        record.msg, record.args = record.message, None
+        if record.exc_info:
+            if not record.exc_text:
+                record.exc_text = logging.Formatter().formatException(record.exc_info)
+            record.exc_info = None
+        return record
+
+    def enqueue(self, record):
+        try:
+            self.queue.put_nowait(record)
+        except queue.Full:
+            self.dropped += 1
+
+    def emit(self, record):
+        self._ensure_listener()
+        super().emit(record)
+
+    def stop(self):
+        if self.listener is not None and self._pid == os.getpid():
+            self.listener.stop()
+            self.listener = None
+
+
+class SizeAndTimeRotatingFileHandler(RotatingFileHandler):
+    """
+    ``RotatingFileHandler`` that also rolls over at local midnight, so each
+    backup (``debug.log.1`` ... ``debug.log.<backupCount>``) holds at most one
+    day and at most ``maxBytes``.
+    """
+
+    def __init__(self, filename, daily=True, **kwargs):
+        super().__init__(filename, **kwargs)
+        self.daily = daily
+        self.rollover_at = self._next_midnight()
+
+    def _next_midnight(self):
+        tomorrow = datetime.now().date() + timedelta(days=1)
+        return datetime.combine(tomorrow, datetime.min.time()).timestamp()
+
+    def shouldRollover(self, record):
+        if self.daily and record.created >= self.rollover_at:
+            return True
+        return super().shouldRollover(record)
+
+    def doRollover(self):
+        super().doRollover()
+        self.rollover_at = self._next_midnight()
+
+
+class JsonFormatter(logging.Formatter):
+    def format(self, record):
+        entry = {
+            'ts': datetime.fromtimestamp(record.created, tz=timezone.utc).isoformat(timespec='milliseconds'),
+            'level': record.levelname,
+            'logger': record.name,
+            'message': record.getMessage(),
+            'module': record.module,
+            'line': record.lineno,
+            'process': record.process,
+            'thread': record.thread,
+        }
+        for key, value in record.__dict__.items():
+            if key not in _RECORD_ATTRS and key != 'request':
+                entry[key] = value
+        if record.exc_info and not record.exc_text:
+            record.exc_text = self.formatException(record.exc_info)
+        if record.exc_text:
+            entry['exc'] = record.exc_text
+        return json.dumps(entry, default=str)
+
+
+class RequestIdFilter(logging.Filter):
+    """Stamps records with the id of the request being handled, if any."""
+
+    def filter(self, record):
+        if not hasattr(record, 'request_id'):
+            # django.request logs errors after the middleware has returned
+            request = getattr(record, 'request', None)
+            record.request_id = _request_id.get() or getattr(request, 'request_id', None)
+        return True
+
+
+class SamplingFilter(logging.Filter):
+    """
+    Keeps only a fraction of DEBUG records for the loggers in ``rates``
+    (``{'rest_framework': 0.1}``; the longest matching prefix wins).
+    INFO and above always pass.
+    """
+
+    def __init__(self, rates=None, name=''):
+        super().__init__(name)
+        self.rates = sorted((rates or {}).items(), key=lambda item: len(item[0]), reverse=True)
+
+    def filter(self, record):
+        if record.levelno > logging.DEBUG:
+            return True
+        for prefix, rate in self.rates:
+            if record.name == prefix or record.name.startswith(prefix + '.'):
+                return random.random() < rate
+        return True
+
+
+_REQUEST_ID_RE = re.compile(r'^[A-Za-z0-9._-]{1,64}$')
+request_logger = logging.getLogger('ecom.request')
+
+
+class RequestLogMiddleware:
+    """
+    Assigns each request an id (reusing a sane incoming X-Request-ID), returns
+    it in the response and logs one line per request with its duration.
+    """
+
+    sync_capable = True
+    async_capable = True
+
+    def __init__(self, get_response):
+        self.get_response = get_response
+        if iscoroutinefunction(get_response):
+            markcoroutinefunction(self)
+
+    def __call__(self, request):
+        if iscoroutinefunction(self):
+            return self.__acall__(request)
+        token = self._start(request)
+        start = time.perf_counter()
+        try:
+            return self._finish(request, self.get_response(request), start)
+        finally:
+            _request_id.reset(token)
+
+    async def __acall__(self, request):
+        token = self._start(request)
+        start = time.perf_counter()
+        try:
+            return self._finish(request, await self.get_response(request), start)
+        finally:
+            _request_id.reset(token)
+
+    def _start(self, request):
+        incoming = request.headers.get('X-Request-ID', '')
+        request_id = incoming if _REQUEST_ID_RE.match(incoming) else uuid.uuid4().hex
+        request.request_id = request_id
+        return _request_id.set(request_id)
+
+    def _finish(self, request, response, start):
+        duration_ms = round((time.perf_counter() - start) * 1000, 2)
+        response['X-Request-ID'] = request.request_id
+        request_logger.info(
+            "%s %s %s", request.method, request.path, response.status_code,
+            extra={'duration_ms': duration_ms, 'status_code': response.status_code},
+        )
+        return response
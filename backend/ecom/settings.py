@@ -10,10 +10,14 @@ For the full list of settings and their values, see
 https://docs.djangoproject.com/en/5.2/ref/settings/
 """
 
+from importlib.util import find_spec
 from pathlib import Path
 import os
+import sys
 from datetime import timedelta
 
+from django.core.exceptions import ImproperlyConfigured
+
 # Build paths inside the project like this: BASE_DIR / 'subdir'.
 BASE_DIR = Path(__file__).resolve().parent.parent
 
@@ -46,6 +50,12 @@ INSTALLED_APPS = [
 ]
 
 MIDDLEWARE = [
+    # First, so the request id and duration cover everything below it
+    'ecom.log_handlers.RequestLogMiddleware',
+    'shop.performance.PerformanceMiddleware',
+    'shop.nplusone.NPlusOneMiddleware',
+    # Outside everything that may still change the body
+    'shop.compression.CompressionMiddleware',
     'django.middleware.security.SecurityMiddleware',
     'django.contrib.sessions.middleware.SessionMiddleware',
     'corsheaders.middleware.CorsMiddleware',
@@ -54,6 +64,7 @@ MIDDLEWARE = [
     'django.contrib.auth.middleware.AuthenticationMiddleware',
     'django.contrib.messages.middleware.MessageMiddleware',
     'django.middleware.clickjacking.XFrameOptionsMiddleware',
+    'shop.db_router.ReplicaRoutingMiddleware',
 ]
 
 ROOT_URLCONF = 'ecom.urls'
@@ -79,12 +90,93 @@ WSGI_APPLICATION = 'ecom.wsgi.application'
 # Database
 # https://docs.djangoproject.com/en/5.2/ref/settings/#databases
 
-DATABASES = {
-    'default': {
+#
+# Driven by the environment so one settings file serves dev and production:
+#   DJANGO_DB_ENGINE       sqlite (default) | postgresql | mysql
+#   DJANGO_DB_NAME         database name, or the file path for SQLite
+#   DJANGO_DB_USER / DJANGO_DB_PASSWORD / DJANGO_DB_HOST / DJANGO_DB_PORT
+#   DJANGO_DB_CONN_MAX_AGE seconds to keep connections open between requests
+#                          (default 60; manage.py bench_db_connections shows the gain)
+#   DJANGO_DB_POOL         max pool size; enables psycopg 3's connection pool
+#                          (PostgreSQL only, needs "psycopg[pool]"; use with ASGI,
+#                          where persistent per-thread connections do not apply)
+#   DJANGO_DB_REPLICAS     comma-separated read replicas (shop/db_router.py): file
+#                          paths for SQLite, host[:port] for the server databases
+
+DB_ENGINE = os.environ.get('DJANGO_DB_ENGINE', 'sqlite')
+
+if DB_ENGINE == 'sqlite':
+    _default_db = {
         'ENGINE': 'django.db.backends.sqlite3',
-        'NAME': BASE_DIR / 'db.sqlite3',
+        'NAME': os.environ.get('DJANGO_DB_NAME', BASE_DIR / 'db.sqlite3'),
+        'CONN_MAX_AGE': int(os.environ.get('DJANGO_DB_CONN_MAX_AGE', 60)),
+        'OPTIONS': {
+            # WAL lets readers run alongside the single writer; IMMEDIATE
+            # transactions take the write lock up front instead of failing
+            # with "database is locked" when upgrading from a read
+            'init_command': (
+                'PRAGMA journal_mode=WAL;'
+                'PRAGMA synchronous=NORMAL;'
+                'PRAGMA cache_size=-20000;'
+                'PRAGMA temp_store=MEMORY;'
+                'PRAGMA mmap_size=134217728;'
+            ),
+            'transaction_mode': 'IMMEDIATE',
+            'timeout': 20,
+        },
     }
-}
+elif DB_ENGINE in ('postgresql', 'mysql'):
+    _default_db = {
+        'ENGINE': f'django.db.backends.{DB_ENGINE}',
+        'NAME': os.environ.get('DJANGO_DB_NAME', 'ecom'),
+        'USER': os.environ.get('DJANGO_DB_USER', ''),
+        'PASSWORD': os.environ.get('DJANGO_DB_PASSWORD', ''),
+        'HOST': os.environ.get('DJANGO_DB_HOST', 'localhost'),
+        'PORT': os.environ.get('DJANGO_DB_PORT', ''),
+        'CONN_MAX_AGE': int(os.environ.get('DJANGO_DB_CONN_MAX_AGE', 60)),
+        # Ping reused connections once per request so a restarted server
+        # costs one reconnect instead of a failed request
+        'CONN_HEALTH_CHECKS': True,
+        'OPTIONS': {},
+    }
+    if DB_ENGINE == 'mysql':
+        _default_db['OPTIONS'] = {
+            'charset': 'utf8mb4',
+            'init_command': "SET sql_mode='STRICT_TRANS_TABLES'",
+        }
+    elif os.environ.get('DJANGO_DB_POOL'):
+        # requirements.txt pins psycopg2, which Django can't pool with
+        if find_spec('psycopg') is None or find_spec('psycopg_pool') is None:
+            raise ImproperlyConfigured('DJANGO_DB_POOL needs psycopg 3 with its pool: pip install "psycopg[pool]"')
+        # The pool replaces persistent connections; Django requires CONN_MAX_AGE = 0
+        _default_db['CONN_MAX_AGE'] = 0
+        _default_db['OPTIONS']['pool'] = {
+            'min_size': 2,
+            'max_size': int(os.environ['DJANGO_DB_POOL']),
+            'timeout': 10,
+        }
+else:
+    raise ImproperlyConfigured(f"Unsupported DJANGO_DB_ENGINE '{DB_ENGINE}'")
+
+DATABASES = {'default': _default_db}
+
+# Read replicas become aliases replica1, replica2, ... with the primary's settings
+DATABASE_REPLICAS = []
+for _index, _replica in enumerate(filter(None, os.environ.get('DJANGO_DB_REPLICAS', '').split(',')), start=1):
+    _replica = _replica.strip()
+    if DB_ENGINE == 'sqlite':
+        _replica_db = {**_default_db, 'NAME': _replica}
+    else:
+        _host, _, _port = _replica.partition(':')
+        _replica_db = {**_default_db, 'HOST': _host, 'PORT': _port or _default_db['PORT']}
+    DATABASES[f'replica{_index}'] = _replica_db
+    DATABASE_REPLICAS.append(f'replica{_index}')
+
+DATABASE_ROUTERS = ['shop.db_router.PrimaryReplicaRouter']
+
+# Seconds a client keeps reading from the primary after a write (keyed by
+# user id in the cache for authenticated clients, by cookie otherwise)
+REPLICA_STICKY_SECONDS = 5
 
 
 MEDIA_URL = '/media/'
@@ -134,6 +226,11 @@ DEFAULT_AUTO_FIELD = 'django.db.models.BigAutoField'
 
 AUTH_USER_MODEL = 'shop.User'
 
+AUTHENTICATION_BACKENDS = [
+    # Username-or-email login with a single query and a single password hash
+    'shop.backends.UsernameOrEmailBackend',
+]
+
 
 CORS_ALLOWED_ORIGINS = [
     "http://localhost:3000",
@@ -155,21 +252,26 @@ CORS_ALLOW_HEADERS = [
 # REST Framework settings - CORRECTED (no duplicates)
 REST_FRAMEWORK = {
     'DEFAULT_AUTHENTICATION_CLASSES': [
-        'rest_framework_simplejwt.authentication.JWTAuthentication',
+        # JWTAuthentication without the per-request User query on reads
+        'shop.authentication.ClaimsJWTAuthentication',
     ],
     'DEFAULT_PERMISSION_CLASSES': [
         'rest_framework.permissions.IsAuthenticated',
     ],
     'DEFAULT_PAGINATION_CLASS': 'rest_framework.pagination.PageNumberPagination',
     'PAGE_SIZE': 10,
+    # orjson-backed drop-ins for JSONRenderer/JSONParser (see shop/fast_json.py for the differences)
     'DEFAULT_RENDERER_CLASSES': [
-        'rest_framework.renderers.JSONRenderer',
+        'shop.fast_json.FastJSONRenderer',
     ],
     'DEFAULT_PARSER_CLASSES': [
-        'rest_framework.parsers.JSONParser',
+        'shop.fast_json.FastJSONParser',
         'rest_framework.parsers.FormParser',
         'rest_framework.parsers.MultiPartParser',
     ],
+    # Trusted reverse proxies in front of the app. Unset, client addresses come
+    # from REMOTE_ADDR and X-Forwarded-For is ignored (it is client-controlled)
+    'NUM_PROXIES': int(os.environ['DJANGO_NUM_PROXIES']) if os.environ.get('DJANGO_NUM_PROXIES') else None,
 }
 
 # Enhanced JWT settings
@@ -189,9 +291,90 @@ SIMPLE_JWT = {
     'ISSUER': None,
     'JWK_URL': None,
     'LEEWAY': 0,
+    # Rotated-out refresh tokens go to shop.models.RevokedRefreshToken
+    'TOKEN_REFRESH_SERIALIZER': 'shop.token_blacklist.BlacklistTokenRefreshSerializer',
+    'TOKEN_BLACKLIST_SERIALIZER': 'shop.token_blacklist.BlacklistTokenLogoutSerializer',
+}
+
+# Bloom filter in front of the refresh-token blacklist (see shop/token_blacklist.py)
+TOKEN_BLACKLIST = {
+    'BLOOM_CAPACITY': 100000,
+    'BLOOM_ERROR_RATE': 0.001,
+    'SYNC_INTERVAL': 5,
+    'PURGE_INTERVAL': 3600,
+}
+
+# Seconds a User row loaded by ClaimsJWTAuthentication stays in the in-process cache
+JWT_USER_CACHE_TTL = 30
+
+# shop.performance's backends count cache hits and misses for /api/metrics/;
+# use shop.performance.RedisCache for a cache shared between workers
+CACHES = {
+    'default': {
+        'BACKEND': 'shop.performance.LocMemCache',
+    },
+}
+
+# Token-bucket rate limits for login, registration and the contact form.
+# Use shop.throttling.CacheBucketStore with a shared cache when running several workers.
+SHOP_THROTTLE = {
+    'ENABLED': True,
+    'BACKEND': 'shop.throttling.LocalMemoryBucketStore',
+    'CACHE_ALIAS': 'default',
+    'RATES': {
+        'login': '20/min',          # per client IP
+        'login_account': '5/min',   # per username/email being tried
+        'register': '10/hour',
+        'contact': '5/hour',
+    },
 }
 
-# Logging configuration for debugging
+# Route the third-party-bound endpoints to shop.async_views; ecom/asgi.py
+# turns this on, WSGI deployments keep the sync views
+ASYNC_VIEWS = os.environ.get('DJANGO_ASYNC_VIEWS', '') == '1'
+
+# Spans and counters from shop.tracing (payments path); off costs nothing
+SHOP_TRACING = {
+    'ENABLED': os.environ.get('DJANGO_TRACING', '') == '1',
+    'SLOW_SPAN_MS': 500,
+}
+
+# Per-request timings (shop.performance): Server-Timing headers and the
+# Prometheus endpoint at /api/metrics/
+SHOP_PERFORMANCE = {
+    'ENABLED': os.environ.get('DJANGO_PERFORMANCE', '1') == '1',
+    'SERVER_TIMING': DEBUG,
+    'METRICS_TOKEN': os.environ.get('DJANGO_METRICS_TOKEN') or None,
+}
+
+# N+1 query detection (shop.nplusone): logs repeated query shapes per request,
+# or raises in STRICT mode so tests fail on them
+SHOP_NPLUSONE = {
+    'ENABLED': DEBUG,
+    'THRESHOLD': 5,
+    'STRICT': os.environ.get('DJANGO_NPLUSONE_STRICT', '') == '1',
+}
+
+# Response compression (shop.compression): gzip, or brotli when installed,
+# for JSON bodies of at least MIN_SIZE bytes
+SHOP_COMPRESSION = {
+    'ENABLED': os.environ.get('DJANGO_COMPRESSION', '1') == '1',
+    'MIN_SIZE': 1024,
+}
+
+# Conditional GET (shop.conditional): version-based ETags and Last-Modified on
+# the catalog, cart and order endpoints
+SHOP_CONDITIONAL = {
+    'ENABLED': True,
+    'ETAG_VERSION': '1',
+}
+
+# Logging: loggers hand records to the 'queue' handler, which only enqueues
+# them; a single background thread writes them to the console and to a JSON
+# log file rotated nightly or at LOG_MAX_BYTES, whichever comes first
+LOG_MAX_BYTES = int(os.environ.get('DJANGO_LOG_MAX_BYTES', 50 * 1024 * 1024))
+LOG_BACKUP_COUNT = int(os.environ.get('DJANGO_LOG_BACKUP_COUNT', 14))
+
 LOGGING = {
     'version': 1,
     'disable_existing_loggers': False,
@@ -204,6 +387,21 @@ LOGGING = {
             'format': '{levelname} {message}',
             'style': '{',
         },
+        'json': {
+            '()': 'ecom.log_handlers.JsonFormatter',
+        },
+    },
+    'filters': {
+        'request_id': {
+            '()': 'ecom.log_handlers.RequestIdFilter',
+        },
+        # Fraction of DEBUG records kept per logger; INFO and above are never sampled
+        'sampling': {
+            '()': 'ecom.log_handlers.SamplingFilter',
+            'rates': {
+                'rest_framework': 0.1,
+            },
+        },
     },
     'handlers': {
         'console': {
@@ -213,30 +411,49 @@ LOGGING = {
         },
         'file': {
             'level': 'DEBUG',
-            'class': 'logging.FileHandler',
+            'class': 'ecom.log_handlers.SizeAndTimeRotatingFileHandler',
             'filename': os.path.join(BASE_DIR, 'debug.log'),
-            'formatter': 'verbose'
+            'maxBytes': LOG_MAX_BYTES,
+            'backupCount': LOG_BACKUP_COUNT,
+            'delay': True,
+            'formatter': 'json'
+        },
+        'queue': {
+            '()': 'ecom.log_handlers.QueuedHandler',
+            'handlers': ['console', 'file'],
+            'queue_size': 10000,
+            'filters': ['sampling', 'request_id'],
         },
     },
     'loggers': {
         'django': {
-            'handlers': ['console', 'file'],
+            'handlers': ['queue'],
             'level': 'INFO',
             'propagate': True,
         },
+        'ecom': {
+            'handlers': ['queue'],
+            'level': 'INFO',
+            'propagate': False,
+        },
         'shop': {
-            'handlers': ['console', 'file'],
+            'handlers': ['queue'],
             'level': 'DEBUG',
             'propagate': False,
         },
         'rest_framework': {
-            'handlers': ['console', 'file'],
+            'handlers': ['queue'],
             'level': 'DEBUG',
             'propagate': False,
         },
     },
 }
 
+# manage.py test: no line per request, and only server errors from django.request
+if sys.argv[1:2] == ['test']:
+    LOGGING['loggers']['ecom.request'] = {'level': 'WARNING'}
+    LOGGING['loggers']['django.request'] = {'level': 'ERROR'}
+
 # CSRF settings for development
 CSRF_TRUSTED_ORIGINS = [
     "http://localhost:3000",
@@ -256,3 +473,17 @@ CORS_ALLOW_ALL_ORIGINS = True
 
 STRIPE_WEBHOOK_SECRET = 'your-webhook-secret'  # For webhooks later
 
+
+
+# Analytics snapshots (see shop/analytics.py)
+ANALYTICS_SNAPSHOT_DIR = os.path.join(BASE_DIR, 'analytics_snapshots')
+ANALYTICS_SNAPSHOT_KEEP = 2
+
+# Read notifications older than READ_DAYS are folded into summaries and
+# archived (or deleted) by manage.py compact_notifications
+NOTIFICATION_RETENTION = {
+    'READ_DAYS': 30,
+    'MODE': 'archive',
+    'BATCH_SIZE': 1000,
+    'SUMMARIZE': True,
+}
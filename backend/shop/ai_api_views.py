@@ -5,31 +5,37 @@ from django.views.decorators.csrf import csrf_exempt
 from django.views.decorators.http import require_POST, require_GET
 from django.conf import settings
 from openai import OpenAI
+from . import performance
 from .models import SystemSettings  # Import the SystemSettings model
 
-# Fixed function: now generates SEO descriptions (with keywords inside)
-@csrf_exempt
-@require_POST
-def generate_seo_keywords(request):
-    try:
-        # Get system settings with ID=1
-        system_settings = SystemSettings.load()
-        
-        if not system_settings.ai_api_key:
-            return JsonResponse({"error": "AI API key is not configured in system settings"}, status=500)
-        
-        data = json.loads(request.body)
-        product_name = data.get('product_name', '')
-        product_description = data.get('product_description', '')
-        
-        # Initialize the OpenAI client with configuration from system settings
-        client = OpenAI(
-            api_key=system_settings.ai_api_key,
-            base_url=system_settings.ap_api_url or "https://api.deepseek.com/v1"
-        )
-        
-        # Create a prompt for DeepSeek
-        prompt = f"""
+
+def client_options(system_settings):
+    """OpenAI client arguments from system settings (DeepSeek unless overridden)."""
+    return {
+        'api_key': system_settings.ai_api_key,
+        'base_url': system_settings.ap_api_url or "https://api.deepseek.com/v1",
+    }
+
+
+# Building a client costs ~50 ms of CPU (TLS setup); reuse one per key and URL,
+# which also keeps its connections alive between requests
+_clients = {}
+
+
+def get_client(system_settings):
+    options = client_options(system_settings)
+    key = (options['api_key'], options['base_url'])
+    client = _clients.get(key)
+    if client is None:
+        if len(_clients) >= 8:
+            _clients.clear()
+        client = _clients[key] = OpenAI(**options)
+    return client
+
+
+def seo_description_prompt(product_name, product_description):
+    # A prompt for DeepSeek
+    prompt = f"""
         ACT AS AN SEO SPECIALIST AND E-COMMERCE MARKETING EXPERT.
 
         TASK: Write an SEO-friendly product description that naturally includes relevant keywords.
@@ -47,63 +53,16 @@ def generate_seo_keywords(request):
         - Ensure keywords flow naturally (avoid keyword stuffing)
         - Return ONLY the description text (no explanations, no formatting instructions)
         """
-        
-        # Call the API
-        response = client.chat.completions.create(
-            model="deepseek-chat",
-            messages=[{"role": "user", "content": prompt}],
-            temperature=0.7,
-            max_tokens=350
-        )
-        
-        ai_content = response.choices[0].message.content.strip()
-        
-        return JsonResponse({"seo_description": ai_content})
-            
-    except Exception as e:
-        return JsonResponse({"error": str(e)}, status=500)
+    return prompt
 
 
-# Improved content generation function
-@csrf_exempt
-@require_POST
-def generate_content(request):
-    """
-    Generate content based on user instruction - can create descriptions or keywords
-    Expected JSON payload:
-    {
-        "product_info": "Information about the product",
-        "instruction": "What to generate (e.g., 'create SEO keywords' or 'write a product description')"
-    }
-    """
-    try:
-        # Get system settings with ID=1
-        system_settings = SystemSettings.load()
-        
-        if not system_settings.ai_api_key:
-            return JsonResponse({"error": "AI API key is not configured in system settings"}, status=500)
-        
-        data = json.loads(request.body)
-        product_info = data.get('product_info', '')
-        instruction = data.get('instruction', '')
-        
-        if not product_info:
-            return JsonResponse({"error": "product_info is required"}, status=400)
-            
-        if not instruction:
-            return JsonResponse({"error": "instruction is required"}, status=400)
-        
-        # Initialize the OpenAI client with configuration from system settings
-        client = OpenAI(
-            api_key=system_settings.ai_api_key,
-            base_url=system_settings.ap_api_url or "https://api.deepseek.com/v1"
-        )
-        
-        instruction_lower = instruction.lower()
-        
-        if any(word in instruction_lower for word in ['keyword', 'seo', 'search', 'optimization']):
-            # Generate SEO keywords
-            prompt = f"""
+def content_prompt(product_info, instruction):
+    """The prompt and token budget for a generate_content instruction."""
+    instruction_lower = instruction.lower()
+    
+    if any(word in instruction_lower for word in ['keyword', 'seo', 'search', 'optimization']):
+        # Generate SEO keywords
+        prompt = f"""
             ACT AS AN SEO SPECIALIST AND E-COMMERCE MARKETING EXPERT.
 
             TASK: Generate highly relevant SEO keywords for an e-commerce product.
@@ -121,11 +80,11 @@ def generate_content(request):
 
             Return ONLY the comma-separated keywords without any additional text or explanations.
             """
-            max_tokens = 100
-            
-        elif any(word in instruction_lower for word in ['description', 'describe', 'write', 'create content']):
-            # Generate product description with keywords included
-            prompt = f"""
+        max_tokens = 100
+        
+    elif any(word in instruction_lower for word in ['description', 'describe', 'write', 'create content']):
+        # Generate product description with keywords included
+        prompt = f"""
             ACT AS AN E-COMMERCE PRODUCT DESCRIPTION WRITER AND SEO EXPERT.
             
             TASK: Create an engaging and persuasive product description for an e-commerce store that includes SEO keywords.
@@ -143,11 +102,11 @@ def generate_content(request):
             
             Return ONLY the product description without any additional text or explanations.
             """
-            max_tokens = 350
-            
-        else:
-            # Generic content generation based on instruction
-            prompt = f"""
+        max_tokens = 350
+        
+    else:
+        # Generic content generation based on instruction
+        prompt = f"""
             ACT AS AN E-COMMERCE CONTENT CREATOR.
 
             TASK: {instruction}
@@ -162,18 +121,92 @@ def generate_content(request):
 
             Return ONLY the requested content without any additional text or explanations.
             """
-            max_tokens = 300
+        max_tokens = 300
+    return prompt, max_tokens
+
+
+# Fixed function: now generates SEO descriptions (with keywords inside)
+@csrf_exempt
+@require_POST
+def generate_seo_keywords(request):
+    try:
+        # Get system settings with ID=1
+        system_settings = SystemSettings.load()
         
-        response = client.chat.completions.create(
-            model="deepseek-chat",
-            messages=[{"role": "user", "content": prompt}],
-            temperature=0.7,
-            max_tokens=max_tokens
-        )
+        if not system_settings.ai_api_key:
+            return JsonResponse({"error": "AI API key is not configured in system settings"}, status=500)
+        
+        data = json.loads(request.body)
+        product_name = data.get('product_name', '')
+        product_description = data.get('product_description', '')
+        
+        # The OpenAI client for the configuration in system settings
+        client = get_client(system_settings)
+        
+        prompt = seo_description_prompt(product_name, product_description)
+        
+        # Call the API
+        with performance.external('openai'):
+            response = client.chat.completions.create(
+                model="deepseek-chat",
+                messages=[{"role": "user", "content": prompt}],
+                temperature=0.7,
+                max_tokens=350
+            )
+        
+        ai_content = response.choices[0].message.content.strip()
+        
+        return JsonResponse({"seo_description": ai_content})
+            
+    except Exception as e:
+        return JsonResponse({"error": str(e)}, status=500)
+
+
+# Improved content generation function
+@csrf_exempt
+@require_POST
+def generate_content(request):
+    """
+    Generate content based on user instruction - can create descriptions or keywords
+    Expected JSON payload:
+    {
+        "product_info": "Information about the product",
+        "instruction": "What to generate (e.g., 'create SEO keywords' or 'write a product description')"
+    }
+    """
+    try:
+        # Get system settings with ID=1
+        system_settings = SystemSettings.load()
+        
+        if not system_settings.ai_api_key:
+            return JsonResponse({"error": "AI API key is not configured in system settings"}, status=500)
+        
+        data = json.loads(request.body)
+        product_info = data.get('product_info', '')
+        instruction = data.get('instruction', '')
+        
+        if not product_info:
+            return JsonResponse({"error": "product_info is required"}, status=400)
+            
+        if not instruction:
+            return JsonResponse({"error": "instruction is required"}, status=400)
+        
+        # The OpenAI client for the configuration in system settings
+        client = get_client(system_settings)
+        
+        prompt, max_tokens = content_prompt(product_info, instruction)
+        
+        with performance.external('openai'):
+            response = client.chat.completions.create(
+                model="deepseek-chat",
+                messages=[{"role": "user", "content": prompt}],
+                temperature=0.7,
+                max_tokens=max_tokens
+            )
         
         ai_content = response.choices[0].message.content.strip()
         
-        content_type = "keywords" if "keyword" in instruction_lower else "description"
+        content_type = "keywords" if "keyword" in instruction.lower() else "description"
         
         return JsonResponse({
             "content_type": content_type,
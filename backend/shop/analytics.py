@@ -0,0 +1,330 @@
+"""
+Sales analytics computed from columnar snapshots.
+
+Reports never touch the OLTP tables directly: ``export_snapshot`` periodically
+dumps ``Order``/``OrderItem`` into one ``.npy`` file per column and the report
+functions aggregate those arrays with NumPy.  Run the export from cron with
+``python manage.py export_sales_snapshot``.
+"""
+import json
+import os
+import shutil
+import threading
+from datetime import datetime, timezone as dt_timezone
+
+import numpy as np
+from django.conf import settings
+from django.contrib.auth import get_user_model
+
+from .models import Order, OrderItem
+
+LATEST_POINTER = 'LATEST'
+MANIFEST_NAME = 'manifest.json'
+MISSING_ID = -1
+
+STATUS_CODES = {code: index for index, (code, _label) in enumerate(Order.STATUS_CHOICES)}
+
+ITEM_COLUMNS = {
+    'order_id': np.int64,
+    'day': 'datetime64[D]',
+    'status': np.int8,
+    'user_id': np.int64,
+    'product_id': np.int64,
+    'vendor_id': np.int64,
+    'category_id': np.int64,
+    'quantity': np.int64,
+    'amount_cents': np.int64,
+}
+
+ORDER_COLUMNS = {
+    'order_id': np.int64,
+    'day': 'datetime64[D]',
+    'status': np.int8,
+    'user_id': np.int64,
+    'shipping_cents': np.int64,
+    'tax_cents': np.int64,
+    'total_cents': np.int64,
+}
+
+
+class SnapshotNotFound(Exception):
+    pass
+
+
+def get_snapshot_root():
+    return str(settings.ANALYTICS_SNAPSHOT_DIR)
+
+
+def _to_cents(value):
+    return int(round(value * 100)) if value is not None else 0
+
+
+def _to_day(value):
+    return int(value.timestamp()) // 86400
+
+
+def _collect(rows, columns, convert, chunk_size):
+    """Build one array per column from an iterator of rows, chunk by chunk."""
+    chunks = {name: [] for name in columns}
+    buffer = []
+
+    def flush():
+        if not buffer:
+            return
+        for name, values in zip(columns, zip(*buffer)):
+            chunks[name].append(np.asarray(values, dtype=np.int64))
+        buffer.clear()
+
+    for row in rows:
+        buffer.append(convert(row))
+        if len(buffer) >= chunk_size:
+            flush()
+    flush()
+
+    arrays = {}
+    for name, dtype in columns.items():
+        data = np.concatenate(chunks[name]) if chunks[name] else np.empty(0, dtype=np.int64)
+        if dtype == 'datetime64[D]':
+            arrays[name] = data.astype('datetime64[D]')
+        else:
+            arrays[name] = data.astype(dtype)
+    return arrays
+
+
+def _item_row(row):
+    order_id, created, order_status, user_id, product_id, vendor_id, category_id, price, quantity = row
+    return (
+        order_id,
+        _to_day(created),
+        STATUS_CODES.get(order_status, MISSING_ID),
+        user_id if user_id is not None else MISSING_ID,
+        product_id if product_id is not None else MISSING_ID,
+        vendor_id if vendor_id is not None else MISSING_ID,
+        category_id if category_id is not None else MISSING_ID,
+        quantity,
+        _to_cents(price) * quantity,
+    )
+
+
+def _order_row(row):
+    order_id, created, order_status, user_id, shipping_cost, tax, total = row
+    return (
+        order_id,
+        _to_day(created),
+        STATUS_CODES.get(order_status, MISSING_ID),
+        user_id if user_id is not None else MISSING_ID,
+        _to_cents(shipping_cost),
+        _to_cents(tax),
+        _to_cents(total),
+    )
+
+
+def export_snapshot(root=None, chunk_size=2000):
+    """
+    Dump orders and order items into a new snapshot directory and point
+    ``LATEST`` at it.  Returns the manifest that was written.
+    """
+    root = root or get_snapshot_root()
+    generated_at = datetime.now(dt_timezone.utc)
+    name = f"snapshot-{generated_at.strftime('%Y%m%dT%H%M%S%f')}"
+    target = os.path.join(root, name)
+    os.makedirs(target)
+
+    item_rows = OrderItem.objects.order_by().values_list(
+        'order_id', 'order__created', 'order__status', 'order__user_id',
+        'product_id', 'product__vendor_id', 'product__category_id',
+        'price', 'quantity',
+    ).iterator(chunk_size=chunk_size)
+    items = _collect(item_rows, ITEM_COLUMNS, _item_row, chunk_size)
+
+    order_rows = Order.objects.order_by().values_list(
+        'id', 'created', 'status', 'user_id', 'shipping_cost', 'tax', 'total'
+    ).iterator(chunk_size=chunk_size)
+    orders = _collect(order_rows, ORDER_COLUMNS, _order_row, chunk_size)
+
+    for prefix, arrays in (('items', items), ('orders', orders)):
+        for column, array in arrays.items():
+            np.save(os.path.join(target, f'{prefix}.{column}.npy'), array)
+
+    manifest = {
+        'name': name,
+        'generated_at': generated_at.isoformat(),
+        'item_count': int(len(items['order_id'])),
+        'order_count': int(len(orders['order_id'])),
+        # Conversion is buyers over customers: staff and vendor accounts don't count
+        'customer_count': get_user_model().objects.filter(is_active=True, is_customer=True).count(),
+    }
+    with open(os.path.join(target, MANIFEST_NAME), 'w') as fh:
+        json.dump(manifest, fh)
+
+    # Swap the pointer atomically so readers never see a half-written snapshot
+    pointer_tmp = os.path.join(root, LATEST_POINTER + '.tmp')
+    with open(pointer_tmp, 'w') as fh:
+        fh.write(name)
+    os.replace(pointer_tmp, os.path.join(root, LATEST_POINTER))
+
+    _prune_snapshots(root, keep=getattr(settings, 'ANALYTICS_SNAPSHOT_KEEP', 2))
+    return manifest
+
+
+def _prune_snapshots(root, keep):
+    snapshots = sorted(
+        entry for entry in os.listdir(root)
+        if entry.startswith('snapshot-') and os.path.isdir(os.path.join(root, entry))
+    )
+    for entry in snapshots[:-keep] if keep > 0 else []:
+        shutil.rmtree(os.path.join(root, entry), ignore_errors=True)
+
+
+class Snapshot:
+    """Read-only, memory-mapped view of one exported snapshot"""
+
+    def __init__(self, path):
+        self.path = path
+        with open(os.path.join(path, MANIFEST_NAME)) as fh:
+            self.manifest = json.load(fh)
+        try:
+            self.items = self._load('items', ITEM_COLUMNS)
+            self.orders = self._load('orders', ORDER_COLUMNS)
+        except FileNotFoundError as e:
+            raise SnapshotNotFound(f"Snapshot {self.name} predates {os.path.basename(e.filename)}; export a new one")
+
+    def _load(self, prefix, columns):
+        return {
+            column: np.load(os.path.join(self.path, f'{prefix}.{column}.npy'), mmap_mode='r')
+            for column in columns
+        }
+
+    @property
+    def name(self):
+        return self.manifest['name']
+
+
+_snapshot_cache = {}
+_snapshot_lock = threading.Lock()
+
+
+def load_latest_snapshot(root=None):
+    root = root or get_snapshot_root()
+    try:
+        with open(os.path.join(root, LATEST_POINTER)) as fh:
+            name = fh.read().strip()
+    except FileNotFoundError:
+        raise SnapshotNotFound("No analytics snapshot has been exported yet")
+
+    path = os.path.join(root, name)
+    with _snapshot_lock:
+        snapshot = _snapshot_cache.get(path)
+        if snapshot is None:
+            if not os.path.isdir(path):
+                raise SnapshotNotFound(f"Snapshot {name} is missing")
+            # Snapshots are immutable, so only the most recent one is kept open
+            _snapshot_cache.clear()
+            snapshot = _snapshot_cache[path] = Snapshot(path)
+    return snapshot
+
+
+def _mask(columns, statuses, start=None, end=None):
+    status_codes = [STATUS_CODES[s] for s in statuses if s in STATUS_CODES]
+    mask = np.isin(columns['status'], status_codes)
+    if start is not None:
+        mask &= columns['day'] >= np.datetime64(start, 'D')
+    if end is not None:
+        mask &= columns['day'] <= np.datetime64(end, 'D')
+    return mask
+
+
+def _group_sum(keys, weights):
+    """Return (unique keys, summed weights) for a key column."""
+    if not len(keys):
+        return keys[:0], np.zeros(0)
+    unique, inverse = np.unique(keys, return_inverse=True)
+    return unique, np.bincount(inverse, weights=weights, minlength=len(unique))
+
+
+def _cents(value):
+    return round(float(value) / 100, 2)
+
+
+def build_sales_report(snapshot, start=None, end=None, statuses=('C',), top=10):
+    """
+    ``revenue`` and everything broken down by day, vendor, category and
+    product are item sales (price x quantity), so the breakdowns add up to
+    it.  Shipping and tax are reported on their own; ``billed`` is the sum
+    of order totals, i.e. revenue + shipping + tax.
+    """
+    items, orders = snapshot.items, snapshot.orders
+
+    item_mask = _mask(items, statuses, start, end)
+    amounts = np.asarray(items['amount_cents'][item_mask], dtype=np.float64)
+    quantities = np.asarray(items['quantity'][item_mask], dtype=np.float64)
+
+    order_mask = _mask(orders, statuses, start, end)
+    order_days = orders['day'][order_mask]
+    buyers = orders['user_id'][order_mask]
+    buyers = np.unique(buyers[buyers != MISSING_ID])
+
+    order_count = int(order_mask.sum())
+    revenue = float(amounts.sum())
+    shipping = float(orders['shipping_cents'][order_mask].sum())
+    tax = float(orders['tax_cents'][order_mask].sum())
+    billed = float(orders['total_cents'][order_mask].sum())
+    customer_count = snapshot.manifest.get('customer_count') or 0
+
+    days, day_revenue = _group_sum(items['day'][item_mask], amounts)
+    order_day_keys, order_day_counts = _group_sum(order_days, np.ones(order_count))
+    orders_per_day = dict(zip(order_day_keys.tolist(), order_day_counts.tolist()))
+
+    vendors, vendor_revenue = _group_sum(items['vendor_id'][item_mask], amounts)
+    categories, category_revenue = _group_sum(items['category_id'][item_mask], amounts)
+
+    products, product_revenue = _group_sum(items['product_id'][item_mask], amounts)
+    _, product_units = _group_sum(items['product_id'][item_mask], quantities)
+    ranked = np.argsort(-product_revenue, kind='stable')[:top]
+
+    return {
+        'snapshot': snapshot.name,
+        'generated_at': snapshot.manifest['generated_at'],
+        'summary': {
+            'revenue': _cents(revenue),
+            'shipping': _cents(shipping),
+            'tax': _cents(tax),
+            'billed': _cents(billed),
+            'orders': order_count,
+            'average_order_value': _cents(revenue / order_count) if order_count else 0.0,
+            'buyers': int(len(buyers)),
+            'customers': customer_count,
+            'conversion_rate': round(len(buyers) / customer_count, 4) if customer_count else 0.0,
+        },
+        'revenue_by_day': [
+            {
+                'date': day.isoformat(),
+                'revenue': _cents(value),
+                'orders': int(orders_per_day.get(day, 0)),
+            }
+            for day, value in zip(days.tolist(), day_revenue.tolist())
+        ],
+        'revenue_by_vendor': _ranked_groups(vendors, vendor_revenue, 'vendor_id'),
+        'revenue_by_category': _ranked_groups(categories, category_revenue, 'category_id'),
+        'top_products': [
+            {
+                'product_id': _id_or_none(products[i]),
+                'units': int(product_units[i]),
+                'revenue': _cents(product_revenue[i]),
+            }
+            for i in ranked
+        ],
+    }
+
+
+def _id_or_none(value):
+    value = int(value)
+    return None if value == MISSING_ID else value
+
+
+def _ranked_groups(keys, revenue, key_name):
+    order = np.argsort(-revenue, kind='stable')
+    return [
+        {key_name: _id_or_none(keys[i]), 'revenue': _cents(revenue[i])}
+        for i in order
+    ]
@@ -0,0 +1,133 @@
+"""
+Async versions of the views that spend most of their time waiting on third
+parties (DeepSeek/OpenAI, Stripe).  Under ASGI (ecom/asgi.py sets
+``ASYNC_VIEWS``) shop/urls.py routes to these, so a slow upstream holds a
+coroutine rather than a worker thread.  Under WSGI the sync views in
+ai_api_views/payment_views stay in place: Django would run each async view
+in its own event loop, which only adds overhead there.
+
+Where each view still crosses into sync code:
+
+* ``SystemSettings.aload()`` uses ``aget_or_create``.  Django 5.1's async
+  ORM API hands the query to ``sync_to_async`` internally (the database
+  drivers are synchronous), so this is one hop to the request's sync thread.
+* The payment amount's price lookup is an async ORM iteration: the same
+  hop, once per request.
+* ``json.loads`` and the prompt/amount helpers are CPU-only and run inline.
+* The HTTP calls are native async: ``AsyncOpenAI`` and Stripe's ``*_async``
+  methods (httpx), with no thread involved.
+* Metrics, spans and logging are contextvar-based and run inline.
+
+The response bodies and error handling match the sync views.
+"""
+import asyncio
+import json
+import logging
+import weakref
+
+import stripe
+from django.http import JsonResponse
+from django.views.decorators.csrf import csrf_exempt
+from django.views.decorators.http import require_POST
+from openai import AsyncOpenAI
+
+from . import performance, tracing
+from .ai_api_views import client_options, seo_description_prompt
+from .models import Product, SystemSettings
+from .payment_views import item_quantities, order_amount
+
+logger = logging.getLogger(__name__)
+
+
+# Async clients per event loop, as their connection pools belong to one loop
+_clients = weakref.WeakKeyDictionary()
+
+
+def _get_client(system_settings):
+    options = client_options(system_settings)
+    clients = _clients.setdefault(asyncio.get_running_loop(), {})
+    key = (options['api_key'], options['base_url'])
+    client = clients.get(key)
+    if client is None:
+        if len(clients) >= 8:
+            clients.clear()
+        client = clients[key] = AsyncOpenAI(**options)
+    return client
+
+
+async def _complete(system_settings, prompt, max_tokens):
+    client = _get_client(system_settings)
+    with performance.external('openai'):
+        response = await client.chat.completions.create(
+            model="deepseek-chat",
+            messages=[{"role": "user", "content": prompt}],
+            temperature=0.7,
+            max_tokens=max_tokens
+        )
+    return response.choices[0].message.content.strip()
+
+
+@csrf_exempt
+@require_POST
+async def generate_seo_keywords(request):
+    """ai_api_views.generate_seo_keywords without blocking on the API call."""
+    try:
+        system_settings = await SystemSettings.aload()
+
+        if not system_settings.ai_api_key:
+            return JsonResponse({"error": "AI API key is not configured in system settings"}, status=500)
+
+        data = json.loads(request.body)
+        prompt = seo_description_prompt(data.get('product_name', ''), data.get('product_description', ''))
+        ai_content = await _complete(system_settings, prompt, 350)
+
+        return JsonResponse({"seo_description": ai_content})
+
+    except Exception as e:
+        return JsonResponse({"error": str(e)}, status=500)
+
+
+@require_POST
+@csrf_exempt
+async def create_payment_intent(request):
+    """payment_views.create_payment_intent without blocking on Stripe."""
+    try:
+        with tracing.span('payments.create_intent') as intent_span:
+            with tracing.span('payments.settings_load'):
+                system_settings = await SystemSettings.aload()
+
+            if not system_settings.stripe_secret_key:
+                tracing.incr('payments.intent.failure')
+                logger.error("Stripe secret key not configured")
+                return JsonResponse({'error': 'Stripe secret key not configured'}, status=500)
+
+            data = json.loads(request.body)
+
+            with tracing.span('payments.pricing', items=len(data['items'])):
+                quantities = item_quantities(data['items'])
+                prices = {
+                    pk: price async for pk, price in Product.objects.filter(pk__in=quantities, active=True)
+                                                                     .values_list('pk', 'effective_price')
+                }
+                amount = order_amount(quantities, prices)
+            intent_span.set(amount=amount)
+
+            # The key goes with the call: concurrent requests share the module-level stripe.api_key
+            with tracing.span('payments.stripe_call'), performance.external('stripe'):
+                intent = await stripe.PaymentIntent.create_async(
+                    api_key=system_settings.stripe_secret_key,
+                    amount=amount,
+                    currency='usd',
+                    automatic_payment_methods={
+                        'enabled': True,
+                    },
+                )
+        tracing.incr('payments.intent.success')
+        return JsonResponse({
+            'clientSecret': intent['client_secret'],
+            'calculatedAmount': amount  # Send back for debugging
+        })
+    except Exception as e:
+        tracing.incr('payments.intent.failure')
+        logger.warning("create_payment_intent failed: %s", type(e).__name__)
+        return JsonResponse({'error': str(e)}, status=403)
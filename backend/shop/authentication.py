@@ -0,0 +1,179 @@
+"""
+JWT authentication that avoids the per-request ``User`` query.
+
+Tokens issued by ``CustomTokenObtainPairSerializer`` carry the user's role
+claims (see ``add_user_claims``).  For read-only requests
+``ClaimsJWTAuthentication`` builds a ``ClaimsUser`` straight from those claims;
+the full model is only loaded, through a short-TTL in-process cache, when a
+view touches an attribute the token does not carry.  Unsafe methods always get
+a fresh ``User`` row, exactly like the stock ``JWTAuthentication``.
+
+Disabled or demoted accounts and password changes are cut off with
+``revoke_user_tokens`` (called from shop/signals.py), which records a "not
+before" timestamp in the Django cache: tokens issued earlier are rejected on
+every path.  Use a shared cache backend in multi-process
+deployments so revocations reach every worker.
+"""
+import copy
+import threading
+import time
+
+from django.conf import settings
+from django.contrib.auth import get_user_model
+from django.core.cache import cache
+from django.utils.functional import cached_property
+from django.utils.translation import gettext_lazy as _
+from rest_framework.permissions import SAFE_METHODS
+from rest_framework_simplejwt.authentication import JWTAuthentication
+from rest_framework_simplejwt.exceptions import AuthenticationFailed, InvalidToken
+from rest_framework_simplejwt.models import TokenUser
+from rest_framework_simplejwt.settings import api_settings
+
+from .db_router import read_primary_if_pinned
+
+USER_CLAIMS = ('username', 'is_customer', 'is_vendor', 'is_staff', 'is_superuser')
+# Changes that must cut off existing tokens: credentials, and every claim that
+# grants access.  The username claim is display-only and may lag until expiry.
+REVOKING_FIELDS = ('password', 'is_active', 'is_customer', 'is_vendor', 'is_staff', 'is_superuser')
+REVOKED_KEY = 'jwt-revoked-before:{}'
+
+
+def add_user_claims(token, user):
+    """Embed the claims ClaimsUser needs into a freshly issued token."""
+    for claim in USER_CLAIMS:
+        token[claim] = getattr(user, claim)
+    return token
+
+
+# ----- revocation list -----
+
+def _revocation_ttl():
+    lifetime = max(api_settings.ACCESS_TOKEN_LIFETIME, api_settings.REFRESH_TOKEN_LIFETIME)
+    return int(lifetime.total_seconds())
+
+
+def revoke_user_tokens(user_id):
+    """Reject every token issued to ``user_id`` before now."""
+    cache.set(REVOKED_KEY.format(user_id), int(time.time()), timeout=_revocation_ttl())
+    user_cache.discard(user_id)
+
+
+def is_token_revoked(token):
+    revoked_before = cache.get(REVOKED_KEY.format(token[api_settings.USER_ID_CLAIM]))
+    return revoked_before is not None and token.get('iat', 0) < revoked_before
+
+
+async def ais_token_revoked(token):
+    """``is_token_revoked`` for async views."""
+    revoked_before = await cache.aget(REVOKED_KEY.format(token[api_settings.USER_ID_CLAIM]))
+    return revoked_before is not None and token.get('iat', 0) < revoked_before
+
+
+# ----- in-process user cache -----
+
+class UserCache:
+    """Tiny TTL cache of User rows, keyed by id; hands out copies."""
+
+    def __init__(self, ttl, max_size=10000):
+        self.ttl = ttl
+        self.max_size = max_size
+        self._entries = {}
+        self._lock = threading.Lock()
+
+    def get(self, user_id):
+        now = time.monotonic()
+        with self._lock:
+            entry = self._entries.get(user_id)
+            if entry is not None and entry[0] > now:
+                return copy.copy(entry[1])
+
+        user = get_user_model().objects.filter(**{api_settings.USER_ID_FIELD: user_id}).first()
+        if user is not None and self.ttl > 0:
+            with self._lock:
+                if len(self._entries) >= self.max_size:
+                    self._entries.clear()
+                self._entries[user_id] = (now + self.ttl, user)
+            user = copy.copy(user)
+        return user
+
+    def discard(self, user_id):
+        with self._lock:
+            self._entries.pop(user_id, None)
+
+    def clear(self):
+        with self._lock:
+            self._entries.clear()
+
+
+user_cache = UserCache(ttl=getattr(settings, 'JWT_USER_CACHE_TTL', 30))
+
+
+# ----- token-backed user -----
+
+class ClaimsUser(TokenUser):
+    """
+    Stateless user built from token claims.  Anything not carried by the
+    token (email, phone, ...) transparently loads the full model once.
+    """
+
+    @cached_property
+    def is_customer(self):
+        return self.token.get('is_customer', False)
+
+    @cached_property
+    def is_vendor(self):
+        return self.token.get('is_vendor', False)
+
+    @cached_property
+    def instance(self):
+        user = user_cache.get(self.id)
+        if user is None:
+            raise AuthenticationFailed(_("User not found"), code="user_not_found")
+        return user
+
+    def __getattr__(self, attr):
+        if attr.startswith('_'):
+            raise AttributeError(attr)
+        return getattr(self.instance, attr)
+
+    def __str__(self):
+        return self.username
+
+
+def get_model_user(user):
+    """Return a real User instance for ORM writes and model serializers."""
+    return user.instance if isinstance(user, ClaimsUser) else user
+
+
+class ClaimsJWTAuthentication(JWTAuthentication):
+    """
+    Drop-in replacement for ``JWTAuthentication``: safe requests carrying
+    role claims are authenticated without touching the database.
+    """
+
+    def authenticate(self, request):
+        self.stateless = request.method in SAFE_METHODS
+        result = super().authenticate(request)
+        if result is not None:
+            read_primary_if_pinned(request, result[1][api_settings.USER_ID_CLAIM])
+        return result
+
+    def get_user(self, validated_token):
+        if api_settings.USER_ID_CLAIM not in validated_token:
+            raise InvalidToken(_("Token contained no recognizable user identification"))
+        if is_token_revoked(validated_token):
+            raise AuthenticationFailed(_("Token has been revoked"), code="token_revoked")
+
+        if not getattr(self, 'stateless', False):
+            return super().get_user(validated_token)
+
+        if all(claim in validated_token for claim in USER_CLAIMS):
+            return ClaimsUser(validated_token)
+
+        # Older tokens without claims: cached model load
+        user = user_cache.get(validated_token[api_settings.USER_ID_CLAIM])
+        if user is None:
+            raise AuthenticationFailed(_("User not found"), code="user_not_found")
+        if not user.is_active:
+            raise AuthenticationFailed(_("User is inactive"), code="user_inactive")
+        return user
@@ -0,0 +1,42 @@
+from django.contrib.auth import get_user_model
+from django.contrib.auth.backends import ModelBackend
+from django.db.models import Q
+
+UserModel = get_user_model()
+
+
+class UsernameOrEmailBackend(ModelBackend):
+    """
+    Authenticate with either the username or the email address.
+
+    The user is resolved with one indexed query and the password hasher runs
+    exactly once per attempt, whether or not the account exists.
+    """
+
+    def authenticate(self, request, username=None, password=None, **kwargs):
+        if username is None:
+            username = kwargs.get(UserModel.USERNAME_FIELD)
+        if username is None or password is None:
+            return None
+
+        user = self.get_user_by_login(username)
+        if user is None:
+            # Run the hasher anyway so unknown logins cost the same as bad passwords
+            UserModel().set_password(password)
+            return None
+
+        if user.check_password(password) and self.user_can_authenticate(user):
+            return user
+        return None
+
+    def get_user_by_login(self, login):
+        candidates = list(
+            UserModel._default_manager.filter(
+                Q(**{UserModel.USERNAME_FIELD: login}) | Q(email=login)
+            )[:3]
+        )
+        for candidate in candidates:
+            if candidate.get_username() == login:
+                return candidate
+        # Fall back to the email match only when it is unambiguous
+        return candidates[0] if len(candidates) == 1 else None
@@ -0,0 +1,98 @@
+"""
+Batch price / stock / active updates keyed by SKU.
+
+All chunks run in one transaction.  Each chunk locks its products with one
+``SELECT ... FOR UPDATE``, checks the optional ``updated`` timestamp for
+optimistic concurrency and writes the changes back with ``bulk_update``.
+Every SKU gets its own result entry; failing SKUs never block the others.
+"""
+from django.db import transaction
+from django.utils import timezone
+
+from .models import Product
+from .serializers import BULK_UPDATE_FIELDS, ProductBulkUpdateItemSerializer
+
+DEFAULT_CHUNK_SIZE = 1000
+
+UPDATED = 'updated'
+INVALID = 'invalid'
+NOT_FOUND = 'not_found'
+CONFLICT = 'conflict'
+FORBIDDEN = 'forbidden'
+DUPLICATE = 'duplicate'
+
+
+def _chunks(items, size):
+    for start in range(0, len(items), size):
+        yield items[start:start + size]
+
+
+def apply_bulk_update(items, vendor_id=None, chunk_size=DEFAULT_CHUNK_SIZE):
+    """
+    Apply a list of update dicts.  ``vendor_id`` restricts the update to
+    that vendor's products.  Returns one result dict per input item, in order.
+    """
+    results = [None] * len(items)
+    valid = []
+    seen = set()
+    for index, item in enumerate(items):
+        sku = item.get('sku') if isinstance(item, dict) else None
+        serializer = ProductBulkUpdateItemSerializer(data=item if isinstance(item, dict) else {})
+        if not serializer.is_valid():
+            results[index] = {'sku': sku, 'status': INVALID, 'errors': serializer.errors}
+        elif sku in seen:
+            results[index] = {'sku': sku, 'status': DUPLICATE,
+                              'errors': {'sku': ["SKU appears more than once in this request."]}}
+        else:
+            seen.add(sku)
+            valid.append((index, serializer.validated_data))
+
+    now = timezone.now()
+    with transaction.atomic():
+        for chunk in _chunks(valid, chunk_size):
+            products = Product.objects.select_for_update()\
+                .filter(sku__in=[data['sku'] for _, data in chunk])\
+                .only('id', 'sku', 'vendor_id', 'updated', *BULK_UPDATE_FIELDS)
+            by_sku = {product.sku: product for product in products}
+
+            changed = []
+            fields = set()
+            for index, data in chunk:
+                results[index] = _apply(by_sku.get(data['sku']), data, vendor_id, now)
+                if results[index]['status'] == UPDATED:
+                    changed.append(by_sku[data['sku']])
+                    fields.update(field for field in BULK_UPDATE_FIELDS if field in data)
+
+            if changed:
+                Product.objects.bulk_update(changed, sorted(fields) + ['updated', 'content_updated'])
+    return results
+
+
+def _apply(product, data, vendor_id, now):
+    sku = data['sku']
+    if product is None:
+        return {'sku': sku, 'status': NOT_FOUND}
+    if vendor_id is not None and product.vendor_id != vendor_id:
+        return {'sku': sku, 'status': FORBIDDEN}
+    if 'updated' in data and data['updated'] != product.updated:
+        return {'sku': sku, 'status': CONFLICT, 'current_updated': product.updated}
+
+    price = data.get('price', product.price)
+    discount_price = data['discount_price'] if 'discount_price' in data else product.discount_price
+    if discount_price is not None and discount_price >= price:
+        return {'sku': sku, 'status': INVALID,
+                'errors': {'discount_price': ["Discount price must be less than regular price"]}}
+
+    for field in BULK_UPDATE_FIELDS:
+        if field in data:
+            setattr(product, field, data[field])
+    # bulk_update() skips auto_now, so bump the version explicitly
+    product.updated = product.content_updated = now
+    return {'sku': sku, 'status': UPDATED, 'updated': now}
+
+
+def summarize(results):
+    summary = {}
+    for result in results:
+        summary[result['status']] = summary.get(result['status'], 0) + 1
+    return summary
@@ -0,0 +1,140 @@
+"""
+Negotiated response compression.
+
+``CompressionMiddleware`` compresses API (JSON) bodies of at least
+``SHOP_COMPRESSION['MIN_SIZE']`` bytes with brotli (when the ``brotli``
+package is installed) or gzip, whichever the client's ``Accept-Encoding``
+prefers.  Streaming responses (the notification stream) are left alone.
+HTML is not compressed: admin and login pages carry CSRF tokens, and
+compressing them next to reflected input invites BREACH.
+
+Strong ETags stay strong: a compressed response gets ``"<etag>-br"`` /
+``"<etag>-gzip"``, and the suffix is stripped from ``If-None-Match`` and
+``If-Match`` on the way in, so views (shop.conditional) compare against the
+ETag they issued and a 304 carries the ETag of the variant the client holds.
+"""
+import gzip
+import re
+
+from asgiref.sync import iscoroutinefunction, markcoroutinefunction
+from django.conf import settings
+from django.core.exceptions import MiddlewareNotUsed
+from django.utils.cache import patch_vary_headers
+
+try:
+    import brotli
+except ImportError:  # pragma: no cover
+    brotli = None
+
+DEFAULTS = {
+    'ENABLED': True,
+    # Below this many bytes the saving doesn't pay for the CPU
+    'MIN_SIZE': 1024,
+    'GZIP_LEVEL': 6,
+    'BROTLI_QUALITY': 5,
+    # JSON only; see the module docstring before adding text/html
+    'CONTENT_TYPES': ['application/json'],
+}
+
+_CODING_RE = re.compile(r'\s*([\w*-]+)\s*(?:;\s*q\s*=\s*([0-9.]+))?\s*(?:,|$)')
+_SUFFIXED_ETAG_RE = re.compile(r'"([^"]*)-(br|gzip)"')
+
+
+def get_compression_settings():
+    return {**DEFAULTS, **getattr(settings, 'SHOP_COMPRESSION', {})}
+
+
+def accepted_encodings(header):
+    """``{coding: q}`` from an Accept-Encoding header."""
+    accepted = {}
+    for coding, q in _CODING_RE.findall(header or ''):
+        try:
+            accepted[coding.lower()] = float(q) if q else 1.0
+        except ValueError:
+            continue
+    return accepted
+
+
+def choose_encoding(header, available):
+    """The client's preferred coding among ``available`` (in server order for ties), or None."""
+    accepted = accepted_encodings(header)
+    best, best_q = None, 0
+    for coding in available:
+        q = accepted.get(coding, accepted.get('*', 0))
+        if q > best_q:
+            best, best_q = coding, q
+    return best
+
+
+def _unsuffix_etags(request):
+    """Strip our encoding suffixes from request validators; returns the coding they named."""
+    coding = None
+    for header in ('HTTP_IF_NONE_MATCH', 'HTTP_IF_MATCH'):
+        value = request.META.get(header)
+        if value and '-' in value:
+            match = _SUFFIXED_ETAG_RE.search(value)
+            if match:
+                coding = coding or match.group(2)
+                request.META[header] = _SUFFIXED_ETAG_RE.sub(r'"\1"', value)
+    return coding
+
+
+def _suffix_etag(response, coding):
+    etag = response.get('ETag')
+    if etag and etag.startswith('"') and etag.endswith('"'):
+        response['ETag'] = f'{etag[:-1]}-{coding}"'
+
+
+class CompressionMiddleware:
+    sync_capable = True
+    async_capable = True
+
+    def __init__(self, get_response):
+        config = get_compression_settings()
+        if not config['ENABLED']:
+            raise MiddlewareNotUsed
+        self.get_response = get_response
+        self.min_size = config['MIN_SIZE']
+        self.content_types = tuple(config['CONTENT_TYPES'])
+        self.compressors = {}
+        if brotli is not None:
+            quality = config['BROTLI_QUALITY']
+            self.compressors['br'] = lambda content: brotli.compress(content, quality=quality)
+        level = config['GZIP_LEVEL']
+        self.compressors['gzip'] = lambda content: gzip.compress(content, compresslevel=level, mtime=0)
+        if iscoroutinefunction(get_response):
+            markcoroutinefunction(self)
+
+    def __call__(self, request):
+        if iscoroutinefunction(self):
+            return self.__acall__(request)
+        held = _unsuffix_etags(request)
+        return self.process_response(request, self.get_response(request), held)
+
+    async def __acall__(self, request):
+        held = _unsuffix_etags(request)
+        return self.process_response(request, await self.get_response(request), held)
+
+    def process_response(self, request, response, held=None):
+        if response.status_code == 304:
+            # Not modified: the client keeps the variant (and ETag) it already has
+            if held is not None:
+                _suffix_etag(response, held)
+            return response
+        if (response.streaming or response.has_header('Content-Encoding')
+                or not response.get('Content-Type', '').startswith(self.content_types)
+                or len(response.content) < self.min_size):
+            return response
+
+        patch_vary_headers(response, ('Accept-Encoding',))
+        coding = choose_encoding(request.headers.get('Accept-Encoding'), self.compressors)
+        if coding is None:
+            return response
+        compressed = self.compressors[coding](response.content)
+        if len(compressed) >= len(response.content):
+            return response
+        response.content = compressed
+        response['Content-Length'] = str(len(compressed))
+        response['Content-Encoding'] = coding
+        _suffix_etag(response, coding)
+        return response
@@ -0,0 +1,75 @@
+"""
+Conditional GET for DRF views without rendering or hashing the body.
+
+A view using ``ConditionalGetMixin`` implements ``get_version()``, returning
+the values that change whenever its response would - typically ``updated``
+timestamps and row counts from one small aggregate query - plus a
+``Last-Modified`` timestamp.  List views return None for it: deleting a row
+leaves ``Max(updated)`` where it was, so ``If-Modified-Since`` alone would get
+a stale 304; their ETag includes the row count.  The ETag is a hash of those values, the
+request path, ``Accept`` and the user, so a matching ``If-None-Match`` or
+``If-Modified-Since`` gets a 304 before the view loads or serializes
+anything.
+
+The versions are kept honest by shop/signals.py, which bumps
+``Product.content_updated``, ``Cart.updated`` and ``Order.updated`` when the
+rows embedded in their representations (reviews, images, vendors, cart and
+order items) change.  ``Product.updated`` is left alone: it is the
+optimistic-concurrency token of product bulk updates.
+"""
+import hashlib
+
+from django.conf import settings
+from django.utils.cache import get_conditional_response, patch_cache_control, patch_vary_headers
+from django.utils.http import http_date
+
+DEFAULTS = {
+    'ENABLED': True,
+    # Part of every ETag: bump when a response format changes but the data doesn't
+    'ETAG_VERSION': '1',
+}
+
+
+def get_conditional_settings():
+    return {**DEFAULTS, **getattr(settings, 'SHOP_CONDITIONAL', {})}
+
+
+def make_etag(request, version):
+    key = repr((
+        get_conditional_settings()['ETAG_VERSION'], request.get_full_path(),
+        request.META.get('HTTP_ACCEPT', ''), request.user.pk, version,
+    ))
+    return f'"{hashlib.sha256(key.encode()).hexdigest()[:32]}"'
+
+
+class ConditionalGetMixin:
+    # Responses that depend on the user: cacheable by the client only
+    private = False
+
+    def get_version(self):
+        """``(version, last_modified)`` for the current request, or None to skip validation."""
+        raise NotImplementedError
+
+    def get(self, request, *args, **kwargs):
+        version = self.get_version() if get_conditional_settings()['ENABLED'] else None
+        if version is None:
+            return super().get(request, *args, **kwargs)
+        version, last_modified = version
+        etag = make_etag(request, version)
+        timestamp = int(last_modified.timestamp()) if last_modified else None
+
+        response = get_conditional_response(request, etag=etag, last_modified=timestamp)
+        if response is None:
+            response = super().get(request, *args, **kwargs)
+            if response.status_code != 200:
+                return response
+        response.headers.setdefault('ETag', etag)
+        if timestamp is not None:
+            response.headers.setdefault('Last-Modified', http_date(timestamp))
+        # Revalidate every time; with the ETag that is usually a 304
+        if self.private:
+            patch_cache_control(response, no_cache=True, private=True)
+            patch_vary_headers(response, ('Authorization',))
+        else:
+            patch_cache_control(response, no_cache=True)
+        return response
@@ -0,0 +1,288 @@
+"""
+Synthetic data for benchmarks and local load tests.
+
+``seed(scale)`` fills an (empty) database with vendors, a category tree,
+products with images and reviews, customers with addresses, carts, orders and
+notifications, all through ``bulk_create`` and driven by one ``random.Random``
+so the same scale and seed always produce the same rows.  Images are file
+names only; nothing is written to MEDIA_ROOT.
+
+It also creates the accounts the benchmarks log in as: ``bench-admin``
+(staff) and ``bench-customer`` (a customer with a filled cart, orders and
+notifications), both with password ``BENCH_PASSWORD``.
+
+``ZipfSampler``, ``category_tree`` and ``explicit_timestamps`` are shared
+with ``manage.py generate_catalog``, which streams millions of rows with the same building
+blocks.
+"""
+import random
+from array import array
+from bisect import bisect
+from contextlib import contextmanager
+from itertools import accumulate
+from datetime import timedelta
+from decimal import Decimal
+
+from django.contrib.auth.hashers import make_password
+from django.db import connection
+from django.utils import timezone
+
+from .models import (
+    Address, Cart, CartItem, Category, Notification, Order, OrderItem, Product,
+    ProductImage, ProductReview, User, Vendor,
+)
+
+BENCH_PASSWORD = 'bench-password'
+
+SCALES = {
+    'small': {
+        'vendors': 5, 'root_categories': 4, 'subcategories': 3, 'products': 200,
+        'images': 2, 'reviews': 3, 'customers': 50, 'carts': 20, 'cart_items': 3,
+        'orders': 200, 'order_items': 3, 'notifications': 10,
+    },
+    'medium': {
+        'vendors': 25, 'root_categories': 8, 'subcategories': 5, 'products': 2000,
+        'images': 3, 'reviews': 5, 'customers': 500, 'carts': 200, 'cart_items': 4,
+        'orders': 2000, 'order_items': 3, 'notifications': 20,
+    },
+    'large': {
+        'vendors': 100, 'root_categories': 12, 'subcategories': 8, 'products': 20000,
+        'images': 3, 'reviews': 8, 'customers': 5000, 'carts': 2000, 'cart_items': 4,
+        'orders': 20000, 'order_items': 3, 'notifications': 20,
+    },
+}
+
+WORDS = (
+    'classic', 'wireless', 'organic', 'premium', 'compact', 'vintage', 'smart',
+    'leather', 'cotton', 'steel', 'ceramic', 'portable', 'eco', 'deluxe', 'mini',
+)
+NOUNS = (
+    'headphones', 'backpack', 'kettle', 'lamp', 'jacket', 'watch', 'mug', 'speaker',
+    'notebook', 'sneakers', 'blender', 'scarf', 'charger', 'desk', 'bottle',
+)
+
+
+class ZipfSampler:
+    """
+    Draws from ``items`` with the k-th most popular item weighted 1 / k**s.
+    Popularity ranks are shuffled, so they don't follow the items' order.
+    """
+
+    def __init__(self, items, s, rng):
+        self.items = list(items)
+        rng.shuffle(self.items)
+        self.cumulative = array('d', accumulate(1 / rank ** s for rank in range(1, len(self.items) + 1)))
+        self.rng = rng
+
+    def __call__(self):
+        index = bisect(self.cumulative, self.rng.random() * self.cumulative[-1])
+        return self.items[min(index, len(self.items) - 1)]
+
+    def sample(self, k):
+        """``k`` distinct items (fewer if there aren't that many)."""
+        chosen = {}
+        for _ in range(k * 4):
+            item = self()
+            chosen[item] = True
+            if len(chosen) == k:
+                break
+        return list(chosen)
+
+
+def category_tree(rng, roots, depth, fanout, prefix='bench'):
+    """
+    Create a category tree ``depth`` levels deep with up to ``fanout``
+    children per node (the count varies per node).  Returns the leaves.
+    """
+    level = bulk_insert(Category, (
+        Category(name=f'Department {i}', slug=f'{prefix}-{i}') for i in range(roots)
+    ))
+    for _ in range(depth - 1):
+        level = bulk_insert(Category, (
+            Category(name=f'{rng.choice(WORDS).title()} {rng.choice(NOUNS)} {j}',
+                     slug=f'{parent.slug}-{j}', parent=parent)
+            for parent in level for j in range(rng.randint(1, fanout))
+        ))
+    return level
+
+
+@contextmanager
+def explicit_timestamps(*fields):
+    """Let bulk_create keep the created times we generate instead of now().
+
+    Flips ``auto_now_add`` on the model fields for the duration, so use it
+    from commands, not from request handling threads.
+    """
+    saved = [field.auto_now_add for field in fields]
+    for field in fields:
+        field.auto_now_add = False
+    try:
+        yield
+    finally:
+        for field, auto_now_add in zip(fields, saved):
+            field.auto_now_add = auto_now_add
+
+
+def bulk_insert(model, objs, batch_size=1000):
+    """``bulk_create`` that returns the objects with their primary keys set."""
+    objs = model.objects.bulk_create(list(objs), batch_size=batch_size)
+    if objs and objs[0].pk is None and not connection.features.can_return_rows_from_bulk_insert:
+        # MySQL leaves pks unset; the rows just inserted are the newest ones
+        objs = list(model.objects.order_by('-pk')[:len(objs)])[::-1]
+    return objs
+
+
+def _users(prefix, count, password, **flags):
+    return bulk_insert(User, (
+        User(username=f'{prefix}{i}', email=f'{prefix}{i}@example.com', password=password, **flags)
+        for i in range(count)
+    ))
+
+
+def create_vendors(rng, count, password):
+    users = _users('bench-vendor', count, password, is_vendor=True)
+    return bulk_insert(Vendor, (
+        Vendor(user=user, business_name=f'{rng.choice(WORDS).title()} Goods {i}', approved=True)
+        for i, user in enumerate(users)
+    ))
+
+
+def create_categories(rng, roots, children):
+    parents = bulk_insert(Category, (
+        Category(name=f'Department {i}', slug=f'bench-department-{i}') for i in range(roots)
+    ))
+    leaves = bulk_insert(Category, (
+        Category(name=f'{parent.name} / {rng.choice(NOUNS).title()} {j}',
+                 slug=f'{parent.slug}-{j}', parent=parent)
+        for parent in parents for j in range(children)
+    ))
+    return parents + leaves
+
+
+def create_products(rng, count, vendors, categories, images):
+    products = []
+    for i in range(count):
+        price = Decimal(rng.randint(199, 49999)) / 100
+        discounted = rng.random() < 0.2
+        products.append(Product(
+            name=f'{rng.choice(WORDS).title()} {rng.choice(NOUNS)} {i}',
+            slug=f'bench-product-{i}',
+            description=' '.join(rng.choices(WORDS + NOUNS, k=30)),
+            price=price,
+            discount_price=(price * Decimal('0.8')).quantize(Decimal('0.01')) if discounted else None,
+            category=rng.choice(categories),
+            vendor=rng.choice(vendors),
+            stock=rng.randint(0, 500),
+            sku=f'BENCH-{i:06d}',
+            active=rng.random() < 0.95,
+            featured=rng.random() < 0.05,
+        ))
+    products = bulk_insert(Product, products)
+    ProductImage.objects.bulk_create(
+        (ProductImage(product=product, image=f'products/bench-{product.pk}-{j}.jpg',
+                      alt_text=product.name, default=j == 0)
+         for product in products for j in range(images)),
+        batch_size=1000,
+    )
+    return products
+
+
+def create_customers(rng, count, password):
+    customers = _users('bench-user', count, password, is_customer=True)
+    addresses = bulk_insert(Address, (
+        Address(user=customer, street=f'{rng.randint(1, 999)} Main St', city='Springfield',
+                state='IL', zip_code=f'{rng.randint(10000, 99999)}', country='US',
+                address_type='S', default=True)
+        for customer in customers
+    ))
+    return customers, addresses
+
+
+def create_reviews(rng, products, customers, per_product):
+    ProductReview.objects.bulk_create(
+        (ProductReview(product=product, user=rng.choice(customers), rating=rng.randint(1, 5),
+                       title='Review', content=' '.join(rng.choices(WORDS, k=15)))
+         for product in products for _ in range(rng.randint(0, per_product * 2))),
+        batch_size=1000,
+    )
+
+
+def create_carts(rng, customers, products, items):
+    in_stock = [product for product in products if product.active and product.stock >= 10]
+    carts = bulk_insert(Cart, (Cart(user=customer) for customer in customers))
+    CartItem.objects.bulk_create(
+        (CartItem(cart=cart, product=product, quantity=rng.randint(1, 3))
+         for cart in carts for product in rng.sample(in_stock, items)),
+        batch_size=1000,
+    )
+    return carts
+
+
+def create_orders(rng, count, customers, addresses, products, items):
+    now = timezone.now()
+    orders = bulk_insert(Order, (
+        Order(user=customers[i % len(customers)], order_number=f'BENCH{i:07d}',
+              status=rng.choice('PPCF'), shipping_address=addresses[i % len(customers)],
+              billing_address=addresses[i % len(customers)], payment_method='credit',
+              total=Decimal(0))
+        for i in range(count)
+    ))
+    order_items = []
+    for order in orders:
+        total = Decimal(0)
+        for product in rng.sample(products, items):
+            quantity = rng.randint(1, 3)
+            order_items.append(OrderItem(order=order, product=product, price=product.price, quantity=quantity))
+            total += product.price * quantity
+        order.total = total
+        order.created = now - timedelta(minutes=rng.randint(0, 60 * 24 * 90))
+    OrderItem.objects.bulk_create(order_items, batch_size=1000)
+    Order.objects.bulk_update(orders, ['total', 'created'], batch_size=1000)
+    return orders
+
+
+def create_notifications(rng, customers, per_user):
+    # bulk_create skips the counter signals; NotificationState backfills on first read
+    Notification.objects.bulk_create(
+        (Notification(recipient=customer, title='Order update', message='Your order has shipped.',
+                      notification_type=rng.choice(('order', 'system', 'product')),
+                      is_read=rng.random() < 0.6)
+         for customer in customers for _ in range(per_user)),
+        batch_size=1000,
+    )
+
+
+def seed(scale='small', seed=0):
+    """Populate the database; returns the row counts and the bench accounts."""
+    config = SCALES[scale]
+    rng = random.Random(seed)
+    # Hashing is deliberately slow; every generated account shares one hash
+    password = make_password(BENCH_PASSWORD)
+
+    admin = User.objects.create(username='bench-admin', email='bench-admin@example.com',
+                                password=password, is_staff=True, is_superuser=True)
+    vendors = create_vendors(rng, config['vendors'], password)
+    categories = create_categories(rng, config['root_categories'], config['subcategories'])
+    products = create_products(rng, config['products'], vendors, categories, config['images'])
+    customers, addresses = create_customers(rng, config['customers'], password)
+    customer = User.objects.create(username='bench-customer', email='bench-customer@example.com',
+                                   password=password, is_customer=True)
+    customer_address = Address.objects.create(
+        user=customer, street='1 Bench St', city='Springfield', state='IL', zip_code='62701',
+        country='US', address_type='S', default=True,
+    )
+    create_reviews(rng, products, customers, config['reviews'])
+    create_carts(rng, [customer] + customers[:config['carts']], products, config['cart_items'])
+    create_orders(rng, config['orders'], [customer] + customers, [customer_address] + addresses,
+                  products, config['order_items'])
+    create_notifications(rng, [customer] + customers, config['notifications'])
+    return {
+        'admin': admin,
+        'customer': customer,
+        'product': next(product for product in products if product.active),
+        'category': categories[0],
+        'counts': {model.__name__: model.objects.count() for model in (
+            Vendor, Category, Product, ProductImage, ProductReview, User, Cart, CartItem,
+            Order, OrderItem, Notification,
+        )},
+    }
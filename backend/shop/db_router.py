@@ -0,0 +1,155 @@
+"""
+Primary/replica database routing.
+
+Writes always go to ``default``.  Reads go to a replica from
+``settings.DATABASE_REPLICAS`` only while replica reads are switched on for
+the current request or block: ``ReplicaRoutingMiddleware`` does that for safe
+requests to views that set ``use_replica = True`` (catalog, dashboard,
+exports), and ``replica_reads()`` does it for scripts and commands.  Anything
+else - cart, checkout, profile, every unsafe request - reads the primary.
+
+After a successful write the client is pinned to the primary for
+``REPLICA_STICKY_SECONDS``, so users see their own changes even while the
+replicas lag.  Authenticated users are pinned by user id in the Django cache
+(the SPA is cross-origin and sends no cookies); ``ClaimsJWTAuthentication``
+calls ``read_primary_if_pinned()`` once it knows the user, so the cache must
+be shared between workers.  Anonymous clients get a short-lived cookie.
+"""
+import random
+import time
+from contextlib import contextmanager
+from contextvars import ContextVar
+
+from asgiref.sync import iscoroutinefunction, markcoroutinefunction
+from django.conf import settings
+from django.core.cache import cache
+from rest_framework.permissions import SAFE_METHODS
+
+PRIMARY = 'default'
+STICKY_COOKIE = 'primary_until'
+STICKY_USER_KEY = 'primary-until:{}'
+
+_replica_reads = ContextVar('replica_reads', default=False)
+
+
+def get_replicas():
+    return list(getattr(settings, 'DATABASE_REPLICAS', []))
+
+
+def replica_reads_enabled():
+    return _replica_reads.get()
+
+
+@contextmanager
+def replica_reads(enabled=True):
+    """Route reads inside the block to a replica (or force the primary)."""
+    token = _replica_reads.set(enabled)
+    try:
+        yield
+    finally:
+        _replica_reads.reset(token)
+
+
+class PrimaryReplicaRouter:
+    def db_for_read(self, model, **hints):
+        if not _replica_reads.get():
+            return PRIMARY
+        # Objects fetched from the primary keep reading related rows there
+        instance = hints.get('instance')
+        if instance is not None and instance._state.db == PRIMARY:
+            return PRIMARY
+        replicas = get_replicas()
+        return random.choice(replicas) if replicas else PRIMARY
+
+    def db_for_write(self, model, **hints):
+        return PRIMARY
+
+    def allow_relation(self, obj1, obj2, **hints):
+        # Replicas hold the same data as the primary
+        return True
+
+    def allow_migrate(self, db, app_label, model_name=None, **hints):
+        return True
+
+
+def _view_uses_replica(view_func):
+    view_class = getattr(view_func, 'cls', None) or getattr(view_func, 'view_class', None)
+    return getattr(view_class or view_func, 'use_replica', False)
+
+
+def _sticky_seconds():
+    return getattr(settings, 'REPLICA_STICKY_SECONDS', 5)
+
+
+def read_primary_if_pinned(request, user_id):
+    """Switch a replica-read request back to the primary if ``user_id`` wrote recently."""
+    if not _replica_reads.get() or not get_replicas():
+        return
+    if (cache.get(STICKY_USER_KEY.format(user_id)) or 0) > time.time():
+        # DRF's Request wraps the HttpRequest the middleware sees
+        getattr(request, '_request', request)._replica_reads = False
+        _replica_reads.set(False)
+
+
+def _stream_with_replica_reads(content):
+    # Streaming bodies are produced after the middleware returns
+    _replica_reads.set(True)
+    try:
+        yield from content
+    finally:
+        _replica_reads.set(False)
+
+
+class ReplicaRoutingMiddleware:
+    sync_capable = True
+    async_capable = True
+
+    def __init__(self, get_response):
+        self.get_response = get_response
+        if iscoroutinefunction(get_response):
+            markcoroutinefunction(self)
+
+    def __call__(self, request):
+        if iscoroutinefunction(self):
+            return self.__acall__(request)
+        token = _replica_reads.set(False)
+        try:
+            response = self.get_response(request)
+        finally:
+            _replica_reads.reset(token)
+        return self._finish(request, response)
+
+    async def __acall__(self, request):
+        token = _replica_reads.set(False)
+        try:
+            response = await self.get_response(request)
+        finally:
+            _replica_reads.reset(token)
+        return self._finish(request, response)
+
+    def _finish(self, request, response):
+        if getattr(request, '_replica_reads', False) and response.streaming and not response.is_async:
+            response.streaming_content = _stream_with_replica_reads(response.streaming_content)
+
+        if request.method not in SAFE_METHODS and response.status_code < 400 and get_replicas():
+            seconds = _sticky_seconds()
+            until = int(time.time()) + seconds
+            # DRF puts the user it authenticated on the HttpRequest too
+            user = getattr(request, 'user', None)
+            if user is not None and user.is_authenticated:
+                cache.set(STICKY_USER_KEY.format(user.pk), until, seconds)
+            else:
+                response.set_cookie(STICKY_COOKIE, str(until), max_age=seconds, httponly=True, samesite='Lax')
+        return response
+
+    def process_view(self, request, view_func, view_args, view_kwargs):
+        if request.method not in SAFE_METHODS or not _view_uses_replica(view_func):
+            return None
+        try:
+            pinned = int(request.COOKIES.get(STICKY_COOKIE, 0)) > time.time()
+        except ValueError:
+            pinned = False
+        if not pinned:
+            request._replica_reads = True
+            _replica_reads.set(True)
+        return None
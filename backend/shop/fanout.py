@@ -0,0 +1,202 @@
+"""
+Bulk notification fan-out.
+
+``fan_out`` writes one notification per recipient in chunks: each chunk is a
+single ``bulk_create`` plus one counter update, instead of a create and two
+signal queries per user.  Re-running a broadcast is safe: recipients who
+already have a notification for the same object (``related_object``, e.g. the
+product of a product_buyers broadcast) or, failing that, the same
+``broadcast_key`` (audience, type, title and message) are skipped.
+
+``submit_fan_out`` runs it on a background thread and tracks progress in the
+Django cache, so an announcement to every user never ties up a request
+worker.  With more than one worker process that cache must be shared (Redis,
+Memcached, database): with the default per-process LocMemCache a status poll
+that lands on another worker gets a 404.  The executor lives in the web
+process; for very large audiences or when jobs must survive a restart, run
+``manage.py send_notifications`` instead.
+"""
+import hashlib
+import logging
+import uuid
+from concurrent.futures import ThreadPoolExecutor
+
+from django.contrib.auth import get_user_model
+from django.contrib.contenttypes.models import ContentType
+from django.core.cache import cache
+from django.db import connection, transaction
+from django.db.models import Count, F
+
+from . import notifications
+from .models import Notification, NotificationState, OrderItem, Product
+from .serializers import NotificationBroadcastSerializer
+
+logger = logging.getLogger(__name__)
+
+AUDIENCES = NotificationBroadcastSerializer.AUDIENCE_CHOICES
+DEFAULT_CHUNK_SIZE = 1000
+JOB_KEY = 'notification-fanout:{}'
+JOB_TTL = 24 * 3600
+
+
+def resolve_recipients(audience, product_id=None, user_ids=None):
+    """Queryset of recipient user ids for an audience."""
+    users = get_user_model().objects.filter(is_active=True)
+    if audience == 'customers':
+        users = users.filter(is_customer=True)
+    elif audience == 'vendors':
+        users = users.filter(is_vendor=True)
+    elif audience == 'staff':
+        users = users.filter(is_staff=True)
+    elif audience == 'product_buyers':
+        buyers = OrderItem.objects.filter(product_id=product_id).values('order__user_id')
+        users = users.filter(pk__in=buyers)
+    elif audience == 'users':
+        users = users.filter(pk__in=user_ids or [])
+    elif audience != 'all':
+        raise ValueError(f"Unknown audience '{audience}'")
+    return users.order_by('pk').values_list('pk', flat=True)
+
+
+def related_object_for(audience, product_id=None):
+    # Broadcasts about a product dedupe on that product
+    if audience == 'product_buyers' and product_id:
+        return Product.objects.filter(pk=product_id).first()
+    return None
+
+
+def broadcast_key(audience, title, message, notification_type='system', product_id=None):
+    key = repr((audience, product_id, notification_type, title, message))
+    return hashlib.sha256(key.encode()).hexdigest()[:32]
+
+
+def _chunks(iterable, size):
+    chunk = []
+    for item in iterable:
+        chunk.append(item)
+        if len(chunk) == size:
+            yield chunk
+            chunk = []
+    if chunk:
+        yield chunk
+
+
+def _update_counters(recipient_ids):
+    """Add one unread notification to each recipient's NotificationState."""
+    NotificationState.objects.filter(user_id__in=recipient_ids)\
+                             .update(unread_count=F('unread_count') + 1)
+    with_state = set(
+        NotificationState.objects.filter(user_id__in=recipient_ids).values_list('user_id', flat=True)
+    )
+    missing = [user_id for user_id in recipient_ids if user_id not in with_state]
+    if missing:
+        # First notification bookkeeping for these users: backfill from one grouped count
+        counts = Notification.objects.filter(recipient_id__in=missing, is_read=False)\
+                                     .values('recipient_id').annotate(count=Count('id'))
+        NotificationState.objects.bulk_create(
+            [NotificationState(user_id=row['recipient_id'], unread_count=row['count']) for row in counts],
+            ignore_conflicts=True,
+        )
+
+
+def _publish(created):
+    for notification in created:
+        if notifications.broker.has_subscribers(notification.recipient_id):
+            notifications.publish_notification(notification)
+            notifications.publish_count(notification.recipient_id)
+
+
+def fan_out(recipient_ids, title, message, notification_type='system', related_object=None,
+            broadcast_key='', chunk_size=DEFAULT_CHUNK_SIZE, progress=None):
+    """
+    Create a notification for every id in ``recipient_ids`` (any iterable,
+    typically ``resolve_recipients(...)``).  Returns totals.
+    """
+    related = {}
+    if related_object is not None:
+        related = {
+            'related_content_type': ContentType.objects.get_for_model(related_object),
+            'related_object_id': related_object.pk,
+        }
+    dedupe = related or ({'broadcast_key': broadcast_key} if broadcast_key else {})
+    if hasattr(recipient_ids, 'iterator'):
+        recipient_ids = recipient_ids.iterator(chunk_size=chunk_size)
+
+    totals = {'recipients': 0, 'created': 0, 'skipped': 0}
+    for chunk in _chunks(recipient_ids, chunk_size):
+        if dedupe:
+            already = set(
+                Notification.objects.filter(recipient_id__in=chunk, **dedupe)
+                                    .values_list('recipient_id', flat=True)
+            )
+            targets = [user_id for user_id in chunk if user_id not in already]
+        else:
+            targets = chunk
+
+        with transaction.atomic():
+            created = Notification.objects.bulk_create([
+                Notification(
+                    recipient_id=user_id,
+                    title=title,
+                    message=message,
+                    notification_type=notification_type,
+                    broadcast_key=broadcast_key,
+                    **related,
+                )
+                for user_id in targets
+            ])
+            _update_counters(targets)
+            _publish(created)
+
+        totals['recipients'] += len(chunk)
+        totals['created'] += len(targets)
+        totals['skipped'] += len(chunk) - len(targets)
+        if progress is not None:
+            progress(totals)
+    return totals
+
+
+# ----- background jobs -----
+
+_executor = ThreadPoolExecutor(max_workers=1, thread_name_prefix='notification-fanout')
+
+
+def get_job(job_id):
+    return cache.get(JOB_KEY.format(job_id))
+
+
+def _set_job(job_id, **state):
+    job = {**(get_job(job_id) or {'id': job_id}), **state}
+    cache.set(JOB_KEY.format(job_id), job, timeout=JOB_TTL)
+    return job
+
+
+def _run_job(job_id, audience, product_id, user_ids, title, message, notification_type, chunk_size):
+    _set_job(job_id, status='running')
+    try:
+        totals = fan_out(
+            resolve_recipients(audience, product_id=product_id, user_ids=user_ids),
+            title, message, notification_type,
+            related_object=related_object_for(audience, product_id),
+            broadcast_key=broadcast_key(audience, title, message, notification_type, product_id),
+            chunk_size=chunk_size,
+            progress=lambda totals: _set_job(job_id, **totals),
+        )
+        _set_job(job_id, status='done', **totals)
+    except Exception as e:
+        logger.exception("Notification fan-out %s failed", job_id)
+        _set_job(job_id, status='failed', error=str(e))
+    finally:
+        connection.close()
+
+
+def submit_fan_out(audience, title, message, notification_type='system', product_id=None,
+                   user_ids=None, chunk_size=DEFAULT_CHUNK_SIZE):
+    """Queue a fan-out on the background executor; returns the job state."""
+    job_id = uuid.uuid4().hex
+    job = _set_job(job_id, status='queued', audience=audience, recipients=0, created=0, skipped=0)
+    # Start only once the caller's transaction (if any) has committed
+    transaction.on_commit(lambda: _executor.submit(
+        _run_job, job_id, audience, product_id, user_ids, title, message, notification_type, chunk_size
+    ))
+    return job
@@ -0,0 +1,102 @@
+"""
+JSON renderer and parser built on orjson.
+
+``FastJSONRenderer`` encodes like DRF's ``JSONRenderer`` with the default
+settings (compact, UTF-8, U+2028/U+2029 escaped): anything orjson doesn't
+encode itself the way DRF does - Decimal, datetime/date/time, lazy
+translation strings, querysets, timedelta - goes through DRF's own
+``JSONEncoder.default``.  The one byte-level difference is floats in
+exponent form: orjson writes ``1e-7`` and ``1e16`` where ``json`` writes
+``1e-07`` and ``1e+16``, which parse to the same value.  NaN and infinity,
+which orjson would turn into ``null``, go to the stock renderer so they
+still raise ``ValueError`` under ``STRICT_JSON``.  Requests for indented
+output, or settings that orjson can't honour (``UNICODE_JSON = False``,
+``COMPACT_JSON = False``), fall back to the stock renderer, as does
+everything when orjson isn't installed.
+
+``FastJSONParser`` parses UTF-8 bodies with orjson and hands anything else
+(other charsets, bodies with 19+ digit numbers, invalid JSON so the error
+message stays the same) to the stock parser.
+"""
+import io
+import math
+import re
+
+from django.conf import settings
+from rest_framework import renderers
+from rest_framework.parsers import JSONParser
+from rest_framework.utils import encoders
+
+try:
+    import orjson
+except ImportError:  # pragma: no cover
+    orjson = None
+
+# Datetimes are handed to DRF's encoder, which trims them to milliseconds and
+# writes UTC as "Z"; dict keys that aren't strings are converted like json.dumps does
+ORJSON_OPTIONS = (orjson.OPT_PASSTHROUGH_DATETIME | orjson.OPT_NON_STR_KEYS) if orjson else 0
+
+_drf_encoder = encoders.JSONEncoder()
+# orjson reads integers beyond 64 bits as floats; json keeps them exact
+_LONG_NUMBER_RE = re.compile(rb'\d{19}')
+
+
+def _default(obj):
+    return _drf_encoder.default(obj)
+
+
+def _has_non_finite(data):
+    if isinstance(data, float):
+        return not math.isfinite(data)
+    if isinstance(data, dict):
+        return any(_has_non_finite(value) for value in data.values())
+    if isinstance(data, (list, tuple)):
+        return any(_has_non_finite(value) for value in data)
+    return False
+
+
+def dumps(data):
+    """Encode ``data`` as compact UTF-8 JSON bytes, like DRF's JSONRenderer."""
+    if orjson is None:
+        return renderers.JSONRenderer().render(data)
+    try:
+        content = orjson.dumps(data, default=_default, option=ORJSON_OPTIONS)
+    except TypeError:
+        # Integers beyond 64 bits and the like: let json.dumps have a go
+        return renderers.JSONRenderer().render(data)
+    # orjson writes NaN/Infinity as null; only walk the data when a null shows up
+    if b'null' in content and _has_non_finite(data):
+        return renderers.JSONRenderer().render(data)
+    # Same as JSONRenderer: these are valid JSON but not valid JavaScript
+    if b'\xe2\x80\xa8' in content or b'\xe2\x80\xa9' in content:
+        content = content.replace(b'\xe2\x80\xa8', b'\\u2028').replace(b'\xe2\x80\xa9', b'\\u2029')
+    return content
+
+
+class FastJSONRenderer(renderers.JSONRenderer):
+    def render(self, data, accepted_media_type=None, renderer_context=None):
+        if (orjson is None or self.ensure_ascii or not self.compact
+                or self.encoder_class is not encoders.JSONEncoder
+                or self.get_indent(accepted_media_type or '', renderer_context or {}) is not None):
+            return super().render(data, accepted_media_type, renderer_context)
+        if data is None:
+            return b''
+        return dumps(data)
+
+
+class FastJSONParser(JSONParser):
+    renderer_class = FastJSONRenderer
+
+    def parse(self, stream, media_type=None, parser_context=None):
+        parser_context = parser_context or {}
+        encoding = parser_context.get('encoding', settings.DEFAULT_CHARSET)
+        if orjson is None or encoding.lower().replace('-', '') != 'utf8' or not self.strict:
+            return super().parse(stream, media_type, parser_context)
+        body = stream.read()
+        if not _LONG_NUMBER_RE.search(body):
+            try:
+                return orjson.loads(body)
+            except orjson.JSONDecodeError:
+                pass
+        # The stock parser keeps big integers exact and words the error messages
+        return super().parse(io.BytesIO(body), media_type, parser_context)
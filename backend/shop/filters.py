@@ -0,0 +1,100 @@
+"""
+Query-parameter filters shared by the list views and the data exports, so an
+export always returns the same rows the admin sees in the matching list.
+
+Malformed values raise DRF's ``ValidationError`` (a 400) while the queryset is
+built, before any rows are read or streamed.
+"""
+from decimal import Decimal, InvalidOperation
+
+from django.db.models import Q
+from rest_framework.exceptions import ValidationError
+from rest_framework.filters import OrderingFilter
+
+
+def _int_param(params, name):
+    value = params.get(name)
+    if not value:
+        return None
+    try:
+        return int(value)
+    except (TypeError, ValueError):
+        raise ValidationError({name: ["A valid integer is required."]})
+
+
+def _decimal_param(params, name):
+    value = params.get(name)
+    if not value:
+        return None
+    try:
+        number = Decimal(value)
+    except (TypeError, ValueError, InvalidOperation):
+        number = None
+    if number is None or not number.is_finite():
+        raise ValidationError({name: ["A valid number is required."]})
+    return number
+
+
+def filter_products(queryset, params):
+    # Filter by category
+    category = params.get('category')
+    if category:
+        queryset = queryset.filter(category__slug=category)
+
+    # Filter by vendor
+    vendor = _int_param(params, 'vendor')
+    if vendor is not None:
+        queryset = queryset.filter(vendor_id=vendor)
+
+    # Filter by price range
+    min_price = _decimal_param(params, 'min_price')
+    max_price = _decimal_param(params, 'max_price')
+    if min_price is not None:
+        queryset = queryset.filter(effective_price__gte=min_price)
+    if max_price is not None:
+        queryset = queryset.filter(effective_price__lte=max_price)
+
+    return queryset
+
+
+class ProductOrderingFilter(OrderingFilter):
+    """``?ordering=price`` sorts by what the customer pays, not the list price."""
+
+    def get_ordering(self, request, queryset, view):
+        ordering = super().get_ordering(request, queryset, view)
+        if not ordering:
+            return ordering
+        return [term.replace('price', 'effective_price') if term.lstrip('-') == 'price' else term
+                for term in ordering]
+
+
+def filter_orders(queryset, params):
+    user_id = _int_param(params, 'user_id')
+    if user_id is not None:
+        queryset = queryset.filter(user__id=user_id)
+    return queryset
+
+
+def filter_customers(queryset, params):
+    search = params.get('search')
+    role = params.get('role')
+    status = params.get('status')
+
+    if search:
+        queryset = queryset.filter(
+            Q(first_name__icontains=search) |
+            Q(last_name__icontains=search) |
+            Q(email__icontains=search)
+        )
+
+    if role == 'admin':
+        queryset = queryset.filter(is_staff=True)
+    elif role == 'customer':
+        queryset = queryset.filter(is_staff=False)
+
+    if status == 'active':
+        queryset = queryset.filter(is_active=True)
+    elif status == 'inactive':
+        queryset = queryset.filter(is_active=False)
+
+    return queryset
@@ -0,0 +1,194 @@
+"""
+Bulk product import from CSV or JSONL.
+
+Rows are validated in batches: field validation runs per row without touching
+the database, then SKU/slug uniqueness, categories and vendors are resolved
+with one set-based query each per batch and the valid rows are written with
+``bulk_create``.  ``ProductImporter.run`` yields one progress event per batch
+so callers can stream it (``ProductImportView``) or print it
+(``manage.py import_products``).
+"""
+import csv
+import io
+import json
+from itertools import islice
+
+from django.db import IntegrityError, transaction
+from django.db.models import Q
+
+from .models import Category, Product, Vendor
+from .serializers import ProductImportRowSerializer
+
+IMPORT_FORMATS = ('csv', 'jsonl')
+DEFAULT_BATCH_SIZE = 500
+
+
+def detect_format(filename, default='csv'):
+    if filename and filename.lower().endswith(('.jsonl', '.ndjson')):
+        return 'jsonl'
+    if filename and filename.lower().endswith('.csv'):
+        return 'csv'
+    return default
+
+
+def read_rows(stream, import_format):
+    """Yield dict rows from a text stream."""
+    if import_format == 'csv':
+        yield from csv.DictReader(stream)
+    elif import_format == 'jsonl':
+        for line in stream:
+            line = line.strip()
+            if not line:
+                continue
+            try:
+                row = json.loads(line)
+            except ValueError as e:
+                row = {'__parse_error__': str(e)}
+            yield row if isinstance(row, dict) else {'__parse_error__': 'Expected a JSON object'}
+    else:
+        raise ValueError(f"Unknown import format '{import_format}'")
+
+
+def open_text(fileobj):
+    """Wrap a binary upload so it can be read line by line as UTF-8."""
+    if isinstance(fileobj, io.TextIOBase):
+        return fileobj
+    return io.TextIOWrapper(fileobj, encoding='utf-8-sig', newline='')
+
+
+class ProductImporter:
+    def __init__(self, vendor=None, batch_size=DEFAULT_BATCH_SIZE, dry_run=False, lock_vendor=False):
+        self.default_vendor_id = vendor.pk if isinstance(vendor, Vendor) else vendor
+        # Every row goes to ``vendor``, whatever its own vendor column says
+        self.lock_vendor = lock_vendor
+        self.batch_size = batch_size
+        self.dry_run = dry_run
+        # SKUs/slugs accepted so far in this import, to catch in-file duplicates
+        self.seen_skus = set()
+        self.seen_slugs = set()
+
+    def run(self, rows):
+        totals = {'processed': 0, 'created': 0, 'failed': 0}
+        rows = iter(rows)
+        batch_number = 0
+        while True:
+            batch = list(islice(rows, self.batch_size))
+            if not batch:
+                break
+            batch_number += 1
+            first_row = totals['processed'] + 1
+            created, errors = self.import_batch(batch, first_row)
+
+            totals['processed'] += len(batch)
+            totals['created'] += created
+            totals['failed'] += len(errors)
+            yield {
+                'event': 'batch',
+                'batch': batch_number,
+                **totals,
+                'batch_created': created,
+                'errors': errors,
+            }
+        yield {'event': 'done', 'dry_run': self.dry_run, **totals}
+
+    def import_batch(self, batch, first_row):
+        errors = []
+        valid = []
+        for row_number, row in enumerate(batch, start=first_row):
+            if '__parse_error__' in row:
+                errors.append({'row': row_number, 'errors': {'non_field_errors': [row['__parse_error__']]}})
+                continue
+            serializer = ProductImportRowSerializer(data=row)
+            if serializer.is_valid():
+                valid.append((row_number, serializer.validated_data))
+            else:
+                errors.append({'row': row_number, 'sku': row.get('sku'), 'errors': serializer.errors})
+
+        if not valid:
+            return 0, errors
+
+        existing_skus, existing_slugs = self._existing_keys(valid)
+        categories = self._resolve_categories(valid)
+        vendors = self._resolve_vendors(valid)
+
+        products = []
+        for row_number, data in valid:
+            row_errors = {}
+            if data['sku'] in existing_skus or data['sku'] in self.seen_skus:
+                row_errors['sku'] = ["A product with this SKU already exists."]
+            if data['slug'] in existing_slugs or data['slug'] in self.seen_slugs:
+                row_errors['slug'] = ["A product with this slug already exists."]
+
+            category_id = categories.get(data['category'])
+            if category_id is None:
+                row_errors['category'] = [f"Unknown category '{data['category']}'."]
+
+            vendor_id = self.default_vendor_id if self.lock_vendor else data.get('vendor') or self.default_vendor_id
+            if vendor_id is None:
+                row_errors['vendor'] = ["A vendor is required."]
+            elif vendor_id not in vendors:
+                row_errors['vendor'] = [f"Unknown vendor '{vendor_id}'."]
+
+            if row_errors:
+                errors.append({'row': row_number, 'sku': data['sku'], 'errors': row_errors})
+                continue
+
+            self.seen_skus.add(data['sku'])
+            self.seen_slugs.add(data['slug'])
+            products.append(Product(
+                name=data['name'],
+                slug=data['slug'],
+                description=data.get('description', ''),
+                price=data['price'],
+                discount_price=data.get('discount_price'),
+                category_id=category_id,
+                vendor_id=vendor_id,
+                stock=data.get('stock', 0),
+                sku=data['sku'],
+                featured=data.get('featured', False),
+                active=data.get('active', True),
+            ))
+
+        if products and not self.dry_run:
+            try:
+                with transaction.atomic():
+                    Product.objects.bulk_create(products, batch_size=self.batch_size)
+            except IntegrityError as e:
+                # Lost a race with a concurrent writer; nothing in this batch was saved
+                errors.extend(
+                    {'row': None, 'sku': product.sku, 'errors': {'non_field_errors': [str(e)]}}
+                    for product in products
+                )
+                self.seen_skus.difference_update(product.sku for product in products)
+                self.seen_slugs.difference_update(product.slug for product in products)
+                products = []
+        errors.sort(key=lambda error: error['row'] or 0)
+        return len(products), errors
+
+    def _existing_keys(self, valid):
+        skus = {data['sku'] for _, data in valid}
+        slugs = {data['slug'] for _, data in valid}
+        existing = Product.objects.filter(Q(sku__in=skus) | Q(slug__in=slugs))\
+                                  .values_list('sku', 'slug')
+        existing_skus, existing_slugs = set(), set()
+        for sku, slug in existing:
+            existing_skus.add(sku)
+            existing_slugs.add(slug)
+        return existing_skus, existing_slugs
+
+    def _resolve_categories(self, valid):
+        """Map each category reference in the batch (id or slug) to an id."""
+        refs = {data['category'] for _, data in valid}
+        ids = {int(ref) for ref in refs if ref.isdigit()}
+        resolved = {}
+        for pk, slug in Category.objects.filter(Q(pk__in=ids) | Q(slug__in=refs))\
+                                        .values_list('pk', 'slug'):
+            resolved[slug] = pk
+            resolved[str(pk)] = pk
+        return resolved
+
+    def _resolve_vendors(self, valid):
+        ids = set() if self.lock_vendor else {data.get('vendor') for _, data in valid if data.get('vendor')}
+        if self.default_vendor_id is not None:
+            ids.add(self.default_vendor_id)
+        return set(Vendor.objects.filter(pk__in=ids).values_list('pk', flat=True))
@@ -0,0 +1,81 @@
+import statistics
+from time import perf_counter
+
+from django.core.management.base import BaseCommand
+from django.db import connections
+
+
+def _percentile(values, fraction):
+    values = sorted(values)
+    return values[min(len(values) - 1, int(len(values) * fraction))]
+
+
+class Command(BaseCommand):
+    help = (
+        "Measure per-request database overhead with a fresh connection per "
+        "request (CONN_MAX_AGE=0) against a persistent connection, with and "
+        "without health checks. Each simulated request runs Django's "
+        "request_started/request_finished connection handling around --queries "
+        "trivial queries."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('--database', default='default')
+        parser.add_argument('--requests', type=int, default=500)
+        parser.add_argument('--queries', type=int, default=3, help="Queries per simulated request")
+
+    def simulate(self, connection, requests, queries, max_age, health_checks):
+        original = {key: connection.settings_dict.get(key) for key in ('CONN_MAX_AGE', 'CONN_HEALTH_CHECKS')}
+        connection.settings_dict['CONN_MAX_AGE'] = max_age
+        connection.settings_dict['CONN_HEALTH_CHECKS'] = health_checks
+        connection.close()
+        timings = []
+        connects = 0
+        try:
+            for _ in range(requests):
+                start = perf_counter()
+                # request_started / request_finished both call close_old_connections()
+                connection.close_if_unusable_or_obsolete()
+                if connection.connection is None:
+                    connects += 1
+                for _ in range(queries):
+                    with connection.cursor() as cursor:
+                        cursor.execute('SELECT 1')
+                        cursor.fetchone()
+                connection.close_if_unusable_or_obsolete()
+                timings.append((perf_counter() - start) * 1000)
+        finally:
+            connection.close()
+            connection.settings_dict.update(original)
+        return {
+            'mean': statistics.mean(timings),
+            'p50': _percentile(timings, 0.5),
+            'p95': _percentile(timings, 0.95),
+            'connects': connects,
+        }
+
+    def handle(self, *args, **options):
+        connection = connections[options['database']]
+        self.stdout.write(
+            f"{connection.vendor} ({connection.settings_dict['NAME']}), "
+            f"{options['requests']} requests x {options['queries']} queries"
+        )
+        runs = [
+            ('new connection per request', 0, False),
+            ('persistent (CONN_MAX_AGE=600)', 600, False),
+            ('persistent + health checks', 600, True),
+        ]
+        results = []
+        for label, max_age, health_checks in runs:
+            result = self.simulate(connection, options['requests'], options['queries'], max_age, health_checks)
+            results.append(result)
+            self.stdout.write(
+                f"  {label:32} mean {result['mean']:.3f} ms  p50 {result['p50']:.3f} ms  "
+                f"p95 {result['p95']:.3f} ms  connects {result['connects']}"
+            )
+
+        saved = results[0]['mean'] - results[1]['mean']
+        self.stdout.write(self.style.SUCCESS(
+            f"Connection setup costs {saved:.3f} ms per request "
+            f"({saved / results[0]['mean']:.0%} of a request that opens its own connection)"
+        ))
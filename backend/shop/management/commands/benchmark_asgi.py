@@ -0,0 +1,227 @@
+import asyncio
+import io
+import json
+import logging
+import sys
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from time import perf_counter
+
+from django.core.handlers.asgi import ASGIHandler
+from django.core.handlers.wsgi import WSGIHandler
+from django.core.management.base import BaseCommand, CommandError
+from django.db import connection
+from django.test.utils import override_settings, setup_test_environment, teardown_test_environment
+from django.urls import path
+
+from shop import ai_api_views, async_views
+from shop.management.commands.run_benchmarks import summarize
+from shop.models import SystemSettings
+
+# The benchmark's own URLconf: the same endpoint as a sync and an async view
+urlpatterns = [
+    path('sync/generate-seo-keywords/', ai_api_views.generate_seo_keywords),
+    path('async/generate-seo-keywords/', async_views.generate_seo_keywords),
+]
+
+BODY = json.dumps({'product_name': 'Bench kettle', 'product_description': 'A kettle.'}).encode()
+
+COMPLETION = json.dumps({
+    'id': 'bench', 'object': 'chat.completion', 'created': 0, 'model': 'deepseek-chat',
+    'choices': [{
+        'index': 0, 'finish_reason': 'stop',
+        'message': {'role': 'assistant', 'content': 'A fast, quiet kettle.'},
+    }],
+    'usage': {'prompt_tokens': 1, 'completion_tokens': 1, 'total_tokens': 2},
+}).encode()
+
+
+def fake_upstream(delay):
+    """An OpenAI-compatible chat endpoint on localhost that answers after ``delay`` seconds."""
+
+    class Handler(BaseHTTPRequestHandler):
+        protocol_version = 'HTTP/1.1'
+        # Headers and body are separate writes; don't let Nagle hold the body back
+        disable_nagle_algorithm = True
+
+        def do_POST(self):
+            self.rfile.read(int(self.headers.get('Content-Length', 0)))
+            time.sleep(delay)
+            self.send_response(200)
+            self.send_header('Content-Type', 'application/json')
+            self.send_header('Content-Length', str(len(COMPLETION)))
+            self.end_headers()
+            self.wfile.write(COMPLETION)
+
+        def log_message(self, format, *args):
+            pass
+
+    server = ThreadingHTTPServer(('127.0.0.1', 0), Handler)
+    server.daemon_threads = True
+    server.request_queue_size = 1024
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+    return server
+
+
+def wsgi_environ(path):
+    return {
+        'REQUEST_METHOD': 'POST', 'PATH_INFO': path, 'SCRIPT_NAME': '', 'QUERY_STRING': '',
+        'SERVER_NAME': 'testserver', 'SERVER_PORT': '80', 'SERVER_PROTOCOL': 'HTTP/1.1',
+        'CONTENT_TYPE': 'application/json', 'CONTENT_LENGTH': str(len(BODY)),
+        'wsgi.input': io.BytesIO(BODY), 'wsgi.errors': sys.stderr, 'wsgi.url_scheme': 'http',
+        'wsgi.version': (1, 0), 'wsgi.multithread': True, 'wsgi.multiprocess': False,
+        'wsgi.run_once': False,
+    }
+
+
+def asgi_scope(path):
+    return {
+        'type': 'http', 'asgi': {'version': '3.0'}, 'http_version': '1.1', 'method': 'POST',
+        'scheme': 'http', 'path': path, 'raw_path': path.encode(), 'query_string': b'',
+        'root_path': '', 'client': ('127.0.0.1', 0), 'server': ('testserver', 80),
+        'headers': [
+            (b'host', b'testserver'), (b'content-type', b'application/json'),
+            (b'content-length', str(len(BODY)).encode()),
+        ],
+    }
+
+
+class Command(BaseCommand):
+    help = (
+        "Compare concurrent-request throughput of the AI description endpoint "
+        "under WSGI (sync view, a fixed pool of worker threads) and ASGI (the "
+        "sync view, and the async view from shop.async_views) against a local "
+        "fake upstream that answers after --upstream-delay seconds. Requests go "
+        "straight into Django's WSGI/ASGI handlers with the project middleware; "
+        "no network server or external service is involved."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('--requests', type=int, default=200)
+        parser.add_argument('--concurrency', type=int, default=50, help="Requests in flight from clients")
+        parser.add_argument('--workers', type=int, default=8, help="WSGI worker threads")
+        parser.add_argument('--upstream-delay', type=float, default=0.2, help="Seconds the fake upstream takes")
+        parser.add_argument('--output', help="Write results as JSON to this file")
+
+    def wsgi(self, path, requests, concurrency, workers):
+        handler = WSGIHandler()
+
+        def handle():
+            statuses = []
+            response = handler(wsgi_environ(path), lambda status, headers: statuses.append(status))
+            try:
+                b''.join(response)
+            finally:
+                response.close()
+            return int(statuses[0].split()[0])
+
+        timings, statuses = [], []
+        remaining = iter(range(requests))
+        lock = threading.Lock()
+
+        def client(server):
+            # Each client sends its next request once the previous one is answered
+            while True:
+                with lock:
+                    if next(remaining, None) is None:
+                        return
+                start = perf_counter()
+                status = server.submit(handle).result()
+                timings.append((perf_counter() - start) * 1000)
+                statuses.append(status)
+
+        start = perf_counter()
+        with ThreadPoolExecutor(workers) as server, ThreadPoolExecutor(concurrency) as clients:
+            for future in [clients.submit(client, server) for _ in range(concurrency)]:
+                future.result()
+        return perf_counter() - start, timings, statuses
+
+    def asgi(self, path, requests, concurrency):
+        async def request(app, timings, statuses):
+            messages = [{'type': 'http.request', 'body': BODY, 'more_body': False}]
+            status = None
+
+            async def receive():
+                if messages:
+                    return messages.pop()
+                # Django keeps listening for a disconnect until the response is sent
+                await asyncio.Future()
+
+            async def send(message):
+                nonlocal status
+                if message['type'] == 'http.response.start':
+                    status = message['status']
+
+            start = perf_counter()
+            await app(asgi_scope(path), receive, send)
+            timings.append((perf_counter() - start) * 1000)
+            statuses.append(status)
+
+        async def run():
+            app = ASGIHandler()
+            timings, statuses = [], []
+            remaining = iter(range(requests))
+
+            async def client():
+                while next(remaining, None) is not None:
+                    await request(app, timings, statuses)
+
+            start = perf_counter()
+            await asyncio.gather(*(client() for _ in range(concurrency)))
+            return perf_counter() - start, timings, statuses
+
+        return asyncio.run(run())
+
+    def handle(self, *args, **options):
+        if min(options['requests'], options['concurrency'], options['workers']) < 1:
+            raise CommandError("--requests, --concurrency and --workers must be at least 1")
+        requests, concurrency = options['requests'], options['concurrency']
+
+        upstream = fake_upstream(options['upstream_delay'])
+        setup_test_environment()
+        old_name = connection.creation.create_test_db(verbosity=0, autoclobber=True, serialize=False)
+        logging.disable(logging.INFO)
+        results = {}
+        try:
+            SystemSettings.objects.update_or_create(pk=1, defaults={
+                'ai_api_key': 'bench-key',
+                'ap_api_url': f'http://127.0.0.1:{upstream.server_port}/v1',
+            })
+            self.stdout.write(
+                f"{requests} requests, {concurrency} concurrent clients, upstream delay "
+                f"{options['upstream_delay'] * 1000:.0f} ms, {options['workers']} WSGI workers"
+            )
+            with override_settings(ROOT_URLCONF=__name__, DATABASE_REPLICAS=[], SHOP_NPLUSONE={'ENABLED': False}):
+                runs = [
+                    ('wsgi.sync_view', lambda: self.wsgi(
+                        '/sync/generate-seo-keywords/', requests, concurrency, options['workers'])),
+                    ('asgi.sync_view', lambda: self.asgi('/sync/generate-seo-keywords/', requests, concurrency)),
+                    ('asgi.async_view', lambda: self.asgi('/async/generate-seo-keywords/', requests, concurrency)),
+                ]
+                for name, run in runs:
+                    elapsed, timings, statuses = run()
+                    failures = sum(status != 200 for status in statuses)
+                    result = results[name] = {
+                        **summarize(timings, [0]),
+                        'throughput_rps': round(len(timings) / elapsed, 1),
+                        'failures': failures,
+                    }
+                    del result['queries']
+                    self.stdout.write(
+                        f"  {name:16} {result['throughput_rps']:8.1f} req/s  p50 {result['p50_ms']:8.1f} ms  "
+                        f"p95 {result['p95_ms']:8.1f} ms  failures {failures}"
+                    )
+        finally:
+            logging.disable(logging.NOTSET)
+            connection.creation.destroy_test_db(old_name, verbosity=0)
+            teardown_test_environment()
+            upstream.shutdown()
+
+        if options['output']:
+            with open(options['output'], 'w') as f:
+                json.dump({'meta': {key: options[key] for key in (
+                    'requests', 'concurrency', 'workers', 'upstream_delay',
+                )}, 'results': results}, f, indent=2)
+            self.stdout.write(f"Wrote {options['output']}")
@@ -0,0 +1,31 @@
+from django.core.management.base import BaseCommand
+
+from shop import retention
+
+
+class Command(BaseCommand):
+    help = (
+        "Collapse read notifications older than the retention window into "
+        "per-type summaries and archive or delete them in batches. "
+        "Defaults come from settings.NOTIFICATION_RETENTION."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('--days', type=int, help="Keep read notifications this many days")
+        parser.add_argument('--mode', choices=retention.RETENTION_MODES)
+        parser.add_argument('--batch-size', type=int)
+        parser.add_argument('--no-summary', action='store_true',
+                            help="Remove without writing summary notifications")
+
+    def handle(self, *args, **options):
+        totals = retention.compact_notifications(
+            days=options['days'],
+            mode=options['mode'],
+            batch_size=options['batch_size'],
+            summarize=False if options['no_summary'] else None,
+            progress=lambda totals: self.stdout.write(f"{totals['removed']} notifications compacted"),
+        )
+        self.stdout.write(self.style.SUCCESS(
+            f"Removed {totals['removed']} notifications "
+            f"({totals['archived']} archived, {totals['summaries']} new summaries)"
+        ))
@@ -0,0 +1,44 @@
+from django.core.management.base import BaseCommand, CommandError
+from rest_framework.exceptions import ValidationError
+
+from shop import exports
+from shop.db_router import replica_reads
+
+
+class Command(BaseCommand):
+    help = "Stream orders, customers or products to CSV/JSONL with constant memory."
+
+    def add_arguments(self, parser):
+        parser.add_argument('kind', choices=sorted(exports.EXPORTS))
+        parser.add_argument('--output-format', choices=exports.EXPORT_FORMATS, default='csv')
+        parser.add_argument('--file', help="Write to this path instead of stdout")
+        parser.add_argument('--chunk-size', type=int, default=exports.DEFAULT_CHUNK_SIZE)
+        parser.add_argument(
+            '--filter', action='append', default=[], metavar='KEY=VALUE',
+            help="Same filters as the list views, e.g. --filter user_id=3 --filter status=active",
+        )
+
+    def handle(self, *args, **options):
+        params = {}
+        for item in options['filter']:
+            key, sep, value = item.partition('=')
+            if not sep:
+                raise CommandError(f"Filters must look like KEY=VALUE, got '{item}'")
+            params[key] = value
+
+        try:
+            lines = exports.stream_export(
+                options['kind'],
+                options['output_format'],
+                params,
+                chunk_size=options['chunk_size'],
+            )
+        except ValidationError as e:
+            raise CommandError(f"Invalid filter: {e.detail}")
+        with replica_reads():
+            if options['file']:
+                with open(options['file'], 'w', newline='') as fh:
+                    fh.writelines(lines)
+            else:
+                for line in lines:
+                    self.stdout.write(line, ending='')
@@ -0,0 +1,26 @@
+from django.core.management.base import BaseCommand
+
+from shop import analytics
+from shop.db_router import replica_reads
+
+
+class Command(BaseCommand):
+    help = (
+        "Export orders and order items to a columnar snapshot used by the "
+        "sales report endpoint. Schedule it (e.g. hourly from cron)."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('--output-dir', help="Defaults to settings.ANALYTICS_SNAPSHOT_DIR")
+        parser.add_argument('--chunk-size', type=int, default=2000)
+
+    def handle(self, *args, **options):
+        with replica_reads():
+            manifest = analytics.export_snapshot(
+                root=options['output_dir'],
+                chunk_size=options['chunk_size'],
+            )
+        self.stdout.write(self.style.SUCCESS(
+            f"Exported {manifest['order_count']} orders / {manifest['item_count']} items "
+            f"to {manifest['name']}"
+        ))
@@ -0,0 +1,235 @@
+import random
+from array import array
+from datetime import timedelta
+from decimal import Decimal
+from time import perf_counter
+
+from django.contrib.auth.hashers import make_password
+from django.core.management.base import BaseCommand, CommandError
+from django.db import transaction
+from django.utils import timezone
+
+from shop import datagen
+from shop.datagen import NOUNS, WORDS, ZipfSampler, explicit_timestamps
+from shop.models import (
+    Category, Notification, Order, OrderItem, Product, ProductReview, User, Vendor,
+)
+
+
+class Command(BaseCommand):
+    help = (
+        "Generate a large deterministic catalog in the configured database: "
+        "vendors, customers, a multi-level category tree with long-tail product "
+        "counts, and products, reviews, orders and notifications whose product "
+        "and customer choice follows a Zipf distribution. Rows are written with "
+        "bulk_create in --batch-size batches; the same --seed always produces the "
+        "same data. Prints row counts and rows per second for each model."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('--products', type=int, default=100000)
+        parser.add_argument('--reviews', type=int, default=300000)
+        parser.add_argument('--orders', type=int, default=100000)
+        parser.add_argument('--notifications', type=int, default=200000)
+        parser.add_argument('--customers', type=int, default=20000)
+        parser.add_argument('--vendors', type=int, default=500)
+        parser.add_argument('--category-roots', type=int, default=12)
+        parser.add_argument('--category-depth', type=int, default=3)
+        parser.add_argument('--category-fanout', type=int, default=8)
+        parser.add_argument('--zipf', type=float, default=1.1,
+                            help="Zipf exponent for product and category popularity")
+        parser.add_argument('--days', type=int, default=730, help="Spread orders and reviews over this many days")
+        parser.add_argument('--batch-size', type=int, default=5000)
+        parser.add_argument('--seed', type=int, default=0)
+        parser.add_argument('--prefix', help="Prefix for generated slugs, SKUs and usernames (default gen<seed>)")
+
+    def batches(self, total, batch_size):
+        for start in range(0, total, batch_size):
+            yield start, min(batch_size, total - start)
+
+    def timed(self, label, generate):
+        start = perf_counter()
+        rows = generate()
+        elapsed = perf_counter() - start
+        self.summary.append((label, rows, elapsed))
+        self.stdout.write(f"  {label:14} {rows:>10,} rows  {elapsed:8.1f}s  {rows / max(elapsed, 1e-9):>10,.0f} rows/s")
+
+    def progress(self, label, done, total):
+        if self.verbosity > 1:
+            self.stdout.write(f"    {label}: {done:,}/{total:,}")
+
+    def create_users(self, label, count, **flags):
+        pks = array('q')
+        for start, size in self.batches(count, self.batch_size):
+            with transaction.atomic():
+                users = datagen.bulk_insert(User, (
+                    User(username=f'{self.prefix}-{label}{i}', email=f'{self.prefix}-{label}{i}@example.com',
+                         password=self.password, **flags)
+                    for i in range(start, start + size)
+                ), self.batch_size)
+            pks.extend(user.pk for user in users)
+        return pks
+
+    def handle(self, *args, **options):
+        self.verbosity = options['verbosity']
+        self.batch_size = options['batch_size']
+        if self.batch_size < 1:
+            raise CommandError("--batch-size must be at least 1")
+        self.prefix = options['prefix'] or f"gen{options['seed']}"
+        if Product.objects.filter(sku__startswith=f'{self.prefix}-').exists():
+            raise CommandError(f"Data with prefix '{self.prefix}' already exists; use another --seed or --prefix")
+
+        rng = random.Random(options['seed'])
+        self.password = make_password(datagen.BENCH_PASSWORD)
+        self.summary = []
+        now = timezone.now()
+        horizon = options['days'] * 24 * 3600
+        started = perf_counter()
+        self.stdout.write(f"Generating catalog '{self.prefix}' (seed {options['seed']}, batch size {self.batch_size})")
+
+        state = {}
+
+        def vendors():
+            user_pks = self.create_users('vendor', options['vendors'], is_vendor=True)
+            Vendor.objects.bulk_create(
+                (Vendor(user_id=pk, business_name=f'{rng.choice(WORDS).title()} Goods {i}', approved=rng.random() < 0.9)
+                 for i, pk in enumerate(user_pks)),
+                batch_size=self.batch_size,
+            )
+            state['vendors'] = user_pks
+            return len(user_pks)
+
+        def customers():
+            state['customers'] = self.create_users('user', options['customers'], is_customer=True)
+            return len(state['customers'])
+
+        def categories():
+            with transaction.atomic():
+                leaves = datagen.category_tree(
+                    rng, options['category_roots'], options['category_depth'], options['category_fanout'],
+                    prefix=self.prefix,
+                )
+            state['categories'] = ZipfSampler([leaf.pk for leaf in leaves], options['zipf'], rng)
+            return Category.objects.filter(slug__startswith=f'{self.prefix}-').count()
+
+        def products():
+            pks, prices = [], []
+            vendor_pks = state['vendors']
+            category = state['categories']
+            for start, size in self.batches(options['products'], self.batch_size):
+                batch = []
+                for i in range(start, start + size):
+                    cents = int(rng.lognormvariate(8, 1)) + 99
+                    batch.append(Product(
+                        name=f'{rng.choice(WORDS).title()} {rng.choice(NOUNS)} {i}',
+                        slug=f'{self.prefix}-product-{i}',
+                        description=' '.join(rng.choices(WORDS + NOUNS, k=20)),
+                        price=Decimal(cents) / 100,
+                        discount_price=Decimal(cents * 8 // 10) / 100 if rng.random() < 0.15 else None,
+                        category_id=category(),
+                        vendor_id=vendor_pks[rng.randrange(len(vendor_pks))],
+                        stock=rng.randint(0, 1000),
+                        sku=f'{self.prefix}-{i}',
+                        active=rng.random() < 0.95,
+                        featured=rng.random() < 0.02,
+                    ))
+                with transaction.atomic():
+                    batch = datagen.bulk_insert(Product, batch, self.batch_size)
+                pks.extend(product.pk for product in batch)
+                prices.extend(int(product.price * 100) for product in batch)
+                self.progress('products', start + size, options['products'])
+            state['prices'] = dict(zip(pks, prices))
+            state['products'] = ZipfSampler(pks, options['zipf'], rng)
+            return len(pks)
+
+        def created_at():
+            # Newer rows are more common: age skews towards zero
+            return now - timedelta(seconds=int(horizon * rng.random() ** 2))
+
+        def reviews():
+            product = state['products']
+            customer_pks = state['customers']
+            with explicit_timestamps(ProductReview._meta.get_field('created')):
+                for start, size in self.batches(options['reviews'], self.batch_size):
+                    with transaction.atomic():
+                        ProductReview.objects.bulk_create(
+                            (ProductReview(
+                                product_id=product(),
+                                user_id=customer_pks[rng.randrange(len(customer_pks))],
+                                rating=rng.choices((1, 2, 3, 4, 5), weights=(5, 5, 10, 30, 50))[0],
+                                title='Review', content=' '.join(rng.choices(WORDS, k=12)),
+                                created=created_at(),
+                            ) for _ in range(size)),
+                            batch_size=self.batch_size,
+                        )
+                    self.progress('reviews', start + size, options['reviews'])
+            return options['reviews']
+
+        def orders():
+            product = state['products']
+            customer_pks = state['customers']
+            # Repeat buyers: a Zipf over customers too
+            customer = ZipfSampler(customer_pks, 1.0, rng)
+            prices = state['prices']
+            item_count = 0
+            with explicit_timestamps(Order._meta.get_field('created')):
+                for start, size in self.batches(options['orders'], self.batch_size):
+                    lines = [product.sample(rng.choice((1, 1, 1, 2, 2, 3, 4))) for _ in range(size)]
+                    quantities = [[rng.choice((1, 1, 1, 2, 3)) for _ in order_lines] for order_lines in lines]
+                    with transaction.atomic():
+                        batch = datagen.bulk_insert(Order, (
+                            Order(
+                                user_id=customer(),
+                                order_number=f'{self.prefix}-{start + i}',
+                                status=rng.choices('PCF', weights=(15, 80, 5))[0],
+                                total=Decimal(sum(prices[pk] * qty for pk, qty in zip(lines[i], quantities[i]))) / 100,
+                                payment_method='credit',
+                                paid=rng.random() < 0.8,
+                                created=created_at(),
+                            ) for i in range(size)
+                        ), self.batch_size)
+                        items = [
+                            OrderItem(order_id=order.pk, product_id=pk,
+                                      price=Decimal(prices[pk]) / 100, quantity=qty)
+                            for order, order_lines, order_quantities in zip(batch, lines, quantities)
+                            for pk, qty in zip(order_lines, order_quantities)
+                        ]
+                        OrderItem.objects.bulk_create(items, batch_size=self.batch_size)
+                    item_count += len(items)
+                    self.progress('orders', start + size, options['orders'])
+            return options['orders'] + item_count
+
+        def notifications():
+            customer_pks = state['customers']
+            recipient = ZipfSampler(customer_pks, 0.8, rng)
+            types = [choice for choice, _ in Notification.NOTIFICATION_TYPES]
+            with explicit_timestamps(Notification._meta.get_field('created_at')):
+                for start, size in self.batches(options['notifications'], self.batch_size):
+                    with transaction.atomic():
+                        # bulk_create skips the counter signals; NotificationState backfills on first read
+                        Notification.objects.bulk_create(
+                            (Notification(
+                                recipient_id=recipient(),
+                                title='Order update', message='Your order has shipped.',
+                                notification_type=rng.choices(types, weights=(50, 5, 20, 20, 5))[0],
+                                is_read=rng.random() < 0.7,
+                                created_at=created_at(),
+                            ) for _ in range(size)),
+                            batch_size=self.batch_size,
+                        )
+                    self.progress('notifications', start + size, options['notifications'])
+            return options['notifications']
+
+        self.timed('vendors', vendors)
+        self.timed('customers', customers)
+        self.timed('categories', categories)
+        self.timed('products', products)
+        self.timed('reviews', reviews)
+        self.timed('orders+items', orders)
+        self.timed('notifications', notifications)
+
+        elapsed = perf_counter() - started
+        rows = sum(count for _, count, _ in self.summary)
+        self.stdout.write(self.style.SUCCESS(
+            f"Generated {rows:,} rows in {elapsed:.1f}s ({rows / max(elapsed, 1e-9):,.0f} rows/s)"
+        ))
@@ -0,0 +1,46 @@
+import json
+
+from django.core.management.base import BaseCommand, CommandError
+
+from shop import imports
+
+
+class Command(BaseCommand):
+    help = "Bulk import products from a CSV or JSONL file, validating in batches."
+
+    def add_arguments(self, parser):
+        parser.add_argument('path')
+        parser.add_argument('--import-format', choices=imports.IMPORT_FORMATS,
+                            help="Defaults to the file extension")
+        parser.add_argument('--vendor', type=int, help="Vendor id for rows without one")
+        parser.add_argument('--batch-size', type=int, default=imports.DEFAULT_BATCH_SIZE)
+        parser.add_argument('--dry-run', action='store_true',
+                            help="Validate everything but write nothing")
+
+    def handle(self, *args, **options):
+        import_format = options['import_format'] or imports.detect_format(options['path'])
+        importer = imports.ProductImporter(
+            vendor=options['vendor'],
+            batch_size=options['batch_size'],
+            dry_run=options['dry_run'],
+        )
+        try:
+            fh = open(options['path'], encoding='utf-8-sig', newline='')
+        except OSError as e:
+            raise CommandError(str(e))
+
+        with fh:
+            for event in importer.run(imports.read_rows(fh, import_format)):
+                if event['event'] == 'done':
+                    self.stdout.write(self.style.SUCCESS(
+                        f"Processed {event['processed']} rows: "
+                        f"{event['created']} created, {event['failed']} failed"
+                        + (" (dry run)" if event['dry_run'] else "")
+                    ))
+                    continue
+                self.stdout.write(
+                    f"Batch {event['batch']}: {event['processed']} processed, "
+                    f"{event['batch_created']} created in this batch"
+                )
+                for error in event['errors']:
+                    self.stderr.write(json.dumps(error, default=str))
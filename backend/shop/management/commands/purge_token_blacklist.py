@@ -0,0 +1,14 @@
+from django.core.management.base import BaseCommand
+
+from shop.token_blacklist import blacklist
+
+
+class Command(BaseCommand):
+    help = (
+        "Delete blacklisted refresh tokens that have expired. Refreshes also "
+        "purge automatically every TOKEN_BLACKLIST['PURGE_INTERVAL'] seconds."
+    )
+
+    def handle(self, *args, **options):
+        deleted = blacklist.purge()
+        self.stdout.write(self.style.SUCCESS(f"Purged {deleted} expired blacklist entries"))
@@ -0,0 +1,233 @@
+import json
+import logging
+import platform
+import statistics
+from time import perf_counter
+
+import django
+from django.core.management.base import BaseCommand, CommandError
+from django.db import connection, transaction
+from django.test.utils import (
+    CaptureQueriesContext, override_settings, setup_test_environment, teardown_test_environment,
+)
+from django.utils import timezone
+from rest_framework.renderers import JSONRenderer
+from rest_framework.test import APIClient
+
+from shop import datagen, projections
+from shop.fast_json import FastJSONRenderer
+from shop.models import Cart, Order, Product
+from shop.serializers import CartSerializer, OrderSerializer, ProductSerializer
+
+PERCENTILES = (50, 90, 95, 99)
+
+
+def _percentile(values, percent):
+    values = sorted(values)
+    return values[min(len(values) - 1, int(len(values) * percent / 100))]
+
+
+def summarize(timings, query_counts):
+    summary = {
+        'iterations': len(timings),
+        'min_ms': min(timings),
+        'mean_ms': statistics.mean(timings),
+        'max_ms': max(timings),
+        'queries': max(query_counts),
+    }
+    for percent in PERCENTILES:
+        summary[f'p{percent}_ms'] = _percentile(timings, percent)
+    return {key: round(value, 3) if isinstance(value, float) else value for key, value in summary.items()}
+
+
+def compare(results, baseline, tolerance):
+    """Benchmarks whose p50/p95 grew by more than ``tolerance`` or that run more queries."""
+    regressions = []
+    for name, result in results.items():
+        base = baseline.get(name)
+        if base is None:
+            continue
+        for key in ('p50_ms', 'p95_ms'):
+            if result[key] > base[key] * (1 + tolerance):
+                regressions.append(f"{name}: {key} {base[key]:.3f} -> {result[key]:.3f}")
+        if result['queries'] > base['queries']:
+            regressions.append(f"{name}: queries {base['queries']} -> {result['queries']}")
+    return regressions
+
+
+class Command(BaseCommand):
+    help = (
+        "Seed a throwaway test database with shop.datagen and benchmark the hot "
+        "serializers, the JSON renderers and endpoints (catalog, cart, checkout, "
+        "notifications, dashboard) through the test client. Reports latency percentiles and "
+        "query counts per benchmark, optionally as JSON, and compares them with "
+        "a stored baseline. Runs entirely offline; every iteration is rolled back."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('--scale', choices=sorted(datagen.SCALES), default='small')
+        parser.add_argument('--seed', type=int, default=0)
+        parser.add_argument('--iterations', type=int, default=30)
+        parser.add_argument('--warmup', type=int, default=3)
+        parser.add_argument('--only', help="Run only benchmarks whose name contains this text")
+        parser.add_argument('--output', help="Write results as JSON to this file")
+        parser.add_argument('--baseline', help="JSON file from an earlier --output to compare with")
+        parser.add_argument('--tolerance', type=float, default=0.25,
+                            help="Allowed p50/p95 slowdown against the baseline (0.25 = 25%%)")
+        parser.add_argument('--fail-on-regression', action='store_true')
+
+    def benchmarks(self, data):
+        customer, admin = data['customer'], data['admin']
+        product, category = data['product'], data['category']
+        clients = {
+            'anonymous': APIClient(),
+            'customer': self.login(customer.username),
+            'admin': self.login(admin.username),
+        }
+        checkout = {
+            'shipping_address': {
+                'street': '1 Bench St', 'city': 'Springfield', 'state': 'IL',
+                'zip_code': '62701', 'country': 'US',
+            },
+            'payment_method': 'credit',
+        }
+
+        def get(client, path, params=None):
+            return lambda: clients[client].get(path, params or {})
+
+        def post(client, path, body):
+            return lambda: clients[client].post(path, body, format='json')
+
+        def serialize(serializer_class, objects, **kwargs):
+            # Loading the rows is timed too, as it would be in a view
+            return lambda: serializer_class(objects(), **kwargs).data
+
+        products = lambda: Product.objects.filter(active=True).order_by('-created')[:20]
+        orders = lambda: Order.objects.filter(user=customer)[:20]
+        page = lambda: list(products())
+        customer_orders = lambda: list(orders())
+        payloads = {
+            'product_list': ProductSerializer(page(), many=True).data,
+            'order_list': OrderSerializer(customer_orders(), many=True).data,
+        }
+
+        def project(projection, queryset):
+            return lambda: projection.render(projection.values(queryset()))
+
+        def render(renderer_class, payload):
+            renderer = renderer_class()
+            return lambda: renderer.render(payloads[payload])
+
+        return [
+            ('serializer.product_list', serialize(ProductSerializer, page, many=True)),
+            ('serializer.cart', serialize(CartSerializer, lambda: Cart.objects.get(user=customer))),
+            ('serializer.order_list',
+             serialize(OrderSerializer, customer_orders, many=True)),
+            # The same pages through the serializer-free read path
+            ('projection.product_list', project(projections.PRODUCT_LIST, products)),
+            ('projection.order_list', project(projections.ORDER_LIST, orders)),
+            # The same payloads through the stock renderer and the orjson one
+            ('render.product_list.json', render(JSONRenderer, 'product_list')),
+            ('render.product_list.orjson', render(FastJSONRenderer, 'product_list')),
+            ('render.order_list.json', render(JSONRenderer, 'order_list')),
+            ('render.order_list.orjson', render(FastJSONRenderer, 'order_list')),
+            ('endpoint.catalog.product_list', get('anonymous', '/api/products/')),
+            ('endpoint.catalog.product_list_filtered',
+             get('anonymous', '/api/products/', {'category': category.slug, 'ordering': 'price'})),
+            ('endpoint.catalog.product_detail', get('anonymous', f'/api/products/id/{product.pk}/')),
+            ('endpoint.catalog.categories', get('anonymous', '/api/categories/')),
+            ('endpoint.cart.detail', get('customer', '/api/cart/')),
+            ('endpoint.cart.add_item', post('customer', '/api/cart/items/', {'product': product.pk, 'quantity': 1})),
+            ('endpoint.checkout.create_order', post('customer', '/api/orders/create/', checkout)),
+            ('endpoint.orders.list', get('customer', '/api/orders/')),
+            ('endpoint.notifications.list', get('customer', '/api/notifications/')),
+            ('endpoint.notifications.unread_count', get('customer', '/api/notifications/unread-count/')),
+            ('endpoint.dashboard.stats', get('admin', '/api/admin/dashboard-stats/')),
+            ('endpoint.dashboard.recent_activity', get('admin', '/api/admin/recent-activity/')),
+        ]
+
+    def login(self, username):
+        client = APIClient()
+        response = client.post('/api/token/', {'username': username, 'password': datagen.BENCH_PASSWORD}, format='json')
+        if response.status_code != 200:
+            raise CommandError(f"Could not log in as {username}: {response.status_code} {response.content[:200]}")
+        client.credentials(HTTP_AUTHORIZATION=f"Bearer {response.data['access']}")
+        return client
+
+    def measure(self, name, run, warmup, iterations):
+        timings, query_counts = [], []
+        for i in range(warmup + iterations):
+            with transaction.atomic():
+                with CaptureQueriesContext(connection) as queries:
+                    start = perf_counter()
+                    result = run()
+                    elapsed = (perf_counter() - start) * 1000
+                transaction.set_rollback(True)
+            status_code = getattr(result, 'status_code', 200)
+            if status_code >= 400:
+                raise CommandError(f"{name} returned {status_code}: {result.content[:300]}")
+            if i >= warmup:
+                timings.append(elapsed)
+                query_counts.append(len(queries))
+        return summarize(timings, query_counts)
+
+    def handle(self, *args, **options):
+        if options['iterations'] < 1:
+            raise CommandError("--iterations must be at least 1")
+        baseline = None
+        if options['baseline']:
+            with open(options['baseline']) as f:
+                baseline = json.load(f)['results']
+
+        setup_test_environment()
+        old_name = connection.creation.create_test_db(verbosity=0, autoclobber=True, serialize=False)
+        # Request logging and the N+1 detector would be measured along with the views
+        logging.disable(logging.INFO)
+        try:
+            with override_settings(DATABASE_REPLICAS=[], SHOP_NPLUSONE={'ENABLED': False}):
+                start = perf_counter()
+                data = datagen.seed(options['scale'], options['seed'])
+                self.stdout.write(
+                    f"Seeded '{options['scale']}' data in {perf_counter() - start:.1f}s: "
+                    + ', '.join(f'{count} {model}' for model, count in data['counts'].items())
+                )
+                results = {}
+                for name, run in self.benchmarks(data):
+                    if options['only'] and options['only'] not in name:
+                        continue
+                    result = results[name] = self.measure(name, run, options['warmup'], options['iterations'])
+                    self.stdout.write(
+                        f"  {name:42} p50 {result['p50_ms']:8.2f} ms  p95 {result['p95_ms']:8.2f} ms  "
+                        f"p99 {result['p99_ms']:8.2f} ms  queries {result['queries']:4}"
+                    )
+        finally:
+            logging.disable(logging.NOTSET)
+            connection.creation.destroy_test_db(old_name, verbosity=0)
+            teardown_test_environment()
+
+        report = {
+            'meta': {
+                'created': timezone.now().isoformat(),
+                'scale': options['scale'],
+                'seed': options['seed'],
+                'iterations': options['iterations'],
+                'database': connection.vendor,
+                'django': django.get_version(),
+                'python': platform.python_version(),
+            },
+            'results': results,
+        }
+        if options['output']:
+            with open(options['output'], 'w') as f:
+                json.dump(report, f, indent=2)
+            self.stdout.write(f"Wrote {options['output']}")
+
+        if baseline is not None:
+            regressions = compare(results, baseline, options['tolerance'])
+            if not regressions:
+                self.stdout.write(self.style.SUCCESS("No regressions against the baseline"))
+            else:
+                for regression in regressions:
+                    self.stdout.write(self.style.WARNING(f"  regression: {regression}"))
+                if options['fail_on_regression']:
+                    raise CommandError(f"{len(regressions)} regression(s) against {options['baseline']}")
@@ -0,0 +1,49 @@
+from django.core.management.base import BaseCommand, CommandError
+
+from shop import fanout
+from shop.models import Notification
+
+
+class Command(BaseCommand):
+    help = (
+        "Send a notification to an audience in chunked bulk inserts. "
+        "Recipients who already have this notification (same product, or same "
+        "audience, type, title and message) are skipped."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('--audience', choices=fanout.AUDIENCES, required=True)
+        parser.add_argument('--title', required=True)
+        parser.add_argument('--message', required=True)
+        parser.add_argument('--type', dest='notification_type', default='system',
+                            choices=[choice for choice, _ in Notification.NOTIFICATION_TYPES])
+        parser.add_argument('--product', type=int, help="Product id for the product_buyers audience")
+        parser.add_argument('--user', type=int, action='append', dest='user_ids',
+                            help="Recipient id for the users audience (repeatable)")
+        parser.add_argument('--chunk-size', type=int, default=fanout.DEFAULT_CHUNK_SIZE)
+
+    def handle(self, *args, **options):
+        audience = options['audience']
+        if audience == 'product_buyers' and not options['product']:
+            raise CommandError("--product is required for the product_buyers audience")
+        if audience == 'users' and not options['user_ids']:
+            raise CommandError("--user is required for the users audience")
+
+        totals = fanout.fan_out(
+            fanout.resolve_recipients(audience, product_id=options['product'], user_ids=options['user_ids']),
+            options['title'],
+            options['message'],
+            options['notification_type'],
+            related_object=fanout.related_object_for(audience, options['product']),
+            broadcast_key=fanout.broadcast_key(
+                audience, options['title'], options['message'], options['notification_type'], options['product'],
+            ),
+            chunk_size=options['chunk_size'],
+            progress=lambda totals: self.stdout.write(
+                f"{totals['recipients']} recipients, {totals['created']} notified"
+            ),
+        )
+        self.stdout.write(self.style.SUCCESS(
+            f"Notified {totals['created']} of {totals['recipients']} recipients "
+            f"({totals['skipped']} already had this notification)"
+        ))
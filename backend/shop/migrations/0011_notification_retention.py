@@ -0,0 +1,38 @@
+# Generated by Django 5.1.4 on 2026-10-19 03:27
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('shop', '0010_hot_query_indexes'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='NotificationArchive',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('original_id', models.PositiveBigIntegerField()),
+                ('recipient_id', models.PositiveBigIntegerField(db_index=True)),
+                ('title', models.CharField(max_length=255)),
+                ('message', models.TextField()),
+                ('notification_type', models.CharField(max_length=20)),
+                ('created_at', models.DateTimeField()),
+                ('related_object_id', models.PositiveIntegerField(blank=True, null=True)),
+                ('related_content_type_id', models.PositiveIntegerField(blank=True, null=True)),
+                ('archived_at', models.DateTimeField(auto_now_add=True)),
+            ],
+        ),
+        migrations.AddField(
+            model_name='notification',
+            name='collapsed_count',
+            field=models.PositiveIntegerField(default=0),
+        ),
+        migrations.AddField(
+            model_name='notificationstate',
+            name='read_watermark',
+            field=models.DateTimeField(blank=True, null=True),
+        ),
+    ]
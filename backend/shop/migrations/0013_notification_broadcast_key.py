@@ -0,0 +1,23 @@
+# Generated by Django 5.1.4 on 2026-10-19 04:18
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('contenttypes', '0002_remove_content_type_name'),
+        ('shop', '0012_product_effective_price'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='notification',
+            name='broadcast_key',
+            field=models.CharField(blank=True, default='', max_length=32),
+        ),
+        migrations.AddIndex(
+            model_name='notification',
+            index=models.Index(fields=['broadcast_key', 'recipient'], name='shop_notif_broadcast_idx'),
+        ),
+    ]
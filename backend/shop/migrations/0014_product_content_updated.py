@@ -0,0 +1,22 @@
+from django.db import migrations, models
+import django.utils.timezone
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('shop', '0013_notification_broadcast_key'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='product',
+            name='content_updated',
+            field=models.DateTimeField(auto_now=True, default=django.utils.timezone.now),
+            preserve_default=False,
+        ),
+        migrations.RunSQL(
+            'UPDATE shop_product SET content_updated = updated',
+            migrations.RunSQL.noop,
+        ),
+    ]
@@ -1,4 +1,5 @@
 from django.db import models
+from django.db.models.functions import Coalesce, NullIf
 from django.contrib.auth.models import AbstractUser, Group, Permission
 from django.core.validators import MinValueValidator
 from django.utils.translation import gettext_lazy as _
@@ -36,6 +37,14 @@ class User(AbstractUser):
         related_query_name="shop_user",
     )
 
+    class Meta(AbstractUser.Meta):
+        indexes = [
+            # Login by email (shop.backends.UsernameOrEmailBackend)
+            models.Index(fields=['email'], name='shop_user_email_idx'),
+            # RecentActivityView: registrations in the last week
+            models.Index(fields=['-date_joined'], name='shop_user_joined_idx'),
+        ]
+
     def __str__(self):
         return self.username
 
@@ -86,6 +95,10 @@ class Address(models.Model):
 
     class Meta:
         verbose_name_plural = "Addresses"
+        indexes = [
+            # AddressViewSet: clearing the previous default of a type
+            models.Index(fields=['user', 'address_type', 'default'], name='shop_addr_user_type_idx'),
+        ]
 
     def __str__(self):
         return f"{self.street}, {self.city}, {self.country}"
@@ -119,21 +132,50 @@ class Product(models.Model):
         null=True,
         validators=[MinValueValidator(0)]
     )
+    # What the customer pays: the discount price when set (and non-zero).
+    # Computed by the database, so QuerySet.update() and bulk_update() keep it
+    # current and price filters/ordering can use an index
+    effective_price = models.GeneratedField(
+        expression=Coalesce(NullIf('discount_price', models.Value(0)), 'price'),
+        output_field=models.DecimalField(max_digits=10, decimal_places=2),
+        db_persist=True,
+    )
     category = models.ForeignKey(Category, on_delete=models.SET_NULL, null=True)
     vendor = models.ForeignKey(Vendor, on_delete=models.CASCADE)
     stock = models.PositiveIntegerField(default=0)
     sku = models.CharField(max_length=50, unique=True)
     created = models.DateTimeField(auto_now_add=True)
     updated = models.DateTimeField(auto_now=True)
+    # Moves with ``updated`` and also when embedded reviews, images or vendor
+    # details change (shop/signals.py); conditional GET versions on it so
+    # ``updated`` stays the bulk-update concurrency token for the row itself
+    content_updated = models.DateTimeField(auto_now=True)
     active = models.BooleanField(default=True)
     featured = models.BooleanField(default=False)
     thumbnail_image = models.ImageField(upload_to='products/', null=True)
 
+    class Meta:
+        # Storefront queries only ever read active products; partial indexes
+        # also match SQLite's bare ``WHERE "active"`` rendering of active=True
+        indexes = [
+            # ProductListView: optionally by category, filtered and ordered by
+            # effective price or newest first
+            models.Index(fields=['effective_price'], condition=models.Q(active=True),
+                         name='shop_prod_active_eprice_idx'),
+            models.Index(fields=['-created'], condition=models.Q(active=True), name='shop_prod_active_created_idx'),
+            models.Index(fields=['category', 'effective_price'], condition=models.Q(active=True),
+                         name='shop_prod_cat_eprice_idx'),
+            # VendorProductsView
+            models.Index(fields=['vendor', '-created'], condition=models.Q(active=True), name='shop_prod_vendor_idx'),
+        ]
+
     def __str__(self):
         return self.name
 
     @property
     def current_price(self):
+        # effective_price as of the last load: computed here so it is right
+        # for unsaved and just-saved instances too
         return self.discount_price if self.discount_price else self.price
 
 
@@ -157,6 +199,14 @@ class ProductReview(models.Model):
     content = models.TextField()
     created = models.DateTimeField(auto_now_add=True)
 
+    class Meta:
+        indexes = [
+            # ProductReviewListView
+            models.Index(fields=['product', '-created'], name='shop_review_product_idx'),
+            # ProductReviewCreateView: one review per user and product
+            models.Index(fields=['user', 'product'], name='shop_review_user_idx'),
+        ]
+
     def __str__(self):
         return f"Review for {self.product.name} by {self.user.username}"
 
@@ -182,6 +232,16 @@ class Order(models.Model):
     payment_method = models.CharField(max_length=50)
     paid = models.BooleanField(default=False)
 
+    class Meta:
+        indexes = [
+            # OrderListView: a customer's orders, newest first
+            models.Index(fields=['user', '-created'], name='shop_order_user_created_idx'),
+            # DashboardStatsView / sales exports by status
+            models.Index(fields=['status', '-created'], name='shop_order_status_idx'),
+            # RecentActivityView / admin order list, newest first
+            models.Index(fields=['-created'], name='shop_order_created_idx'),
+        ]
+
     def __str__(self):
         return f"Order #{self.order_number}"
 
@@ -295,6 +355,11 @@ class ContactSubmission(models.Model):
         verbose_name = "Contact Submission"
         verbose_name_plural = "Contact Submissions"
         ordering = ['-submitted_at']
+        indexes = [
+            # DashboardStatsView open tickets; list filtered by is_responded
+            models.Index(fields=['is_responded', '-submitted_at'], name='shop_contact_responded_idx'),
+            models.Index(fields=['-submitted_at'], name='shop_contact_submitted_idx'),
+        ]
     
     def __str__(self):
         return f"Contact from {self.name} ({self.email}) on {self.submitted_at.strftime('%Y-%m-%d %H:%M')}"
@@ -339,10 +404,22 @@ class Notification(models.Model):
         null=True,
         blank=True
     )
+    # Summaries written by shop.retention: how many old notifications this one stands for
+    collapsed_count = models.PositiveIntegerField(default=0)
+    # Set by shop.fanout: identifies the broadcast, so re-sending it skips earlier recipients
+    broadcast_key = models.CharField(max_length=32, blank=True, default='')
 
     class Meta:
         ordering = ['-created_at']
-        
+        indexes = [
+            # NotificationListView
+            models.Index(fields=['recipient', '-created_at'], name='shop_notif_recipient_idx'),
+            # Unread counts and mark-all-read
+            models.Index(fields=['recipient', 'is_read', '-created_at'], name='shop_notif_unread_idx'),
+            # Fan-out dedupe: who already has this broadcast
+            models.Index(fields=['broadcast_key', 'recipient'], name='shop_notif_broadcast_idx'),
+        ]
+
     def __str__(self):
         return f"{self.title} - {self.recipient.username}"
     
@@ -358,6 +435,40 @@ class Notification(models.Model):
         elif diff.seconds > 60:
             return f"{diff.seconds // 60} minutes ago"
         return "Just now"
+
+
+class NotificationState(models.Model):
+    """
+    Per-user notification bookkeeping, so unread counts are a primary-key
+    read instead of a COUNT(*) over Notification.  Kept up to date by
+    shop.notifications and the Notification signals.
+    """
+    user = models.OneToOneField(
+        User, on_delete=models.CASCADE, primary_key=True, related_name='notification_state'
+    )
+    unread_count = models.PositiveIntegerField(default=0)
+    # "Mark all read": every notification created up to this moment counts as read
+    read_watermark = models.DateTimeField(null=True, blank=True)
+    updated = models.DateTimeField(auto_now=True)
+
+    def __str__(self):
+        return f"{self.user_id}: {self.unread_count} unread"
+
+
+class NotificationArchive(models.Model):
+    """Read notifications moved out of Notification by the retention policy."""
+    original_id = models.PositiveBigIntegerField()
+    recipient_id = models.PositiveBigIntegerField(db_index=True)
+    title = models.CharField(max_length=255)
+    message = models.TextField()
+    notification_type = models.CharField(max_length=20)
+    created_at = models.DateTimeField()
+    related_object_id = models.PositiveIntegerField(null=True, blank=True)
+    related_content_type_id = models.PositiveIntegerField(null=True, blank=True)
+    archived_at = models.DateTimeField(auto_now_add=True)
+
+    def __str__(self):
+        return f"{self.title} (archived)"
     
 
 
@@ -421,4 +532,23 @@ class SystemSettings(models.Model):
     def load(cls):
         # Get or create the singleton instance
         obj, created = cls.objects.get_or_create(pk=1)
-        return obj
\ No newline at end of file
+        return obj
+
+    @classmethod
+    async def aload(cls):
+        obj, created = await cls.objects.aget_or_create(pk=1)
+        return obj
+
+class RevokedRefreshToken(models.Model):
+    """
+    Refresh tokens that may no longer be used (rotated out or logged out).
+    Rows are only needed until the token would have expired anyway, so
+    ``expires_at`` is indexed for the periodic purge.
+    """
+    jti = models.CharField(max_length=255, unique=True)
+    user_id = models.PositiveBigIntegerField(null=True, blank=True)
+    expires_at = models.DateTimeField(db_index=True)
+    revoked_at = models.DateTimeField(auto_now_add=True)
+
+    def __str__(self):
+        return self.jti
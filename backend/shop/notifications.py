@@ -0,0 +1,170 @@
+"""
+Notification service: unread counters and push delivery.
+
+Unread counts live in ``NotificationState`` and are adjusted whenever a
+notification is created, read, read-all'd or deleted, so clients never need
+a ``COUNT(*)``.  A missing state row (users that predate it) is backfilled
+from one count on first use.  "Mark all read" only moves the state's
+``read_watermark``: notifications created up to then count as read whatever
+their ``is_read`` column says.
+
+New notifications and count changes are published, after the transaction
+commits, to ``broker``, which fans them out to the server-sent-event streams
+open in this process (``views.notification_stream``).  Each stream also re-reads
+the counter every ``NOTIFICATION_STREAM_HEARTBEAT`` seconds, so changes made
+by other processes still arrive within that window.
+"""
+import asyncio
+import json
+import threading
+
+from django.conf import settings
+from django.contrib.contenttypes.models import ContentType
+from django.db import transaction
+from django.db.models import F
+from django.db.models.functions import Greatest
+from django.utils import timezone
+
+from .models import Notification, NotificationState
+from .serializers import NotificationSerializer
+
+
+# ----- counters -----
+
+def get_read_watermark(user_id):
+    return NotificationState.objects.filter(user_id=user_id)\
+                                    .values_list('read_watermark', flat=True).first()
+
+
+def unread_notifications(user_id, watermark=None):
+    notifications = Notification.objects.filter(recipient_id=user_id, is_read=False)
+    if watermark is not None:
+        notifications = notifications.filter(created_at__gt=watermark)
+    return notifications
+
+
+def is_unread(notification, watermark):
+    return not notification.is_read and (watermark is None or notification.created_at > watermark)
+
+
+def _recount(user_id):
+    state, created = NotificationState.objects.get_or_create(user_id=user_id)
+    count = unread_notifications(user_id, state.read_watermark).count()
+    if state.unread_count != count:
+        NotificationState.objects.filter(user_id=user_id).update(unread_count=count)
+    return count
+
+
+def adjust_unread(user_id, delta, backfill=True):
+    updated = NotificationState.objects.filter(user_id=user_id).update(
+        unread_count=Greatest(F('unread_count') + delta, 0)
+    )
+    if not updated and backfill:
+        # The recount already sees the change that triggered this call
+        _recount(user_id)
+    publish_count(user_id)
+
+
+def unread_count(user_id):
+    count = NotificationState.objects.filter(user_id=user_id)\
+                                     .values_list('unread_count', flat=True).first()
+    return _recount(user_id) if count is None else count
+
+
+# ----- operations -----
+
+def notify(recipient, title, message, notification_type='system', related_object=None):
+    """Create one notification; the post_save signal updates the counter."""
+    extra = {}
+    if related_object is not None:
+        extra = {
+            'related_content_type': ContentType.objects.get_for_model(related_object),
+            'related_object_id': related_object.pk,
+        }
+    return Notification.objects.create(
+        recipient=recipient,
+        title=title,
+        message=message,
+        notification_type=notification_type,
+        **extra,
+    )
+
+
+def mark_read(user_id, notification_id):
+    """Returns False if the notification does not belong to the user."""
+    updated = unread_notifications(user_id, get_read_watermark(user_id))\
+        .filter(id=notification_id).update(is_read=True)
+    if updated:
+        adjust_unread(user_id, -1)
+        return True
+    return Notification.objects.filter(id=notification_id, recipient_id=user_id).exists()
+
+
+def mark_all_read(user_id):
+    """A single-row update, however many notifications the user has."""
+    defaults = {'read_watermark': timezone.now(), 'unread_count': 0}
+    if not NotificationState.objects.filter(user_id=user_id).update(**defaults):
+        NotificationState.objects.update_or_create(user_id=user_id, defaults=defaults)
+    publish_count(user_id)
+
+
+# ----- push delivery -----
+
+class NotificationBroker:
+    """In-process fan-out from writers (any thread) to SSE streams (event loop)."""
+
+    def __init__(self):
+        self._subscribers = {}
+        self._lock = threading.Lock()
+
+    def subscribe(self, user_id):
+        queue = asyncio.Queue(maxsize=100)
+        with self._lock:
+            self._subscribers.setdefault(user_id, set()).add((asyncio.get_running_loop(), queue))
+        return queue
+
+    def unsubscribe(self, user_id, queue):
+        with self._lock:
+            subscribers = self._subscribers.get(user_id, set())
+            subscribers.difference_update({entry for entry in subscribers if entry[1] is queue})
+            if not subscribers:
+                self._subscribers.pop(user_id, None)
+
+    def has_subscribers(self, user_id):
+        return user_id in self._subscribers
+
+    def publish(self, user_id, event, data):
+        with self._lock:
+            subscribers = list(self._subscribers.get(user_id, ()))
+        for loop, queue in subscribers:
+            loop.call_soon_threadsafe(self._put, queue, (event, data))
+
+    @staticmethod
+    def _put(queue, item):
+        # A stalled client loses events rather than growing memory; the next
+        # heartbeat resends the count
+        if not queue.full():
+            queue.put_nowait(item)
+
+
+broker = NotificationBroker()
+
+
+def publish_count(user_id):
+    if broker.has_subscribers(user_id):
+        transaction.on_commit(lambda: broker.publish(user_id, 'count', {'count': unread_count(user_id)}))
+
+
+def publish_notification(notification):
+    user_id = notification.recipient_id
+    if broker.has_subscribers(user_id):
+        data = NotificationSerializer(notification).data
+        transaction.on_commit(lambda: broker.publish(user_id, 'notification', data))
+
+
+def format_event(event, data):
+    return f"event: {event}\ndata: {json.dumps(data, default=str)}\n\n"
+
+
+def heartbeat_interval():
+    return getattr(settings, 'NOTIFICATION_STREAM_HEARTBEAT', 15)
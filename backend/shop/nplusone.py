@@ -0,0 +1,173 @@
+"""
+N+1 query detection for development and tests.
+
+Every SELECT issued while a detector is active is reduced to a fingerprint
+(the SQL with literals and ``IN (...)`` lists collapsed, so queries that
+differ only in their parameters match).  A fingerprint seen ``THRESHOLD`` or
+more times is reported with where it came from: the serializer field being
+rendered when the query ran (``ProductSerializer.avg_rating``), or failing
+that the first frame of shop code.
+
+``NPlusOneMiddleware`` checks each request when ``SHOP_NPLUSONE['ENABLED']``
+is on and logs what it finds; with ``STRICT`` it raises ``NPlusOneError``
+instead, which makes the offending test fail.  Code that is not behind a
+request can use ``detect_nplusone()`` directly::
+
+    with detect_nplusone(strict=True):
+        ProductSerializer(products, many=True).data
+"""
+import logging
+import os
+import re
+import sys
+from collections import Counter
+from contextlib import ExitStack, contextmanager
+
+from asgiref.sync import iscoroutinefunction, markcoroutinefunction, sync_to_async
+from django.conf import settings
+from django.core.exceptions import MiddlewareNotUsed
+from django.db import connections
+from rest_framework import serializers
+
+logger = logging.getLogger(__name__)
+
+DEFAULTS = {
+    'ENABLED': False,
+    # Repeats of one query shape (per request) that count as an N+1
+    'THRESHOLD': 5,
+    'STRICT': False,
+    # Fingerprints containing any of these substrings are never reported
+    'IGNORE': [],
+}
+
+_STRING_RE = re.compile(r"'(?:[^']|'')*'")
+_NUMBER_RE = re.compile(r'\b\d+(?:\.\d+)?\b')
+_IN_LIST_RE = re.compile(r'\bIN \((?:\s*(?:%s|\?)\s*,?)+\)', re.IGNORECASE)
+_SPACE_RE = re.compile(r'\s+')
+_SHOP_DIR = os.path.dirname(os.path.abspath(__file__))
+_TO_REPRESENTATION = serializers.Serializer.to_representation.__code__
+
+
+class NPlusOneError(Exception):
+    pass
+
+
+def get_nplusone_settings():
+    return {**DEFAULTS, **getattr(settings, 'SHOP_NPLUSONE', {})}
+
+
+def fingerprint(sql):
+    sql = _STRING_RE.sub('?', sql)
+    sql = _NUMBER_RE.sub('?', sql)
+    sql = _IN_LIST_RE.sub('IN (...)', sql)
+    return _SPACE_RE.sub(' ', sql).strip()
+
+
+def _origin():
+    """The serializer field being rendered, else the nearest shop frame."""
+    frame = sys._getframe(2)
+    code_location = None
+    while frame is not None:
+        if frame.f_code is _TO_REPRESENTATION:
+            field = frame.f_locals.get('field')
+            if field is not None:
+                return f'{type(field.parent).__name__}.{field.field_name}'
+        if code_location is None:
+            filename = frame.f_code.co_filename
+            if filename.startswith(_SHOP_DIR) and filename != __file__:
+                code_location = f'{os.path.relpath(filename, os.path.dirname(_SHOP_DIR))}:{frame.f_lineno}'
+        frame = frame.f_back
+    return code_location or 'unknown'
+
+
+class Finding:
+    def __init__(self, fingerprint, count, origins, sql):
+        self.fingerprint = fingerprint
+        self.count = count
+        self.origins = origins
+        self.sql = sql
+
+    def __str__(self):
+        origins = ', '.join(f'{origin} ({count}x)' for origin, count in self.origins.most_common())
+        return f'{self.count} similar queries from {origins}: {self.fingerprint}'
+
+
+class QueryCollector:
+    def __init__(self):
+        self.counts = Counter()
+        self.origins = {}
+        self.samples = {}
+
+    def __call__(self, execute, sql, params, many, context):
+        if sql.lstrip()[:6].upper() == 'SELECT':
+            key = fingerprint(sql)
+            self.counts[key] += 1
+            self.origins.setdefault(key, Counter())[_origin()] += 1
+            self.samples.setdefault(key, sql)
+        return execute(sql, params, many, context)
+
+    def findings(self, threshold, ignore=()):
+        return [
+            Finding(key, count, self.origins[key], self.samples[key])
+            for key, count in self.counts.most_common()
+            if count >= threshold and not any(pattern in key for pattern in ignore)
+        ]
+
+
+def report(findings, label, strict):
+    if not findings:
+        return
+    message = f'N+1 queries in {label}:\n' + '\n'.join(f'  {finding}' for finding in findings)
+    if strict:
+        raise NPlusOneError(message)
+    logger.warning(message)
+
+
+@contextmanager
+def detect_nplusone(threshold=None, strict=None, label='block'):
+    """Collect queries in the block; yields the collector."""
+    config = get_nplusone_settings()
+    threshold = config['THRESHOLD'] if threshold is None else threshold
+    strict = config['STRICT'] if strict is None else strict
+    collector = QueryCollector()
+    with ExitStack() as stack:
+        _wrap_connections(stack, collector)
+        yield collector
+    report(collector.findings(threshold, config['IGNORE']), label, strict)
+
+
+def _wrap_connections(stack, collector):
+    for connection in connections.all():
+        stack.enter_context(connection.execute_wrapper(collector))
+
+
+class NPlusOneMiddleware:
+    sync_capable = True
+    async_capable = True
+
+    def __init__(self, get_response):
+        if not get_nplusone_settings()['ENABLED']:
+            raise MiddlewareNotUsed
+        self.get_response = get_response
+        if iscoroutinefunction(get_response):
+            markcoroutinefunction(self)
+
+    def __call__(self, request):
+        if iscoroutinefunction(self):
+            return self.__acall__(request)
+        with detect_nplusone(label=f'{request.method} {request.path}'):
+            return self.get_response(request)
+
+    async def __acall__(self, request):
+        config = get_nplusone_settings()
+        collector = QueryCollector()
+        stack = ExitStack()
+        # Queries run on the request's sync thread, with that thread's connections
+        await sync_to_async(_wrap_connections)(stack, collector)
+        try:
+            response = await self.get_response(request)
+        finally:
+            await sync_to_async(stack.close)()
+        report(collector.findings(config['THRESHOLD'], config['IGNORE']),
+               f'{request.method} {request.path}', config['STRICT'])
+        return response
@@ -91,88 +91,100 @@
 # views.py
 import stripe
 import json
+import logging
+from collections import defaultdict
+
 from django.http import JsonResponse
 from django.views.decorators.csrf import csrf_exempt
 from django.views.decorators.http import require_POST
-from .models import SystemSettings  # Import your SystemSettings model
+from . import performance, tracing
+from .models import Product, SystemSettings  # Import your SystemSettings model
+
+logger = logging.getLogger(__name__)
+
 
 @require_POST
 @csrf_exempt
 def create_payment_intent(request):
     try:
-        # Load system settings and get Stripe secret key
-        system_settings = SystemSettings.load()
-        
-        if not system_settings.stripe_secret_key:
-            return JsonResponse({'error': 'Stripe secret key not configured'}, status=500)
-        
-        # Set Stripe API key from model
-        stripe.api_key = system_settings.stripe_secret_key
-        
-        data = json.loads(request.body)
-        print("Received data:", data)  # Debug: See what's coming from React
-        
-        # Calculate order amount based on items from React
-        amount = calculate_order_amount(data['items'])
-        print("Calculated amount:", amount)  # Debug: See the calculated amount
-        
-        # Create a PaymentIntent with the order amount and currency
-        intent = stripe.PaymentIntent.create(
-            amount=amount,
-            currency='usd',
-            automatic_payment_methods={
-                'enabled': True,
-            },
-        )
+        with tracing.span('payments.create_intent') as intent_span:
+            # Load system settings and get Stripe secret key
+            with tracing.span('payments.settings_load'):
+                system_settings = SystemSettings.load()
+
+            if not system_settings.stripe_secret_key:
+                tracing.incr('payments.intent.failure')
+                logger.error("Stripe secret key not configured")
+                return JsonResponse({'error': 'Stripe secret key not configured'}, status=500)
+
+            # Set Stripe API key from model
+            stripe.api_key = system_settings.stripe_secret_key
+
+            data = json.loads(request.body)
+
+            # Calculate order amount based on items from React
+            with tracing.span('payments.pricing', items=len(data['items'])):
+                amount = calculate_order_amount(data['items'])
+            intent_span.set(amount=amount)
+
+            # Create a PaymentIntent with the order amount and currency
+            with tracing.span('payments.stripe_call'), performance.external('stripe'):
+                intent = stripe.PaymentIntent.create(
+                    amount=amount,
+                    currency='usd',
+                    automatic_payment_methods={
+                        'enabled': True,
+                    },
+                )
+        tracing.incr('payments.intent.success')
         return JsonResponse({
             'clientSecret': intent['client_secret'],
             'calculatedAmount': amount  # Send back for debugging
         })
     except Exception as e:
-        print("Error in create_payment_intent:", str(e))  # Debug: See any errors
+        tracing.incr('payments.intent.failure')
+        logger.warning("create_payment_intent failed: %s", type(e).__name__)
         return JsonResponse({'error': str(e)}, status=403)
 
-def calculate_order_amount(items):
+def item_quantities(items):
     """
-    Calculate the total order amount from items sent by React frontend
+    ``{product_id: quantity}`` from the cart items sent by the React frontend.
+    Only ids and quantities are taken from the client; prices never are.
     """
-    total_amount = 0
-    print("Items received for calculation:", items)  # Debug: See items structure
-    
+    quantities = defaultdict(int)
     for item in items:
-        # Try different possible locations for the price
-        price = 0
-        quantity = item.get('quantity', 1)
-        
-        # Debug: Print the item structure
-        print(f"Processing item: {item}")
-        
-        # Option 1: Price in product_details
-        if 'product_details' in item and item['product_details']:
-            product_details = item['product_details']
-            if 'current_price' in product_details:
-                price = float(product_details['current_price'])
-                print(f"Found price in product_details: {price}")
-            elif 'price' in product_details:
-                price = float(product_details['price'])
-                print(f"Found price in product_details (alt): {price}")
-        
-        # Option 2: Direct price field in item
-        elif 'current_price' in item:
-            price = float(item['current_price'])
-            print(f"Found price in item (current_price): {price}")
-        elif 'price' in item:
-            price = float(item['price'])
-            print(f"Found price in item (price): {price}")
-        
-        # Calculate item total
-        item_total = price * quantity * 100  # Convert to cents
-        total_amount += int(item_total)
-        print(f"Item total: {item_total} cents (${price} × {quantity})")
-    
+        product = item.get('product')
+        if isinstance(product, dict):
+            product = product.get('id')
+        if product is None and item.get('product_details'):
+            product = item['product_details'].get('id')
+        if product is None:
+            tracing.incr('payments.pricing.item_without_product')
+            raise ValueError("Cart item without a product")
+        quantity = int(item.get('quantity', 1))
+        if quantity < 1:
+            raise ValueError("Invalid quantity")
+        quantities[int(product)] += quantity
+    return quantities
+
+
+def order_amount(quantities, prices):
+    """Amount in cents for ``quantities`` at ``prices`` ({product_id: effective_price})."""
+    missing = quantities.keys() - prices.keys()
+    if missing:
+        tracing.incr('payments.pricing.unknown_product')
+        raise ValueError(f"Unknown or inactive products: {sorted(missing)}")
+    total_amount = sum(int(prices[pk] * 100) * quantity for pk, quantity in quantities.items())
+
     # Ensure minimum amount is met (Stripe requires at least $0.50)
-    if total_amount < 50:
-        total_amount = 50
-    
-    print(f"Final total amount: {total_amount} cents (${total_amount/100})")
-    return total_amount
\ No newline at end of file
+    return max(total_amount, 50)
+
+
+def calculate_order_amount(items):
+    """
+    Calculate the total order amount from items sent by React frontend,
+    priced from Product.effective_price
+    """
+    quantities = item_quantities(items)
+    prices = dict(Product.objects.filter(pk__in=quantities, active=True).values_list('pk', 'effective_price'))
+    return order_amount(quantities, prices)
@@ -0,0 +1,347 @@
+"""
+Per-request performance instrumentation.
+
+``PerformanceMiddleware`` measures, for every request: wall time, database
+queries and their time (through ``connection.execute_wrapper``), time spent
+building serializer ``.data``, cache hits and misses, and time in external
+services wrapped with ``external('stripe')`` / ``external('openai')``.
+
+Each request's numbers go out in a ``Server-Timing`` header (shown by browser
+dev tools) when ``SERVER_TIMING`` is on, and into in-process histograms keyed
+by URL route, which ``metrics_view`` serves in the Prometheus text format.
+Histograms are per worker process; Prometheus sums them across targets.
+
+Serializer time covers serializers that include ``TimedSerializerMixin``;
+cache hits and misses are counted by the backends defined here
+(``LocMemCache``, ``RedisCache``, or any backend with ``CountedCacheMixin``).
+Outside a request both only pass through.
+"""
+import threading
+import time
+from bisect import bisect_left
+from collections import defaultdict
+from contextlib import ExitStack, contextmanager
+from contextvars import ContextVar
+
+from asgiref.sync import iscoroutinefunction, markcoroutinefunction, sync_to_async
+from django.conf import settings
+from django.core.cache.backends import locmem, redis
+from django.core.exceptions import MiddlewareNotUsed
+from django.db import connections
+from django.http import HttpResponse
+from django.utils.crypto import constant_time_compare
+from django.views.decorators.http import require_GET
+from rest_framework import exceptions
+from rest_framework_simplejwt.authentication import JWTAuthentication
+
+from . import tracing
+
+DEFAULTS = {
+    'ENABLED': True,
+    'SERVER_TIMING': False,
+    # When set, /api/metrics/ wants "Authorization: Bearer <token>"; otherwise staff only
+    'METRICS_TOKEN': None,
+}
+
+DURATION_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10)
+QUERY_COUNT_BUCKETS = (1, 2, 5, 10, 20, 50, 100, 200, 500)
+
+_current = ContextVar('request_metrics', default=None)
+_MISSING = object()
+
+
+def get_performance_settings():
+    return {**DEFAULTS, **getattr(settings, 'SHOP_PERFORMANCE', {})}
+
+
+class RequestMetrics:
+    __slots__ = ('db_queries', 'db_time', 'serializer_time', 'in_serializer',
+                 'cache_hits', 'cache_misses', 'in_cache', 'external')
+
+    def __init__(self):
+        self.db_queries = 0
+        self.db_time = 0.0
+        self.serializer_time = 0.0
+        self.in_serializer = False
+        self.cache_hits = 0
+        self.cache_misses = 0
+        self.in_cache = False
+        self.external = defaultdict(float)
+
+
+# ----- metric registry -----
+
+class Histogram:
+    def __init__(self, name, help_text, labels, buckets=DURATION_BUCKETS):
+        self.name = name
+        self.help_text = help_text
+        self.labels = labels
+        self.buckets = buckets
+        self._series = {}
+        self._lock = threading.Lock()
+
+    def observe(self, value, *label_values):
+        with self._lock:
+            series = self._series.get(label_values)
+            if series is None:
+                series = self._series[label_values] = [[0] * (len(self.buckets) + 1), 0.0, 0]
+            series[0][bisect_left(self.buckets, value)] += 1
+            series[1] += value
+            series[2] += 1
+
+    def render(self):
+        lines = [f'# HELP {self.name} {self.help_text}', f'# TYPE {self.name} histogram']
+        with self._lock:
+            series = {key: (list(counts), total, count) for key, (counts, total, count) in self._series.items()}
+        for label_values, (counts, total, count) in sorted(series.items()):
+            labels = _format_labels(self.labels, label_values)
+            cumulative = 0
+            for bound, bucket_count in zip(self.buckets + ('+Inf',), counts):
+                cumulative += bucket_count
+                lines.append(f'{self.name}_bucket{_format_labels(self.labels + ("le",), label_values + (bound,))} {cumulative}')
+            lines.append(f'{self.name}_sum{labels} {total}')
+            lines.append(f'{self.name}_count{labels} {count}')
+        return lines
+
+
+class Counter:
+    def __init__(self, name, help_text, labels):
+        self.name = name
+        self.help_text = help_text
+        self.labels = labels
+        self._values = defaultdict(int)
+        self._lock = threading.Lock()
+
+    def inc(self, value, *label_values):
+        with self._lock:
+            self._values[label_values] += value
+
+    def render(self):
+        lines = [f'# HELP {self.name} {self.help_text}', f'# TYPE {self.name} counter']
+        with self._lock:
+            values = dict(self._values)
+        for label_values, value in sorted(values.items()):
+            lines.append(f'{self.name}{_format_labels(self.labels, label_values)} {value}')
+        return lines
+
+
+def _format_labels(names, values):
+    if not names:
+        return ''
+    pairs = ','.join(
+        '{}="{}"'.format(name, str(value).replace('\\', '\\\\').replace('"', '\\"').replace('\n', '\\n'))
+        for name, value in zip(names, values)
+    )
+    return '{' + pairs + '}'
+
+
+REQUESTS = Counter('shop_http_requests_total', 'Requests handled.', ('route', 'method', 'status'))
+REQUEST_DURATION = Histogram('shop_http_request_duration_seconds', 'Request wall time.', ('route', 'method'))
+DB_TIME = Histogram('shop_http_request_db_seconds', 'Database time per request.', ('route',))
+DB_QUERIES = Histogram('shop_http_request_db_queries', 'Database queries per request.', ('route',),
+                       buckets=QUERY_COUNT_BUCKETS)
+SERIALIZER_TIME = Histogram('shop_http_request_serializer_seconds', 'Serializer time per request.', ('route',))
+CACHE_REQUESTS = Counter('shop_cache_requests_total', 'Cache lookups during requests.', ('route', 'result'))
+EXTERNAL_TIME = Histogram('shop_external_call_seconds', 'Time in external service calls.', ('service',))
+
+METRICS = [REQUESTS, REQUEST_DURATION, DB_TIME, DB_QUERIES, SERIALIZER_TIME, CACHE_REQUESTS, EXTERNAL_TIME]
+
+
+def render_metrics():
+    lines = []
+    for metric in METRICS:
+        lines.extend(metric.render())
+    trace_counters = tracing.get_counters()
+    if trace_counters:
+        lines += ['# HELP shop_trace_events_total Events counted by shop.tracing.',
+                  '# TYPE shop_trace_events_total counter']
+        lines += [f'shop_trace_events_total{_format_labels(("name",), (name,))} {value}'
+                  for name, value in sorted(trace_counters.items())]
+    return '\n'.join(lines) + '\n'
+
+
+# ----- collection -----
+
+@contextmanager
+def external(service):
+    """Time a call to an external service (Stripe, OpenAI, ...)."""
+    start = time.perf_counter()
+    try:
+        yield
+    finally:
+        elapsed = time.perf_counter() - start
+        metrics = _current.get()
+        if metrics is not None:
+            metrics.external[service] += elapsed
+            EXTERNAL_TIME.observe(elapsed, service)
+
+
+def _db_wrapper(execute, sql, params, many, context):
+    metrics = _current.get()
+    if metrics is None:
+        return execute(sql, params, many, context)
+    start = time.perf_counter()
+    try:
+        return execute(sql, params, many, context)
+    finally:
+        metrics.db_time += time.perf_counter() - start
+        metrics.db_queries += 1
+
+
+class TimedSerializerMixin:
+    """Adds the serializer's output time to the request's serializer timing."""
+
+    def to_representation(self, instance):
+        metrics = _current.get()
+        # Nested serializers are part of the outermost one's time
+        if metrics is None or metrics.in_serializer:
+            return super().to_representation(instance)
+        metrics.in_serializer = True
+        start = time.perf_counter()
+        try:
+            return super().to_representation(instance)
+        finally:
+            metrics.serializer_time += time.perf_counter() - start
+            metrics.in_serializer = False
+
+
+class CountedCacheMixin:
+    """Counts the request's cache hits and misses; mix into a cache backend."""
+
+    def get(self, key, default=None, version=None):
+        metrics = _current.get()
+        if metrics is None or metrics.in_cache:
+            return super().get(key, default, version)
+        metrics.in_cache = True
+        try:
+            value = super().get(key, _MISSING, version)
+        finally:
+            metrics.in_cache = False
+        if value is _MISSING:
+            metrics.cache_misses += 1
+            return default
+        metrics.cache_hits += 1
+        return value
+
+    def get_many(self, keys, version=None):
+        metrics = _current.get()
+        if metrics is None or metrics.in_cache:
+            return super().get_many(keys, version)
+        keys = list(keys)
+        # The base get_many calls get() per key; count those once, here
+        metrics.in_cache = True
+        try:
+            found = super().get_many(keys, version)
+        finally:
+            metrics.in_cache = False
+        metrics.cache_hits += len(found)
+        metrics.cache_misses += len(keys) - len(found)
+        return found
+
+
+class LocMemCache(CountedCacheMixin, locmem.LocMemCache):
+    pass
+
+
+class RedisCache(CountedCacheMixin, redis.RedisCache):
+    pass
+
+
+def _route(request):
+    match = getattr(request, 'resolver_match', None)
+    # Unmatched paths share one label so scanners can't blow up the series count
+    return match.route if match is not None and match.route else 'unmatched'
+
+
+def _server_timing(total, metrics):
+    entries = [
+        f'total;dur={total * 1000:.1f}',
+        f'db;dur={metrics.db_time * 1000:.1f};desc="{metrics.db_queries} queries"',
+        f'serializer;dur={metrics.serializer_time * 1000:.1f}',
+        f'cache;desc="{metrics.cache_hits} hits, {metrics.cache_misses} misses"',
+    ]
+    entries += [f'{service};dur={elapsed * 1000:.1f}' for service, elapsed in metrics.external.items()]
+    return ', '.join(entries)
+
+
+def _wrap_connections(stack):
+    for connection in connections.all():
+        stack.enter_context(connection.execute_wrapper(_db_wrapper))
+
+
+class PerformanceMiddleware:
+    sync_capable = True
+    async_capable = True
+
+    def __init__(self, get_response):
+        config = get_performance_settings()
+        if not config['ENABLED']:
+            raise MiddlewareNotUsed
+        self.get_response = get_response
+        self.server_timing = config['SERVER_TIMING']
+        if iscoroutinefunction(get_response):
+            markcoroutinefunction(self)
+
+    def __call__(self, request):
+        if iscoroutinefunction(self):
+            return self.__acall__(request)
+        metrics = RequestMetrics()
+        token = _current.set(metrics)
+        start = time.perf_counter()
+        try:
+            with ExitStack() as stack:
+                _wrap_connections(stack)
+                response = self.get_response(request)
+        finally:
+            _current.reset(token)
+        return self._record(request, response, metrics, time.perf_counter() - start)
+
+    async def __acall__(self, request):
+        metrics = RequestMetrics()
+        token = _current.set(metrics)
+        start = time.perf_counter()
+        stack = ExitStack()
+        try:
+            # Queries run on the request's sync thread, with that thread's connections
+            await sync_to_async(_wrap_connections)(stack)
+            try:
+                response = await self.get_response(request)
+            finally:
+                await sync_to_async(stack.close)()
+        finally:
+            _current.reset(token)
+        return self._record(request, response, metrics, time.perf_counter() - start)
+
+    def _record(self, request, response, metrics, total):
+        route = _route(request)
+        REQUESTS.inc(1, route, request.method, response.status_code)
+        REQUEST_DURATION.observe(total, route, request.method)
+        DB_TIME.observe(metrics.db_time, route)
+        DB_QUERIES.observe(metrics.db_queries, route)
+        SERIALIZER_TIME.observe(metrics.serializer_time, route)
+        if metrics.cache_hits:
+            CACHE_REQUESTS.inc(metrics.cache_hits, route, 'hit')
+        if metrics.cache_misses:
+            CACHE_REQUESTS.inc(metrics.cache_misses, route, 'miss')
+
+        if self.server_timing:
+            response['Server-Timing'] = _server_timing(total, metrics)
+        return response
+
+
+def _metrics_allowed(request):
+    token = get_performance_settings()['METRICS_TOKEN']
+    if token:
+        return constant_time_compare(request.headers.get('Authorization', ''), f'Bearer {token}')
+    try:
+        authenticated = JWTAuthentication().authenticate(request)
+    except exceptions.AuthenticationFailed:
+        return False
+    return authenticated is not None and authenticated[0].is_staff
+
+
+@require_GET
+def metrics_view(request):
+    if not _metrics_allowed(request):
+        return HttpResponse('Forbidden\n', status=403, content_type='text/plain')
+    return HttpResponse(render_metrics(), content_type='text/plain; version=0.0.4; charset=utf-8')
@@ -0,0 +1,365 @@
+"""
+Serializer-free read path for the hot list endpoints.
+
+A ``Projection`` is compiled from a ``ModelSerializer``'s declared fields into
+one ``.values()`` query (model columns, related columns and annotations) plus
+a per-row builder that formats each value the way the serializer field
+would.  Nested ``many=True`` serializers become one extra ``.values()`` query
+per page, grouped by parent, instead of a query per row.  The output is the
+same data, in the same key order, as ``serializer_class(objs, many=True).data``.
+
+Fields the compiler can't derive from the model are declared explicitly:
+
+``Value(path)``
+    a column, e.g. ``Value('user__username')`` for a ``StringRelatedField``
+    whose ``__str__`` is the username.
+``Method(*paths)``
+    calls the serializer's own ``get_<field>`` on a bare model instance
+    holding just ``paths`` (``user__email`` fills a bare related user).
+``Annotation(expression, convert)``
+    a SQL expression, for method fields that would run a query per row.
+
+Nested fields are addressed as ``'vendor.user'``.  A serializer that
+overrides ``to_representation`` needs a ``finalize(data, row, context)``.
+Anything else the compiler doesn't understand raises ``ImproperlyConfigured``
+when the projection is first used rather than rendering something different.
+"""
+from collections import defaultdict
+from functools import cached_property
+
+from django.core.exceptions import FieldDoesNotExist, ImproperlyConfigured
+from django.db.models import Avg, Count, FloatField, IntegerField, OuterRef, Subquery
+from django.db.models.base import ModelState
+from django.db.models.fields.reverse_related import ManyToOneRel
+from django.db.models.functions import Coalesce
+from django.utils.encoding import force_str
+from rest_framework import serializers
+from rest_framework.response import Response
+
+from .models import ProductReview
+from .performance import TimedSerializerMixin
+from .serializers import NotificationSerializer, OrderSerializer, ProductSerializer
+
+# Fields whose to_representation() leaves a database value as it is
+_PASSTHROUGH = (
+    serializers.CharField, serializers.IntegerField, serializers.BooleanField,
+    serializers.FloatField, serializers.ChoiceField, serializers.PrimaryKeyRelatedField,
+    serializers.ReadOnlyField,
+)
+# TimedSerializerMixin.to_representation() only times the stock one
+_STOCK_TO_REPRESENTATION = (serializers.Serializer.to_representation, TimedSerializerMixin.to_representation)
+
+
+class Value:
+    def __init__(self, path, convert=None):
+        self.path = path
+        self.convert = convert
+
+
+class Method:
+    def __init__(self, *paths):
+        self.paths = paths
+
+
+class Annotation:
+    def __init__(self, expression, convert=None):
+        self.expression = expression
+        self.convert = convert
+
+
+def _bare(model, values):
+    """A model instance carrying only ``values``; ``user__x`` keys fill a bare ``user``."""
+    obj = model.__new__(model)
+    related = defaultdict(dict)
+    for name, value in values.items():
+        if '__' in name:
+            head, rest = name.split('__', 1)
+            related[head][rest] = value
+        else:
+            obj.__dict__[name] = value
+    if related:
+        obj._state = ModelState()
+        for name, related_values in related.items():
+            field = model._meta.get_field(name)
+            obj._state.fields_cache[field.cache_name] = (
+                None if all(value is None for value in related_values.values())
+                else _bare(field.related_model, related_values)
+            )
+    return obj
+
+
+class _Render:
+    """Per-call state: the serializer context and serializers to run methods on."""
+
+    def __init__(self, context):
+        self.context = context
+        self._serializers = {}
+
+    def serializer(self, serializer_class):
+        serializer = self._serializers.get(serializer_class)
+        if serializer is None:
+            serializer = self._serializers[serializer_class] = serializer_class(context=self.context)
+        return serializer
+
+
+class Projection:
+    def __init__(self, serializer_class, fields=None, finalize=None, prefix=''):
+        self.serializer_class = serializer_class
+        self.model = serializer_class.Meta.model
+        self.declared = fields or {}
+        self.finalize = finalize
+        self.prefix = prefix
+
+    def __repr__(self):
+        return f'<Projection {self.serializer_class.__name__}>'
+
+    @cached_property
+    def compiled(self):
+        """``(columns, annotations, builders, children)``, built on first use."""
+        serializer_class = self.serializer_class
+        if (serializer_class.to_representation not in _STOCK_TO_REPRESENTATION
+                and self.finalize is None):
+            raise ImproperlyConfigured(
+                f'{serializer_class.__name__} overrides to_representation(); give the projection a finalize()'
+            )
+        columns, annotations, builders, children = [], {}, [], []
+        for name, field in serializer_class().fields.items():
+            if field.write_only:
+                continue
+            build = self._compile_field(name, field, columns, annotations, children)
+            if build is not None:
+                builders.append((name, build))
+        if children:
+            columns.append(self.model._meta.pk.attname)
+        return columns, annotations, builders, children
+
+    def _declared(self, name):
+        nested = {
+            key.split('.', 1)[1]: spec for key, spec in self.declared.items()
+            if key.startswith(f'{name}.')
+        }
+        return self.declared.get(name), nested
+
+    def _compile_field(self, name, field, columns, annotations, children):
+        spec, nested = self._declared(name)
+        prefix = self.prefix
+        if isinstance(spec, Value):
+            key = prefix + spec.path
+            columns.append(key)
+            return self._column(key, spec.convert)
+        if isinstance(spec, Method):
+            return self._method(name, spec.paths, columns)
+        if isinstance(spec, Annotation):
+            # Annotations can't be nested; they read the outermost query
+            key = f'_{name}'
+            annotations[key] = spec.expression
+            if spec.convert is None:
+                return self._column(key, None)
+            # Unlike columns, NULL is handed to convert(): an aggregate over no rows
+            return lambda row, render, convert=spec.convert: convert(row[key])
+
+        source = field.source
+        if isinstance(field, serializers.ListSerializer):
+            return self._children(name, field, nested, children)
+        if isinstance(field, serializers.ModelSerializer):
+            return self._nested(name, field, nested, columns, annotations, children)
+        if isinstance(field, serializers.SerializerMethodField):
+            raise ImproperlyConfigured(f'{self}: declare how to project the method field {name!r}')
+        if isinstance(field, (serializers.ManyRelatedField, serializers.RelatedField)) and not isinstance(
+                field, serializers.PrimaryKeyRelatedField):
+            raise ImproperlyConfigured(f'{self}: declare how to project the related field {name!r}')
+        if source == '*':
+            raise ImproperlyConfigured(f'{self}: declare how to project {name!r} (source="*")')
+
+        path = source.replace('.', '__')
+        head = field.source_attrs[0]
+        try:
+            model_field = self.model._meta.get_field(head)
+        except FieldDoesNotExist:
+            return self._computed(name, field, head, columns)
+
+        key = prefix + path
+        columns.append(key)
+        if isinstance(field, serializers.FileField):
+            return self._file(key, field, model_field)
+        if isinstance(field, _PASSTHROUGH):
+            return self._column(key, None)
+        return self._column(key, field.to_representation)
+
+    def _column(self, key, convert):
+        if convert is None:
+            return lambda row, render: row[key]
+        # DRF renders None without calling the field
+        return lambda row, render: None if (value := row[key]) is None else convert(value)
+
+    def _computed(self, name, field, attr, columns):
+        """``get_FOO_display`` sources; read-only sources that don't exist are skipped, like DRF does."""
+        if attr.startswith('get_') and attr.endswith('_display'):
+            try:
+                model_field = self.model._meta.get_field(attr[4:-8])
+            except FieldDoesNotExist:
+                model_field = None
+            if model_field is not None and model_field.choices:
+                labels = dict(model_field.flatchoices)
+                key = self.prefix + model_field.attname
+                columns.append(key)
+                return self._column(
+                    key, lambda value: force_str(labels.get(value, value), strings_only=True)
+                )
+        if not hasattr(self.model, attr) and not field.required:
+            return None
+        raise ImproperlyConfigured(f'{self}: declare how to project {name!r} (source {field.source!r})')
+
+    def _method(self, name, paths, columns):
+        serializer_class = self.serializer_class
+        method_name = f'get_{name}'
+        keys = [(path, self.prefix + path) for path in paths]
+        columns.extend(key for _, key in keys)
+        model = self.model
+
+        def build(row, render):
+            obj = _bare(model, {path: row[key] for path, key in keys})
+            return getattr(render.serializer(serializer_class), method_name)(obj)
+        return build
+
+    def _file(self, key, field, model_field):
+        storage = model_field.storage
+        use_url = getattr(field, 'use_url', serializers.api_settings.UPLOADED_FILES_USE_URL)
+
+        def build(row, render):
+            name = row[key]
+            if not name:
+                return None
+            if not use_url:
+                return name
+            url = storage.url(name)
+            request = render.context.get('request')
+            return request.build_absolute_uri(url) if request is not None else url
+        return build
+
+    def _nested(self, name, field, declared, columns, annotations, children):
+        """A forward foreign key rendered by a nested serializer: joined into this query."""
+        model_field = self.model._meta.get_field(field.source)
+        child = Projection(type(field), declared, prefix=f'{self.prefix}{field.source}__')
+        child_columns, child_annotations, child_builders, child_children = child.compiled
+        if child_annotations or child_children:
+            raise ImproperlyConfigured(f'{self}: {name!r} is too deeply nested to project')
+        key = self.prefix + model_field.attname
+        columns.append(key)
+        columns.extend(child_columns)
+        return lambda row, render: None if row[key] is None else child.build(row, render)
+
+    def _children(self, name, field, declared, children):
+        """A reverse foreign key rendered with ``many=True``: one query per page."""
+        if self.prefix:
+            raise ImproperlyConfigured(f'{self}: {name!r} is too deeply nested to project')
+        relation = self.model._meta.get_field(field.source)
+        if not isinstance(relation, ManyToOneRel):
+            raise ImproperlyConfigured(f'{self}: declare how to project the related field {name!r}')
+        child = Projection(type(field.child), declared)
+        children.append((name, child, relation.field))
+        # Filled in by render()
+        return lambda row, render: row[name]
+
+    def build(self, row, render):
+        data = {name: build(row, render) for name, build in self.compiled[2]}
+        if self.finalize is not None:
+            self.finalize(data, row, render.context)
+        return data
+
+    def values(self, queryset, *extra):
+        """``queryset`` reduced to the columns this projection reads."""
+        columns, annotations, _, _ = self.compiled
+        return queryset.values(*dict.fromkeys([*columns, *extra]), **annotations)
+
+    def fetch_children(self, rows):
+        children = self.compiled[3]
+        if not children or not rows:
+            return
+        pk = self.model._meta.pk.attname
+        ids = [row[pk] for row in rows]
+        for name, child, foreign_key in children:
+            model = child.model
+            queryset = model._default_manager.filter(**{f'{foreign_key.name}__in': ids})
+            queryset = queryset.order_by(*(model._meta.ordering or ['pk']))
+            grouped = defaultdict(list)
+            child_rows = list(child.values(queryset, foreign_key.attname))
+            child.fetch_children(child_rows)
+            for child_row in child_rows:
+                grouped[child_row[foreign_key.attname]].append(child_row)
+            for row in rows:
+                row[name] = grouped.get(row[pk], [])
+
+    def render(self, rows, context=None):
+        """Build the representation of ``rows`` from ``values()``."""
+        rows = list(rows)
+        self.fetch_children(rows)
+        render = _Render(context or {})
+        children = self.compiled[3]
+        if not children:
+            return [self.build(row, render) for row in rows]
+        data = []
+        for row in rows:
+            for name, child, _ in children:
+                row[name] = [child.build(child_row, render) for child_row in row[name]]
+            data.append(self.build(row, render))
+        return data
+
+
+class ProjectedListMixin:
+    """``list()`` through ``projection`` instead of the serializer; filters and pagination as usual."""
+    projection = None
+
+    def list(self, request, *args, **kwargs):
+        if self.projection is None:
+            return super().list(request, *args, **kwargs)
+        queryset = self.projection.values(self.filter_queryset(self.get_queryset()))
+        page = self.paginate_queryset(queryset)
+        if page is not None:
+            return self.get_paginated_response(self.projection.render(page, self.get_serializer_context()))
+        return Response(self.projection.render(queryset, self.get_serializer_context()))
+
+
+def _rating_average(avg):
+    # ProductSerializer.get_avg_rating
+    return round(avg, 1) if avg else 0
+
+
+_reviews = ProductReview.objects.filter(product=OuterRef('pk')).order_by().values('product')
+
+PRODUCT_LIST = Projection(ProductSerializer, {
+    # Product.current_price
+    'current_price': Value('effective_price'),
+    'in_stock': Method('stock'),
+    'avg_rating': Annotation(
+        Subquery(_reviews.annotate(avg=Avg('rating')).values('avg'), output_field=FloatField()),
+        _rating_average,
+    ),
+    'review_count': Annotation(
+        Coalesce(Subquery(_reviews.annotate(count=Count('pk')).values('count'), output_field=IntegerField()), 0),
+    ),
+    # User.__str__
+    'reviews.user': Value('user__username'),
+    'vendor.user': Method(
+        'user__id', 'user__username', 'user__email', 'user__phone', 'user__is_customer', 'user__is_vendor',
+    ),
+})
+ORDER_LIST = Projection(OrderSerializer, {
+    'created_formatted': Method('created'),
+    # Product.__str__
+    'items.product': Value('product__name'),
+})
+
+
+def _apply_read_watermark(data, row, context):
+    # NotificationSerializer.to_representation
+    watermark = context.get('read_watermark')
+    if watermark is not None and row['created_at'] <= watermark:
+        data['is_read'] = True
+
+
+NOTIFICATION_LIST = Projection(
+    NotificationSerializer,
+    {'time_since': Method('created_at')},
+    finalize=_apply_read_watermark,
+)
@@ -0,0 +1,162 @@
+"""
+Notification retention: compact read notifications older than the retention
+window.
+
+Each batch of expired notifications is folded into one summary notification
+per recipient and type (``collapsed_count`` records how many it replaces),
+copied to ``NotificationArchive`` when archiving, and deleted, all in one
+transaction.  "Read" includes everything behind the recipient's
+``read_watermark``.  Run it from cron with ``manage.py compact_notifications``.
+"""
+from collections import Counter
+from datetime import timedelta
+
+from django.conf import settings
+from django.db import connection, transaction
+from django.db.models import F, Q
+from django.utils import timezone
+
+from .models import Notification, NotificationArchive
+
+DEFAULTS = {
+    'READ_DAYS': 30,
+    # 'archive' copies rows to NotificationArchive before deleting, 'delete' drops them
+    'MODE': 'archive',
+    'BATCH_SIZE': 1000,
+    'SUMMARIZE': True,
+}
+RETENTION_MODES = ('archive', 'delete')
+
+
+def get_retention_settings():
+    return {**DEFAULTS, **getattr(settings, 'NOTIFICATION_RETENTION', {})}
+
+
+def expired_notifications(cutoff):
+    read = Q(is_read=True) | Q(created_at__lte=F('recipient__notification_state__read_watermark'))
+    return Notification.objects.filter(read, created_at__lt=cutoff, collapsed_count=0)
+
+
+def _summary_message(count):
+    return f"{count} older notification{'s' if count != 1 else ''} archived."
+
+
+def _summarize(batch):
+    counts = Counter((row['recipient_id'], row['notification_type']) for row in batch)
+    newest = {}
+    for row in batch:
+        key = (row['recipient_id'], row['notification_type'])
+        newest[key] = max(newest.get(key, row['created_at']), row['created_at'])
+
+    recipients = {recipient_id for recipient_id, _ in counts}
+    existing = {
+        (summary.recipient_id, summary.notification_type): summary
+        for summary in Notification.objects.filter(recipient_id__in=recipients, collapsed_count__gt=0)
+    }
+
+    type_labels = dict(Notification.NOTIFICATION_TYPES)
+    updated, created = [], []
+    for key, count in counts.items():
+        summary = existing.get(key)
+        if summary is not None:
+            summary.collapsed_count += count
+            summary.message = _summary_message(summary.collapsed_count)
+            updated.append(summary)
+            continue
+        recipient_id, notification_type = key
+        created.append(Notification(
+            recipient_id=recipient_id,
+            title=f"Earlier {type_labels.get(notification_type, notification_type).lower()} notifications",
+            message=_summary_message(count),
+            notification_type=notification_type,
+            is_read=True,
+            collapsed_count=count,
+        ))
+
+    # bulk_* skips the Notification signals: summaries are read and never pushed
+    if updated:
+        Notification.objects.bulk_update(updated, ['collapsed_count', 'message'])
+    if created:
+        Notification.objects.bulk_create(created)
+        if created[0].pk is None:
+            # Backends that don't return new ids (MySQL); each recipient and
+            # type has exactly one summary, so the pair identifies it
+            ids = {
+                (recipient_id, notification_type): pk
+                for pk, recipient_id, notification_type in Notification.objects.filter(
+                    recipient_id__in=recipients, collapsed_count__gt=0,
+                ).values_list('pk', 'recipient_id', 'notification_type')
+            }
+            for summary in created:
+                summary.pk = ids[(summary.recipient_id, summary.notification_type)]
+        # auto_now_add stamped them with now(); sit where the notifications
+        # they replace were instead, not at the top of the list
+        for summary in created:
+            summary.created_at = newest[(summary.recipient_id, summary.notification_type)]
+        Notification.objects.bulk_update(created, ['created_at'])
+    return len(created)
+
+
+def _archive(batch):
+    NotificationArchive.objects.bulk_create([
+        NotificationArchive(
+            original_id=row['id'],
+            recipient_id=row['recipient_id'],
+            title=row['title'],
+            message=row['message'],
+            notification_type=row['notification_type'],
+            created_at=row['created_at'],
+            related_object_id=row['related_object_id'],
+            related_content_type_id=row['related_content_type_id'],
+        )
+        for row in batch
+    ])
+
+
+def _delete_rows(ids):
+    # Deliberately not QuerySet.delete(): the post_delete receiver on
+    # Notification makes the collector load every row and run the unread
+    # bookkeeping (a watermark query) per row.  These rows are all read, so
+    # that bookkeeping has nothing to do, and no model references a
+    # Notification, so there is nothing to cascade either.
+    quote = connection.ops.quote_name
+    with connection.cursor() as cursor:
+        cursor.execute(
+            f"DELETE FROM {quote(Notification._meta.db_table)} "
+            f"WHERE {quote(Notification._meta.pk.column)} IN ({', '.join(['%s'] * len(ids))})",
+            ids,
+        )
+
+
+def compact_notifications(days=None, mode=None, batch_size=None, summarize=None, progress=None):
+    """Compact expired notifications batch by batch. Returns totals."""
+    config = get_retention_settings()
+    days = config['READ_DAYS'] if days is None else days
+    mode = mode or config['MODE']
+    batch_size = batch_size or config['BATCH_SIZE']
+    summarize = config['SUMMARIZE'] if summarize is None else summarize
+    if mode not in RETENTION_MODES:
+        raise ValueError(f"Unknown retention mode '{mode}'")
+
+    cutoff = timezone.now() - timedelta(days=days)
+    totals = {'removed': 0, 'archived': 0, 'summaries': 0}
+    while True:
+        with transaction.atomic():
+            batch = list(
+                expired_notifications(cutoff).order_by('id').values(
+                    'id', 'recipient_id', 'title', 'message', 'notification_type',
+                    'created_at', 'related_object_id', 'related_content_type_id',
+                )[:batch_size]
+            )
+            if not batch:
+                break
+            if summarize:
+                totals['summaries'] += _summarize(batch)
+            if mode == 'archive':
+                _archive(batch)
+                totals['archived'] += len(batch)
+            _delete_rows([row['id'] for row in batch])
+            totals['removed'] += len(batch)
+        if progress is not None:
+            progress(totals)
+    return totals
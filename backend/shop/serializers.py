@@ -2,6 +2,10 @@ from rest_framework import serializers
 from .models import *
 from django.contrib.auth import get_user_model
 from rest_framework_simplejwt.serializers import TokenObtainPairSerializer
+from .authentication import add_user_claims
+# Serializers that render responses mix in TimedSerializerMixin for the
+# per-request serializer timing; nested and input-only ones don't need it
+from .performance import TimedSerializerMixin
 
 class ProductImageSerializer(serializers.ModelSerializer):
     class Meta:
@@ -22,9 +26,11 @@ class ProductReviewSerializer(serializers.ModelSerializer):
 
 
 from django.db.models import Avg
+from django.utils.text import slugify
+from decimal import Decimal
 
 
-class VendorProfileSerializer(serializers.ModelSerializer):
+class VendorProfileSerializer(TimedSerializerMixin, serializers.ModelSerializer):
     user = serializers.SerializerMethodField()
     business_name = serializers.CharField()
     description = serializers.CharField()
@@ -168,7 +174,7 @@ class CategorySerializer(serializers.ModelSerializer):
 
 
 
-class ProductSerializer(serializers.ModelSerializer):
+class ProductSerializer(TimedSerializerMixin, serializers.ModelSerializer):
     current_price = serializers.SerializerMethodField()
     in_stock = serializers.SerializerMethodField()
     avg_rating = serializers.SerializerMethodField()
@@ -226,7 +232,7 @@ class CustomerUserSerializer(serializers.ModelSerializer):
         model = User
         fields = ['id', 'email', 'first_name', 'last_name', 'is_staff', 'is_active', 'date_joined', 'last_login']
 
-class CustomerSerializer(serializers.ModelSerializer):
+class CustomerSerializer(TimedSerializerMixin, serializers.ModelSerializer):
     class Meta:
         model = User
         fields = ['id', 'first_name', 'last_name', 'email', 'is_staff', 'is_active', 'date_joined', 'last_login']
@@ -293,29 +299,14 @@ from django.utils.translation import gettext_lazy as _
 
 class CustomTokenObtainPairSerializer(TokenObtainPairSerializer):
     def validate(self, attrs):
-        # Allow authentication with either username or email
-        username = attrs.get('username')
-        password = attrs.get('password')
-        
-        # Try to authenticate with username first, then with email
+        # Username or email is resolved by shop.backends.UsernameOrEmailBackend,
+        # so the password is only hashed once per attempt
         user = authenticate(
             request=self.context.get('request'),
-            username=username,
-            password=password
+            username=attrs.get('username'),
+            password=attrs.get('password')
         )
         
-        # If username authentication failed, try email
-        if user is None:
-            try:
-                user_obj = User.objects.get(email=username)
-                user = authenticate(
-                    request=self.context.get('request'),
-                    username=user_obj.username,
-                    password=password
-                )
-            except User.DoesNotExist:
-                pass
-        
         if user:
             if not user.is_active:
                 raise serializers.ValidationError(_("User account is disabled."))
@@ -339,11 +330,8 @@ class CustomTokenObtainPairSerializer(TokenObtainPairSerializer):
     @classmethod
     def get_token(cls, user):
         token = super().get_token(user)
-        # Add custom claims
-        token['is_customer'] = user.is_customer
-        token['is_vendor'] = user.is_vendor
-        token['username'] = user.username
-        return token
+        # Add custom claims (read by shop.authentication.ClaimsJWTAuthentication)
+        return add_user_claims(token, user)
 
 
 
@@ -377,7 +365,7 @@ class UserRegistrationSerializer(serializers.ModelSerializer):
         )
         return user
 
-class CustomerProfileSerializer(serializers.ModelSerializer):
+class CustomerProfileSerializer(TimedSerializerMixin, serializers.ModelSerializer):
     user = UserRegistrationSerializer()
     
     class Meta:
@@ -395,7 +383,7 @@ class CustomerProfileSerializer(serializers.ModelSerializer):
 
 
 
-class UserProfileSerializer(serializers.ModelSerializer):
+class UserProfileSerializer(TimedSerializerMixin, serializers.ModelSerializer):
     class Meta:
         model = User
         fields = ['username', 'email', 'phone', 'is_vendor', 'is_customer']
@@ -441,7 +429,7 @@ class PasswordChangeSerializer(serializers.Serializer):
 
 
 
-class AddressSerializer(serializers.ModelSerializer):
+class AddressSerializer(TimedSerializerMixin, serializers.ModelSerializer):
     class Meta:
         model = Address
         fields = [
@@ -470,7 +458,7 @@ class AddressSerializer(serializers.ModelSerializer):
                     )
         return data
 
-class CategorySerializer(serializers.ModelSerializer):
+class CategorySerializer(TimedSerializerMixin, serializers.ModelSerializer):
     parent = serializers.StringRelatedField()
     
     class Meta:
@@ -497,11 +485,13 @@ class OrderItemSerializer(serializers.ModelSerializer):
 import uuid
 
 
-class OrderSerializer(serializers.ModelSerializer):
+class OrderSerializer(TimedSerializerMixin, serializers.ModelSerializer):
     items = OrderItemSerializer(many=True, read_only=True)
     status_display = serializers.CharField(source='get_status_display', read_only=True)
     payment_method_display = serializers.CharField(source='get_payment_method_display', read_only=True)
     created_formatted = serializers.SerializerMethodField()
+    # A JSON number, as clients have always received it
+    total = serializers.DecimalField(max_digits=10, decimal_places=2, coerce_to_string=False, required=False)
 
     class Meta:
         model = Order
@@ -516,19 +506,13 @@ class OrderSerializer(serializers.ModelSerializer):
     def get_created_formatted(self, obj):
         return obj.created.strftime('%b %d, %Y %I:%M %p') if obj.created else None
 
-    def to_representation(self, instance):
-        representation = super().to_representation(instance)
-        # Add any additional formatting here
-        representation['total'] = float(representation['total']) if representation.get('total') else 0.0
-        return representation
-
 
 
 
 
 
 
-class CartItemSerializer(serializers.ModelSerializer):
+class CartItemSerializer(TimedSerializerMixin, serializers.ModelSerializer):
     product = serializers.PrimaryKeyRelatedField(
         queryset=Product.objects.all(),
         required=True  # Make sure product is required
@@ -549,7 +533,7 @@ class CartItemSerializer(serializers.ModelSerializer):
 
 
 
-class CartSerializer(serializers.ModelSerializer):
+class CartSerializer(TimedSerializerMixin, serializers.ModelSerializer):
     items = CartItemSerializer(many=True, read_only=True)
     total = serializers.DecimalField(max_digits=10, decimal_places=2, read_only=True)
     user = serializers.StringRelatedField()
@@ -617,7 +601,7 @@ class ContactSubmissionSerializer(serializers.ModelSerializer):
 
 
 
-class NotificationSerializer(serializers.ModelSerializer):
+class NotificationSerializer(TimedSerializerMixin, serializers.ModelSerializer):
     time_since = serializers.SerializerMethodField()
     
     class Meta:
@@ -630,9 +614,18 @@ class NotificationSerializer(serializers.ModelSerializer):
             'is_read', 
             'created_at',
             'time_since',
-            'related_object_id'
+            'related_object_id',
+            'collapsed_count'
         ]
-        read_only_fields = ['id', 'created_at', 'time_since']
+        read_only_fields = ['id', 'created_at', 'time_since', 'collapsed_count']
+
+    def to_representation(self, instance):
+        data = super().to_representation(instance)
+        # Behind the recipient's "mark all read" watermark counts as read
+        watermark = self.context.get('read_watermark')
+        if watermark is not None and instance.created_at <= watermark:
+            data['is_read'] = True
+        return data
     
     def get_time_since(self, obj):
         return obj.time_since
@@ -730,7 +723,7 @@ class ProductCreateSerializer(serializers.ModelSerializer):
 
 
 # Keep this as your main ProductReviewSerializer
-class ProductReviewSerializer(serializers.ModelSerializer):
+class ProductReviewSerializer(TimedSerializerMixin, serializers.ModelSerializer):
     user = serializers.StringRelatedField(read_only=True)  # Shows username
     
     class Meta:
@@ -777,7 +770,7 @@ class ProductReviewCreateSerializer(serializers.ModelSerializer):
 
 
 
-class SystemSettingsSerializer(serializers.ModelSerializer):
+class SystemSettingsSerializer(TimedSerializerMixin, serializers.ModelSerializer):
     class Meta:
         model = SystemSettings
         fields = [
@@ -808,4 +801,85 @@ class SystemSettingsSerializer(serializers.ModelSerializer):
             return value
         if not value.startswith('pk_'):
             raise serializers.ValidationError("Stripe public key should start with 'pk_'")
-        return value
\ No newline at end of file
+        return value
+
+
+
+class ProductImportRowSerializer(serializers.Serializer):
+    """
+    Validates one row of a bulk product import.  Deliberately a plain
+    Serializer: SKU/slug uniqueness and category/vendor lookups are checked
+    per batch by shop.imports instead of with one query per row.
+    """
+    name = serializers.CharField(max_length=200)
+    slug = serializers.SlugField(max_length=50, required=False, allow_blank=True)
+    description = serializers.CharField(required=False, allow_blank=True, default='')
+    price = serializers.DecimalField(max_digits=10, decimal_places=2, min_value=Decimal('0'))
+    discount_price = serializers.DecimalField(
+        max_digits=10, decimal_places=2, min_value=Decimal('0'), required=False, allow_null=True
+    )
+    category = serializers.CharField(help_text="Category id or slug")
+    vendor = serializers.IntegerField(required=False, allow_null=True)
+    stock = serializers.IntegerField(min_value=0, required=False, default=0)
+    sku = serializers.CharField(max_length=50)
+    featured = serializers.BooleanField(required=False, default=False)
+    active = serializers.BooleanField(required=False, default=True)
+
+    def to_internal_value(self, data):
+        # CSV cells come through as empty strings for missing values
+        data = {key: value for key, value in data.items() if value not in ('', None)}
+        return super().to_internal_value(data)
+
+    def validate(self, data):
+        discount_price = data.get('discount_price')
+        if discount_price is not None and discount_price >= data['price']:
+            raise serializers.ValidationError(
+                "Discount price must be less than regular price"
+            )
+        if not data.get('slug'):
+            data['slug'] = slugify(data['name'])[:50]
+        return data
+
+
+BULK_UPDATE_FIELDS = ['price', 'discount_price', 'stock', 'active']
+
+
+class ProductBulkUpdateItemSerializer(serializers.Serializer):
+    """
+    One entry of a bulk price/stock update.  ``updated`` is optional and,
+    when given, must match the product's current ``updated`` timestamp.
+    """
+    sku = serializers.CharField(max_length=50)
+    price = serializers.DecimalField(max_digits=10, decimal_places=2, min_value=Decimal('0'), required=False)
+    discount_price = serializers.DecimalField(
+        max_digits=10, decimal_places=2, min_value=Decimal('0'), required=False, allow_null=True
+    )
+    stock = serializers.IntegerField(min_value=0, required=False)
+    active = serializers.BooleanField(required=False)
+    updated = serializers.DateTimeField(required=False)
+
+    def validate(self, data):
+        if not set(data) & set(BULK_UPDATE_FIELDS):
+            raise serializers.ValidationError(
+                f"Provide at least one of: {', '.join(BULK_UPDATE_FIELDS)}"
+            )
+        return data
+
+
+class NotificationBroadcastSerializer(serializers.Serializer):
+    """Input for the admin broadcast endpoint (shop.fanout)."""
+    AUDIENCE_CHOICES = ('all', 'customers', 'vendors', 'staff', 'product_buyers', 'users')
+
+    audience = serializers.ChoiceField(choices=AUDIENCE_CHOICES)
+    title = serializers.CharField(max_length=255)
+    message = serializers.CharField()
+    notification_type = serializers.ChoiceField(choices=Notification.NOTIFICATION_TYPES, default='system')
+    product_id = serializers.IntegerField(required=False)
+    user_ids = serializers.ListField(child=serializers.IntegerField(), required=False, allow_empty=False)
+
+    def validate(self, data):
+        if data['audience'] == 'product_buyers' and not data.get('product_id'):
+            raise serializers.ValidationError({'product_id': "Required for the product_buyers audience."})
+        if data['audience'] == 'users' and not data.get('user_ids'):
+            raise serializers.ValidationError({'user_ids': "Required for the users audience."})
+        return data
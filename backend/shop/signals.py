@@ -0,0 +1,124 @@
+from django.db.models.signals import post_delete, post_save, pre_save
+from django.dispatch import receiver
+from django.utils import timezone
+
+from . import notifications
+from .authentication import REVOKING_FIELDS, revoke_user_tokens, user_cache
+from .models import (
+    Cart, CartItem, Notification, Order, OrderItem, Product, ProductImage, ProductReview, User, Vendor,
+)
+
+
+def _saves_revoking_fields(update_fields):
+    return update_fields is None or not set(REVOKING_FIELDS).isdisjoint(update_fields)
+
+
+@receiver(pre_save, sender=User)
+def remember_user_claims(sender, instance, raw=False, update_fields=None, **kwargs):
+    # Keep the stored values so post_save can tell whether tokens went stale;
+    # saves that can't touch them (login's last_login update) skip the query
+    if raw or not instance.pk or not _saves_revoking_fields(update_fields):
+        instance._previous_claims = None
+        return
+    instance._previous_claims = User.objects.filter(pk=instance.pk)\
+                                            .values_list(*REVOKING_FIELDS).first()
+
+
+@receiver(post_save, sender=User)
+def refresh_user_tokens(sender, instance, created, raw=False, update_fields=None, **kwargs):
+    user_cache.discard(instance.pk)
+    if created or raw or not _saves_revoking_fields(update_fields):
+        return
+    current = tuple(getattr(instance, field) for field in REVOKING_FIELDS)
+    previous = getattr(instance, '_previous_claims', None)
+    if not instance.is_active or (previous is not None and previous != current):
+        revoke_user_tokens(instance.pk)
+
+
+@receiver(post_delete, sender=User)
+def revoke_deleted_user_tokens(sender, instance, **kwargs):
+    revoke_user_tokens(instance.pk)
+
+
+@receiver(pre_save, sender=Notification)
+def remember_read_state(sender, instance, raw=False, **kwargs):
+    if raw or not instance.pk:
+        instance._was_read = None
+        return
+    instance._was_read = Notification.objects.filter(pk=instance.pk)\
+                                             .values_list('is_read', flat=True).first()
+
+
+@receiver(post_save, sender=Notification)
+def update_unread_count(sender, instance, created, raw=False, **kwargs):
+    if raw:
+        return
+    if created:
+        notifications.publish_notification(instance)
+        if not instance.is_read:
+            notifications.adjust_unread(instance.recipient_id, 1)
+        return
+    was_read = getattr(instance, '_was_read', None)
+    if was_read is None or was_read == instance.is_read:
+        return
+    # Notifications behind the read watermark count as read either way
+    watermark = notifications.get_read_watermark(instance.recipient_id)
+    if watermark is None or instance.created_at > watermark:
+        notifications.adjust_unread(instance.recipient_id, -1 if instance.is_read else 1)
+
+
+@receiver(post_delete, sender=Notification)
+def discount_deleted_notification(sender, instance, **kwargs):
+    if instance.is_read:
+        return
+    if notifications.is_unread(instance, notifications.get_read_watermark(instance.recipient_id)):
+        # No backfill: the recipient itself may be in the middle of being deleted
+        notifications.adjust_unread(instance.recipient_id, -1, backfill=False)
+
+
+# Conditional GET (shop.conditional) versions responses by the parent's
+# ``updated`` (``content_updated`` for products, whose ``updated`` is the
+# bulk-update concurrency token); bump it when rows embedded in its
+# representation change.  ``update()`` skips these signals, so the bumps
+# don't cascade.
+
+def _touch(model, field='updated', **lookup):
+    model.objects.filter(**lookup).update(**{field: timezone.now()})
+
+
+@receiver(post_save, sender=ProductReview)
+@receiver(post_delete, sender=ProductReview)
+@receiver(post_save, sender=ProductImage)
+@receiver(post_delete, sender=ProductImage)
+def touch_product(sender, instance, raw=False, **kwargs):
+    if not raw:
+        _touch(Product, 'content_updated', pk=instance.product_id)
+
+
+@receiver(post_save, sender=Vendor)
+def touch_vendor_products(sender, instance, raw=False, **kwargs):
+    if not raw:
+        _touch(Product, 'content_updated', vendor_id=instance.pk)
+
+
+@receiver(post_save, sender=User)
+def touch_vendor_user_products(sender, instance, created, raw=False, update_fields=None, **kwargs):
+    # Logins only move last_login, which no product shows
+    if created or raw or (update_fields is not None and set(update_fields) <= {'last_login'}):
+        return
+    if instance.is_vendor:
+        _touch(Product, 'content_updated', vendor__user_id=instance.pk)
+
+
+@receiver(post_save, sender=CartItem)
+@receiver(post_delete, sender=CartItem)
+def touch_cart(sender, instance, raw=False, **kwargs):
+    if not raw:
+        _touch(Cart, pk=instance.cart_id)
+
+
+@receiver(post_save, sender=OrderItem)
+@receiver(post_delete, sender=OrderItem)
+def touch_order(sender, instance, raw=False, **kwargs):
+    if not raw:
+        _touch(Order, pk=instance.order_id)
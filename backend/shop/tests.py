@@ -1,3 +1,1641 @@
-from django.test import TestCase
+import gzip
+import importlib
+import io
+import json
+import logging
+import logging.handlers
+import os
+import re
+import runpy
+import sys
+import tempfile
+import time
+from datetime import timedelta
+from decimal import Decimal
+from io import StringIO
+from unittest import mock, skipUnless
 
-# Create your tests here.
+from asgiref.sync import iscoroutinefunction, sync_to_async
+from django.conf import settings
+from django.contrib.auth import authenticate
+from django.contrib.auth.models import AnonymousUser
+from django.core.cache import cache, caches
+from django.core.exceptions import ImproperlyConfigured
+from django.core.files.uploadedfile import SimpleUploadedFile
+from django.core.management import CommandError, call_command
+from django.db import connection
+from django.http import HttpResponse, StreamingHttpResponse
+from django.test import AsyncClient, AsyncRequestFactory, RequestFactory, SimpleTestCase, TestCase, override_settings
+from django.test.utils import CaptureQueriesContext
+from rest_framework.exceptions import ParseError
+from rest_framework.parsers import JSONParser
+from rest_framework.renderers import JSONRenderer
+from rest_framework.request import Request
+from rest_framework.serializers import Serializer
+from rest_framework.test import APIClient
+from rest_framework_simplejwt.exceptions import AuthenticationFailed
+from rest_framework_simplejwt.tokens import AccessToken, RefreshToken
+
+from django.urls import clear_url_caches
+from django.utils import timezone
+from django.utils.http import http_date
+from django.utils.module_loading import import_string
+
+from ecom import log_handlers
+
+from . import (
+    analytics, async_views, bulk_updates, compression, db_router, fanout, notifications, nplusone, payment_views, performance,
+    projections, retention, throttling, token_blacklist, tracing,
+)
+from .authentication import REVOKED_KEY, ClaimsJWTAuthentication, ClaimsUser, revoke_user_tokens, user_cache
+from .fast_json import FastJSONParser, FastJSONRenderer, dumps
+from .models import (
+    Address, Cart, CartItem, Category, ContactSubmission, Notification, NotificationArchive, Order,
+    OrderItem, Product, ProductImage, ProductReview, RevokedRefreshToken, SystemSettings, User, Vendor,
+)
+from .serializers import (
+    CategorySerializer, CustomTokenObtainPairSerializer, OrderSerializer, ProductSerializer,
+)
+from .views import CartDetailView, NotificationListView, ProductListView
+
+
+@override_settings(DATABASE_REPLICAS=[])
+class QueryPlanTests(TestCase):
+    """
+    Runs EXPLAIN on every query the hot endpoints issue against a seeded
+    database and fails on full-table scans, so a new filter or ordering
+    without a matching index shows up here instead of in production.
+    """
+    # Tables small enough (or queried rarely enough) that scanning is fine
+    ALLOWED_SCANS = {'shop_systemsettings', 'django_content_type'}
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.admin = User.objects.create_user('admin', 'admin@example.com', 'pw', is_staff=True)
+        cls.customer = User.objects.create_user('customer', 'customer@example.com', 'pw', is_customer=True)
+        vendor_user = User.objects.create_user('vendor', 'vendor@example.com', 'pw', is_vendor=True)
+        cls.vendor = Vendor.objects.create(user=vendor_user, business_name='Vendor', approved=True)
+
+        categories = Category.objects.bulk_create(
+            Category(name=f'Category {i}', slug=f'category-{i}') for i in range(5)
+        )
+        Product.objects.bulk_create(
+            Product(
+                name=f'Product {i}', slug=f'product-{i}', description='', sku=f'SKU-{i}',
+                price=Decimal(10 + i), category=categories[i % 5], vendor=cls.vendor,
+                stock=5, active=i % 10 != 0,
+            )
+            for i in range(200)
+        )
+        products = list(Product.objects.filter(active=True)[:20])
+        cls.product = products[0]
+        ProductReview.objects.bulk_create(
+            ProductReview(product=product, user=cls.customer, rating=5, title='t', content='c')
+            for product in products for _ in range(3)
+        )
+        # Spread rows over several users so the planner sees realistic selectivity
+        customers = [cls.customer] + [
+            User.objects.create_user(f'customer{i}', f'customer{i}@example.com', 'pw', is_customer=True)
+            for i in range(9)
+        ]
+        for customer in customers:
+            address = Address.objects.create(
+                user=customer, street='s', city='c', state='s', zip_code='z',
+                country='c', address_type='S', default=True,
+            )
+            Order.objects.bulk_create(
+                Order(
+                    user=customer, order_number=f'ORD-{customer.pk}-{i}', status='PCF'[i % 3],
+                    shipping_address=address, billing_address=address,
+                    total=Decimal(20), payment_method='card',
+                )
+                for i in range(10)
+            )
+            Notification.objects.bulk_create(
+                Notification(recipient=customer, title='t', message='m',
+                             notification_type='system', is_read=i % 2 == 0)
+                for i in range(10)
+            )
+        ContactSubmission.objects.bulk_create(
+            ContactSubmission(name='n', email='n@example.com', message='m', is_responded=i % 2 == 0)
+            for i in range(20)
+        )
+
+    def explain(self, sql):
+        with connection.cursor() as cursor:
+            if connection.vendor == 'postgresql':
+                # Tiny test tables make sequential scans cheapest; forbid them
+                # so the planner shows whether a usable index exists at all
+                cursor.execute('SET LOCAL enable_seqscan = off')
+                cursor.execute(f'EXPLAIN {sql}')
+            elif connection.vendor == 'mysql':
+                cursor.execute(f'EXPLAIN FORMAT=TREE {sql}')
+            else:
+                # No ANALYZE on purpose: without table statistics SQLite assumes
+                # indexes are selective, so a scan means no usable index
+                cursor.execute(f'EXPLAIN QUERY PLAN {sql}')
+            return '\n'.join(str(row[-1]) for row in cursor.fetchall())
+
+    def full_scans(self, plan):
+        if connection.vendor == 'postgresql':
+            tables = re.findall(r'Seq Scan on (\w+)', plan)
+        elif connection.vendor == 'mysql':
+            tables = re.findall(r'Table scan on (\w+)', plan)
+        else:
+            # "SCAN t" without an index; "SCAN t USING INDEX" walks an index in order
+            tables = re.findall(r'^\s*SCAN (\w+)\b(?! USING)', plan, re.MULTILINE)
+        return [table for table in tables if table not in self.ALLOWED_SCANS]
+
+    def assertNoFullScans(self, path, user=None, params=None):
+        client = APIClient()
+        if user is not None:
+            client.force_authenticate(user)
+        with CaptureQueriesContext(connection) as queries:
+            response = client.get(path, params or {})
+        self.assertEqual(response.status_code, 200, path)
+
+        for query in queries.captured_queries:
+            sql = query['sql']
+            if not sql.lstrip().upper().startswith('SELECT'):
+                continue
+            plan = self.explain(sql)
+            self.assertEqual(self.full_scans(plan), [], f"{path}\n{sql}\n{plan}")
+
+    def test_product_list(self):
+        self.assertNoFullScans('/api/products/')
+        self.assertNoFullScans('/api/products/', params={'ordering': 'price'})
+        self.assertNoFullScans('/api/products/', params={'ordering': '-created'})
+        self.assertNoFullScans('/api/products/', params={'category': 'category-1', 'ordering': 'price'})
+        self.assertNoFullScans('/api/products/', params={'min_price': 50, 'max_price': 100})
+
+    def test_vendor_products(self):
+        self.assertNoFullScans(f'/api/vendors/{self.vendor.pk}/products/')
+
+    def test_product_reviews(self):
+        self.assertNoFullScans(f'/api/products/{self.product.pk}/reviews/')
+
+    def test_customer_orders(self):
+        self.assertNoFullScans('/api/orders/', user=self.customer)
+
+    def test_admin_orders(self):
+        self.assertNoFullScans('/api/orders/admin/', user=self.admin, params={'user_id': self.customer.pk})
+
+    def test_addresses(self):
+        self.assertNoFullScans('/api/addresses/', user=self.customer)
+
+    def test_notifications(self):
+        self.assertNoFullScans('/api/notifications/', user=self.customer)
+        self.assertNoFullScans('/api/notifications/unread-count/', user=self.customer)
+
+    def test_admin_dashboard(self):
+        self.assertNoFullScans('/api/admin/recent-activity/', user=self.admin)
+
+
+@override_settings(DATABASE_REPLICAS=['replica1'])
+class ReplicaRouterTests(SimpleTestCase):
+    def setUp(self):
+        self.router = db_router.PrimaryReplicaRouter()
+        self.factory = RequestFactory()
+
+    def test_reads_use_primary_by_default(self):
+        self.assertEqual(self.router.db_for_read(Product), 'default')
+        with db_router.replica_reads():
+            self.assertEqual(self.router.db_for_read(Product), 'replica1')
+            self.assertEqual(self.router.db_for_write(Product), 'default')
+        self.assertEqual(self.router.db_for_read(Product), 'default')
+
+    def test_primary_instances_keep_reading_primary(self):
+        product = Product()
+        product._state.db = 'default'
+        with db_router.replica_reads():
+            self.assertEqual(self.router.db_for_read(Category, instance=product), 'default')
+
+    @override_settings(DATABASE_REPLICAS=[])
+    def test_no_replicas_configured(self):
+        with db_router.replica_reads():
+            self.assertEqual(self.router.db_for_read(Product), 'default')
+
+    def route(self, request, view):
+        seen = {}
+
+        def get_response(request):
+            middleware.process_view(request, view, (), {})
+            seen['replica'] = db_router.replica_reads_enabled()
+            return HttpResponse()
+
+        middleware = db_router.ReplicaRoutingMiddleware(get_response)
+        response = middleware(request)
+        self.assertFalse(db_router.replica_reads_enabled())
+        return seen['replica'], response
+
+    def test_flagged_views_read_from_replica(self):
+        replica, _ = self.route(self.factory.get('/api/products/'), ProductListView.as_view())
+        self.assertTrue(replica)
+        replica, _ = self.route(self.factory.get('/api/cart/'), CartDetailView.as_view())
+        self.assertFalse(replica)
+
+    def test_writes_pin_client_to_primary(self):
+        replica, response = self.route(self.factory.post('/api/products/'), ProductListView.as_view())
+        self.assertFalse(replica)
+        self.assertIn(db_router.STICKY_COOKIE, response.cookies)
+
+        request = self.factory.get('/api/products/')
+        request.COOKIES[db_router.STICKY_COOKIE] = response.cookies[db_router.STICKY_COOKIE].value
+        replica, _ = self.route(request, ProductListView.as_view())
+        self.assertFalse(replica)
+
+        request.COOKIES[db_router.STICKY_COOKIE] = str(int(time.time()) - 1)
+        replica, _ = self.route(request, ProductListView.as_view())
+        self.assertTrue(replica)
+
+
+@skipUnless(settings.DATABASE_REPLICAS, "Run with DJANGO_DB_REPLICAS=<second sqlite file> to test two databases")
+class ReplicaRoutingIntegrationTests(TestCase):
+    """
+    End to end against two real databases.  Nothing replicates between the
+    test databases, so whichever one answered is visible in the results.
+    """
+    databases = {'default', *settings.DATABASE_REPLICAS}
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.user = User.objects.create_user('customer', 'customer@example.com', 'pw')
+        vendor_user = User.objects.create_user('vendor', 'vendor@example.com', 'pw', is_vendor=True)
+        vendor = Vendor.objects.create(user=vendor_user, business_name='Vendor', approved=True)
+        category = Category.objects.create(name='Category', slug='category')
+        Product.objects.create(
+            name='Primary only', slug='primary-only', description='', sku='SKU-1',
+            price=Decimal(10), category=category, vendor=vendor,
+        )
+        Order.objects.create(user=cls.user, order_number='ORD-1', payment_method='card')
+
+    def test_catalog_reads_replica_until_client_writes(self):
+        client = APIClient()
+        self.assertEqual(client.get('/api/products/').data['count'], 0)
+
+        response = client.post('/api/token/', {'username': 'customer', 'password': 'pw'}, format='json')
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(client.get('/api/products/').data['count'], 1)
+
+    def test_authenticated_writes_pin_the_user_without_cookies(self):
+        self.addCleanup(cache.delete, db_router.STICKY_USER_KEY.format(self.user.pk))
+        token = CustomTokenObtainPairSerializer.get_token(self.user).access_token
+        client = APIClient(HTTP_AUTHORIZATION=f'Bearer {token}')
+        self.assertEqual(client.get('/api/products/').data['count'], 0)
+
+        response = client.post('/api/notifications/read-all/')
+        self.assertEqual(response.status_code, 200)
+        self.assertNotIn(db_router.STICKY_COOKIE, response.cookies)
+        # A cross-origin SPA sends no cookies back
+        client.cookies.clear()
+        self.assertEqual(client.get('/api/products/').data['count'], 1)
+        # Other users keep reading the replica
+        self.assertEqual(APIClient().get('/api/products/').data['count'], 0)
+
+    def test_read_your_writes_views_use_primary(self):
+        client = APIClient()
+        client.force_authenticate(self.user)
+        self.assertEqual(client.get('/api/orders/').data['count'], 1)
+
+
+class NPlusOneTests(TestCase):
+    @classmethod
+    def setUpTestData(cls):
+        vendor_user = User.objects.create_user('vendor', 'vendor@example.com', 'pw', is_vendor=True)
+        cls.vendor = Vendor.objects.create(user=vendor_user, business_name='Vendor', approved=True)
+        cls.categories = Category.objects.bulk_create(
+            Category(name=f'Category {i}', slug=f'category-{i}') for i in range(6)
+        )
+        Product.objects.bulk_create(
+            Product(
+                name=f'Product {i}', slug=f'product-{i}', description='', sku=f'SKU-{i}',
+                price=Decimal(10), category=cls.categories[i], vendor=cls.vendor,
+            )
+            for i in range(6)
+        )
+
+    def test_fingerprint_ignores_parameters(self):
+        self.assertEqual(
+            nplusone.fingerprint("SELECT * FROM t WHERE a = 'x''y' AND b IN (%s, %s, %s) LIMIT 21"),
+            nplusone.fingerprint("SELECT  *  FROM t WHERE a = 'z' AND b IN (%s) LIMIT 5"),
+        )
+
+    def test_repeated_queries_are_reported_with_origin(self):
+        with self.assertLogs('shop.nplusone', 'WARNING'):
+            with nplusone.detect_nplusone(threshold=5, strict=False) as collector:
+                [product.category.name for product in Product.objects.all()]
+        findings = collector.findings(threshold=5)
+        self.assertEqual(len(findings), 1)
+        self.assertEqual(findings[0].count, 6)
+        self.assertIn('shop_category', findings[0].fingerprint)
+        self.assertTrue(all(origin.startswith('shop/tests.py:') for origin in findings[0].origins))
+
+    def test_serializer_fields_are_named(self):
+        with self.assertLogs('shop.nplusone', 'WARNING'):
+            with nplusone.detect_nplusone(threshold=5, strict=False) as collector:
+                ProductSerializer(Product.objects.all(), many=True).data
+        origins = {origin for finding in collector.findings(threshold=5) for origin in finding.origins}
+        self.assertIn('ProductSerializer.review_count', origins)
+        self.assertIn('ProductSerializer.vendor', origins)
+
+    def test_strict_mode_raises(self):
+        with self.assertRaises(nplusone.NPlusOneError):
+            with nplusone.detect_nplusone(threshold=5, strict=True):
+                [product.category.name for product in Product.objects.all()]
+        with nplusone.detect_nplusone(threshold=5, strict=True):
+            [product.category.name for product in Product.objects.select_related('category')]
+
+    @override_settings(SHOP_NPLUSONE={'ENABLED': True, 'STRICT': True, 'THRESHOLD': 5})
+    def test_strict_middleware_fails_request(self):
+        with self.assertRaises(nplusone.NPlusOneError), self.assertLogs('django.request', 'ERROR'):
+            APIClient().get(f'/api/vendors/{self.vendor.pk}/products/')
+
+
+@override_settings(DATABASE_REPLICAS=[])
+class ProjectionTests(TestCase):
+    """The projected list endpoints must render exactly what the serializers render."""
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.customer = User.objects.create_user('customer', 'customer@example.com', 'pw', is_customer=True)
+        vendor_user = User.objects.create_user('vendor', 'vendor@example.com', 'pw', is_vendor=True, phone='555')
+        vendor = Vendor.objects.create(user=vendor_user, business_name='Vendor \u2028', approved=True)
+        category = Category.objects.create(name='Category', slug='category')
+        products = Product.objects.bulk_create(
+            Product(
+                name=f'Product {i}', slug=f'product-{i}', description='d\xe9', sku=f'SKU-{i}',
+                price=Decimal('10.50') + i, discount_price=Decimal('9.99') if i % 3 == 0 else None,
+                category=category, vendor=vendor, stock=i % 4, featured=i == 2,
+            )
+            for i in range(12)
+        )
+        ProductImage.objects.bulk_create([
+            ProductImage(product=products[0], image='products/a.jpg', alt_text='A', default=True),
+            ProductImage(product=products[0], image='', alt_text='empty'),
+            ProductImage(product=products[5], image='products/b.jpg'),
+        ])
+        ProductReview.objects.bulk_create(
+            ProductReview(product=product, user=cls.customer, rating=rating, title='t', content='c')
+            for product in products[:4] for rating in (3, 4, 4)
+        )
+        order = Order.objects.create(user=cls.customer, order_number='ORD-1', payment_method='card',
+                                     total=Decimal('31.50'), shipping_cost=Decimal('2'))
+        OrderItem.objects.create(order=order, product=products[1], price=Decimal('11.50'), quantity=2)
+        OrderItem.objects.create(order=order, product=None, price=Decimal('8.50'), quantity=1)
+        Order.objects.create(user=cls.customer, order_number='ORD-2', payment_method='paypal', status='C')
+        for i in range(5):
+            notifications.notify(cls.customer, f'Title {i}', 'Message', 'order')
+        Notification.objects.filter(title__in=['Title 0', 'Title 1']).update(
+            created_at=timezone.now() - timedelta(days=2))
+
+    def assertSameAsSerializer(self, view, path, params=None):
+        client = APIClient()
+        client.force_authenticate(self.customer)
+        with mock.patch.object(view, 'projection', None):
+            expected = client.get(path, params or {})
+        response = client.get(path, params or {})
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(response.content, expected.content)
+        return response
+
+    def test_product_list(self):
+        self.assertSameAsSerializer(ProductListView, '/api/products/')
+        self.assertSameAsSerializer(ProductListView, '/api/products/', {'page': 2})
+        self.assertSameAsSerializer(ProductListView, '/api/products/', {'ordering': 'price', 'search': 'Product 1'})
+
+    def test_product_list_queries_do_not_grow_with_the_page(self):
+        # version (shop.conditional), count, page, images, reviews
+        with self.assertNumQueries(5):
+            APIClient().get('/api/products/')
+
+    def test_order_list(self):
+        queryset = Order.objects.filter(user=self.customer).order_by('-created')
+        self.assertEqual(
+            dumps(projections.ORDER_LIST.render(projections.ORDER_LIST.values(queryset))),
+            dumps(OrderSerializer(queryset, many=True).data),
+        )
+        client = APIClient()
+        client.force_authenticate(self.customer)
+        response = client.get('/api/orders/')
+        self.assertEqual(response.data['count'], 2)
+        self.assertEqual(response.data['orders'][1]['items'][1]['product'], None)
+
+    def test_notification_list(self):
+        self.assertSameAsSerializer(NotificationListView, '/api/notifications/', {'limit': 3})
+        notifications.mark_all_read(self.customer.pk)
+        Notification.objects.create(recipient=self.customer, title='Later', message='m')
+        response = self.assertSameAsSerializer(NotificationListView, '/api/notifications/')
+        self.assertEqual([n['is_read'] for n in response.data['results']], [False] + [True] * 5)
+
+    def test_unsupported_fields_are_rejected(self):
+        with self.assertRaises(ImproperlyConfigured):
+            projections.Projection(CategorySerializer).compiled
+
+
+@override_settings(SHOP_COMPRESSION={'MIN_SIZE': 200})
+class ConditionalGetTests(TestCase):
+    @classmethod
+    def setUpTestData(cls):
+        cls.customer = User.objects.create_user('customer', 'customer@example.com', 'pw', is_customer=True)
+        vendor_user = User.objects.create_user('vendor', 'vendor@example.com', 'pw', is_vendor=True)
+        vendor = Vendor.objects.create(user=vendor_user, business_name='Vendor', approved=True)
+        category = Category.objects.create(name='Category', slug='category')
+        cls.product = Product.objects.create(
+            name='Kettle', slug='kettle', description='A kettle. ' * 50, sku='SKU-1',
+            price=Decimal('20.00'), category=category, vendor=vendor, stock=3,
+        )
+
+    def test_unchanged_product_is_not_modified(self):
+        client = APIClient()
+        response = client.get(f'/api/products/id/{self.product.pk}/')
+        self.assertEqual(response.status_code, 200)
+        self.assertIn('no-cache', response['Cache-Control'])
+        with self.assertNumQueries(1):
+            again = client.get(f'/api/products/id/{self.product.pk}/', HTTP_IF_NONE_MATCH=response['ETag'])
+        self.assertEqual(again.status_code, 304)
+        self.assertEqual(again['ETag'], response['ETag'])
+
+        again = client.get(f'/api/products/id/{self.product.pk}/', HTTP_IF_MODIFIED_SINCE=response['Last-Modified'])
+        self.assertEqual(again.status_code, 304)
+
+    def test_embedded_changes_change_the_etag(self):
+        client = APIClient()
+        detail, listing = f'/api/products/id/{self.product.pk}/', '/api/products/'
+        etags = [client.get(detail)['ETag'], client.get(listing)['ETag']]
+        ProductReview.objects.create(product=self.product, user=self.customer, rating=5, title='t', content='c')
+        for path, etag in zip((detail, listing), etags):
+            response = client.get(path, HTTP_IF_NONE_MATCH=etag)
+            self.assertEqual(response.status_code, 200)
+            self.assertNotEqual(response['ETag'], etag)
+
+    def test_embedded_changes_keep_the_bulk_update_token(self):
+        token = Product.objects.get(pk=self.product.pk).updated
+        ProductReview.objects.create(product=self.product, user=self.customer, rating=4, title='t', content='c')
+        self.product.vendor.save()
+        self.assertEqual(Product.objects.get(pk=self.product.pk).updated, token)
+
+        client = APIClient()
+        client.force_authenticate(self.product.vendor.user)
+        response = client.post('/api/products/bulk-update/', {'items': [
+            {'sku': 'SKU-1', 'stock': 9, 'updated': token.isoformat()},
+        ]}, format='json')
+        self.assertEqual(response.data['results'][0]['status'], 'updated')
+
+    def test_cart_etag_is_private(self):
+        client = APIClient()
+        client.force_authenticate(self.customer)
+        # The first request creates the cart; only then is there a version
+        self.assertFalse(client.get('/api/cart/').has_header('ETag'))
+        first = client.get('/api/cart/')
+        self.assertIn('private', first['Cache-Control'])
+        self.assertEqual(client.get('/api/cart/', HTTP_IF_NONE_MATCH=first['ETag']).status_code, 304)
+        CartItem.objects.create(cart=Cart.objects.get(user=self.customer), product=self.product)
+        self.assertEqual(client.get('/api/cart/', HTTP_IF_NONE_MATCH=first['ETag']).status_code, 200)
+
+    def test_gzip_keeps_strong_etags(self):
+        client = APIClient()
+        path = f'/api/products/id/{self.product.pk}/'
+        plain = client.get(path)
+        self.assertFalse(plain.has_header('Content-Encoding'))
+        response = client.get(path, HTTP_ACCEPT_ENCODING='gzip, deflate')
+        self.assertEqual(response['Content-Encoding'], 'gzip')
+        self.assertIn('Accept-Encoding', response['Vary'])
+        self.assertEqual(gzip.decompress(response.content), plain.content)
+        self.assertEqual(response['ETag'], plain['ETag'][:-1] + '-gzip"')
+
+        again = client.get(path, HTTP_ACCEPT_ENCODING='gzip', HTTP_IF_NONE_MATCH=response['ETag'])
+        self.assertEqual(again.status_code, 304)
+        self.assertEqual(again['ETag'], response['ETag'])
+
+    def test_small_and_streaming_responses_are_not_compressed(self):
+        client = APIClient()
+        client.force_authenticate(self.customer)
+        small = client.get('/api/notifications/unread-count/', HTTP_ACCEPT_ENCODING='gzip')
+        self.assertFalse(small.has_header('Content-Encoding'))
+
+        stream = StreamingHttpResponse(iter([b'x' * 500]), content_type='text/event-stream')
+        middleware = compression.CompressionMiddleware(lambda request: stream)
+        response = middleware(RequestFactory().get('/', HTTP_ACCEPT_ENCODING='gzip'))
+        self.assertFalse(response.has_header('Content-Encoding'))
+
+    def test_html_is_not_compressed(self):
+        page = HttpResponse('<input name="csrfmiddlewaretoken" value="x">' * 100, content_type='text/html')
+        middleware = compression.CompressionMiddleware(lambda request: page)
+        response = middleware(RequestFactory().get('/', HTTP_ACCEPT_ENCODING='gzip'))
+        self.assertFalse(response.has_header('Content-Encoding'))
+
+    def test_list_deletions_are_not_hidden_by_last_modified(self):
+        Product.objects.create(
+            name='Mug', slug='mug', description='', sku='SKU-2',
+            price=Decimal('5.00'), vendor=self.product.vendor,
+        )
+        client = APIClient()
+        first = client.get('/api/products/')
+        self.assertFalse(first.has_header('Last-Modified'))
+        Product.objects.filter(sku='SKU-2').delete()
+        for validator in ({'HTTP_IF_NONE_MATCH': first['ETag']}, {'HTTP_IF_MODIFIED_SINCE': http_date(time.time())}):
+            response = client.get('/api/products/', **validator)
+            self.assertEqual(response.status_code, 200)
+            self.assertEqual(response.data['count'], 1)
+
+    def test_choose_encoding(self):
+        self.assertEqual(compression.choose_encoding('gzip;q=0.5, br', ['br', 'gzip']), 'br')
+        self.assertEqual(compression.choose_encoding('br;q=0, *', ['br', 'gzip']), 'gzip')
+        self.assertEqual(compression.choose_encoding('identity', ['br', 'gzip']), None)
+        self.assertEqual(compression.choose_encoding('', ['gzip']), None)
+
+
+class EffectivePriceTests(TestCase):
+    @classmethod
+    def setUpTestData(cls):
+        vendor_user = User.objects.create_user('vendor', 'vendor@example.com', 'pw', is_vendor=True)
+        vendor = Vendor.objects.create(user=vendor_user, business_name='Vendor', approved=True)
+        Product.objects.bulk_create([
+            Product(name='Cheap', slug='cheap', description='', sku='SKU-1', price=Decimal('30.00'), vendor=vendor),
+            Product(name='Discounted', slug='discounted', description='', sku='SKU-2',
+                    price=Decimal('100.00'), discount_price=Decimal('20.00'), vendor=vendor),
+            Product(name='Zero discount', slug='zero', description='', sku='SKU-3',
+                    price=Decimal('40.00'), discount_price=Decimal('0'), vendor=vendor),
+        ])
+
+    def names(self, **params):
+        return [product['name'] for product in APIClient().get('/api/products/', params).data['results']]
+
+    def test_filters_and_ordering_use_what_the_customer_pays(self):
+        self.assertEqual(self.names(ordering='price'), ['Discounted', 'Cheap', 'Zero discount'])
+        self.assertEqual(self.names(ordering='-price'), ['Zero discount', 'Cheap', 'Discounted'])
+        self.assertEqual(self.names(max_price=25), ['Discounted'])
+        self.assertEqual(self.names(min_price=35), ['Zero discount'])
+
+    def test_column_follows_queryset_updates(self):
+        Product.objects.filter(sku='SKU-2').update(discount_price=None)
+        product = Product.objects.get(sku='SKU-2')
+        self.assertEqual(product.current_price, Decimal('100.00'))
+        self.assertEqual(Product.objects.get(sku='SKU-3').current_price, Decimal('40.00'))
+
+    def test_current_price_after_save(self):
+        self.assertEqual(Product(price=Decimal('10.00'), discount_price=Decimal('5.00')).current_price, Decimal('5.00'))
+        admin = User.objects.create_user('admin', 'admin@example.com', 'pw', is_staff=True)
+        product = Product.objects.get(sku='SKU-1')
+        client = APIClient()
+        client.force_authenticate(admin)
+        response = client.patch(f'/api/products/id/{product.pk}/manage/', {'discount_price': '5.00'}, format='json')
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(Decimal(str(response.data['current_price'])), Decimal('5.00'))
+
+    def test_payment_amount_uses_stored_prices(self):
+        discounted = Product.objects.get(sku='SKU-2')
+        items = [
+            {'product': discounted.pk, 'quantity': 2, 'product_details': {'current_price': '0.01'}},
+            {'product_details': {'id': Product.objects.get(sku='SKU-1').pk, 'price': '0.01'}},
+        ]
+        self.assertEqual(payment_views.calculate_order_amount(items), 2 * 2000 + 3000)
+        with self.assertRaises(ValueError):
+            payment_views.calculate_order_amount([{'product': 0, 'quantity': 1}])
+        with self.assertRaises(ValueError):
+            payment_views.calculate_order_amount([{'current_price': '10.00'}])
+
+
+class ThrottlingTests(SimpleTestCase):
+    def request(self, remote_addr='10.0.0.1', forwarded=None):
+        extra = {'REMOTE_ADDR': remote_addr}
+        if forwarded:
+            extra['HTTP_X_FORWARDED_FOR'] = forwarded
+        return RequestFactory().post('/', **extra)
+
+    def test_bucket_allows_a_burst_then_refills(self):
+        store = throttling.LocalMemoryBucketStore()
+        capacity, refill_rate = throttling.parse_rate('3/min')
+        self.assertEqual((capacity, refill_rate), (3, 3 / 60))
+        with mock.patch('time.monotonic', return_value=1000.0):
+            self.assertEqual([store.consume('k', capacity, refill_rate)[0] for _ in range(4)],
+                             [True, True, True, False])
+            self.assertAlmostEqual(store.consume('k', capacity, refill_rate)[1], 20.0)
+        with mock.patch('time.monotonic', return_value=1020.0):
+            self.assertTrue(store.consume('k', capacity, refill_rate)[0])
+            self.assertFalse(store.consume('k', capacity, refill_rate)[0])
+
+    def test_forwarded_for_is_ignored_without_trusted_proxies(self):
+        request = self.request(forwarded='1.2.3.4')
+        with override_settings(REST_FRAMEWORK={**settings.REST_FRAMEWORK, 'NUM_PROXIES': None}):
+            self.assertEqual(throttling.get_client_ip(request), '10.0.0.1')
+        # One proxy: the address it appended, not what the client sent before it
+        request = self.request(forwarded='1.2.3.4, 5.6.7.8')
+        with override_settings(REST_FRAMEWORK={**settings.REST_FRAMEWORK, 'NUM_PROXIES': 1}):
+            self.assertEqual(throttling.get_client_ip(request), '5.6.7.8')
+
+    @override_settings(SHOP_THROTTLE={'RATES': {'login': '2/min'}})
+    def test_spoofed_forwarded_for_shares_the_bucket(self):
+        throttle = throttling.LoginIPThrottle()
+        with mock.patch.object(throttling, '_store', throttling.LocalMemoryBucketStore()):
+            allowed = [throttle.allow_request(self.request(forwarded=f'1.1.1.{i}'), None) for i in range(3)]
+        self.assertEqual(allowed, [True, True, False])
+
+    def test_eviction_keeps_draining_buckets(self):
+        store = throttling.LocalMemoryBucketStore()
+        store.max_buckets = 4
+        slow, fast = throttling.parse_rate('1/hour'), throttling.parse_rate('10/s')
+        with mock.patch('time.monotonic', return_value=0.0):
+            store.consume('slow', *slow)
+            for i in range(3):
+                store.consume(f'fast{i}', *fast)
+        with mock.patch('time.monotonic', return_value=60.0):
+            store.consume('new', *fast)
+            # The fast buckets were full again and went; the slow one is still empty
+            self.assertEqual(set(store._buckets), {'slow', 'new'})
+            self.assertFalse(store.consume('slow', *slow)[0])
+
+        for i in range(10):
+            with mock.patch('time.monotonic', return_value=100.0 + i):
+                store.consume(f'busy{i}', *slow)
+        self.assertLessEqual(len(store._buckets), store.max_buckets)
+
+    @override_settings(SHOP_THROTTLE={'RATES': {'login_account': '5/min'}})
+    def test_account_key_ignores_non_object_bodies(self):
+        throttle = throttling.LoginAccountThrottle()
+        self.assertIsNone(throttle.get_bucket_key(mock.Mock(data=['a', 'b']), None))
+        self.assertEqual(throttle.get_bucket_key(mock.Mock(data={'email': ' A@x.com '}), None), 'a@x.com')
+
+
+class NotificationStreamTests(TestCase):
+    @classmethod
+    def setUpTestData(cls):
+        cls.customer = User.objects.create_user('customer', 'customer@example.com', 'pw', is_customer=True)
+
+    def tearDown(self):
+        cache.delete(REVOKED_KEY.format(self.customer.pk))
+
+    async def test_missing_and_bad_tokens_are_unauthorized(self):
+        response = await AsyncClient().get('/api/notifications/stream/')
+        self.assertEqual(response.status_code, 401)
+        response = await AsyncClient().get('/api/notifications/stream/', {'token': 'not-a-token'})
+        self.assertEqual(response.status_code, 401)
+        response = await AsyncClient().get('/api/notifications/stream/', headers={'Authorization': 'Bearer x.y.z'})
+        self.assertEqual(response.status_code, 401)
+
+    async def test_revoked_token_is_unauthorized(self):
+        token = AccessToken.for_user(self.customer)
+        token['iat'] -= 10
+        await sync_to_async(revoke_user_tokens)(self.customer.pk)
+        response = await AsyncClient().get('/api/notifications/stream/', {'token': str(token)})
+        self.assertEqual(response.status_code, 401)
+
+    async def test_valid_token_streams_the_unread_count(self):
+        token = AccessToken.for_user(self.customer)
+        response = await AsyncClient().get('/api/notifications/stream/', {'token': str(token)})
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(response['Content-Type'], 'text/event-stream')
+        stream = aiter(response.streaming_content)
+        try:
+            self.assertIn(b'event: count', await anext(stream))
+        finally:
+            await stream.aclose()
+
+
+class ProductImportTests(TestCase):
+    @classmethod
+    def setUpTestData(cls):
+        cls.admin = User.objects.create_user('admin', 'admin@example.com', 'pw', is_staff=True)
+        cls.customer = User.objects.create_user('customer', 'customer@example.com', 'pw', is_customer=True)
+        cls.vendor_user = User.objects.create_user('vendor', 'vendor@example.com', 'pw', is_vendor=True)
+        cls.vendor = Vendor.objects.create(user=cls.vendor_user, business_name='Vendor', approved=True)
+        other = User.objects.create_user('other', 'other@example.com', 'pw', is_vendor=True)
+        cls.other_vendor = Vendor.objects.create(user=other, business_name='Other', approved=True)
+        Category.objects.create(name='Category', slug='category')
+
+    def upload(self, user, rows, **data):
+        client = APIClient()
+        client.force_authenticate(user)
+        body = '\n'.join(json.dumps(row) for row in rows).encode()
+        response = client.post('/api/products/import/', {
+            'file': SimpleUploadedFile('products.jsonl', body), **data,
+        }, format='multipart')
+        if response.status_code != 200:
+            return response, None
+        return response, [json.loads(line) for line in b''.join(response.streaming_content).splitlines()]
+
+    def row(self, sku, **fields):
+        return {'name': sku, 'slug': sku.lower(), 'price': '10.00', 'category': 'category', 'sku': sku, **fields}
+
+    def test_vendor_imports_into_own_store(self):
+        response, events = self.upload(self.vendor_user, [
+            self.row('A'), self.row('B', vendor=self.other_vendor.pk),
+        ])
+        self.assertEqual(events[-1], {'event': 'done', 'dry_run': False, 'processed': 2, 'created': 2, 'failed': 0})
+        self.assertEqual(set(Product.objects.values_list('vendor_id', flat=True)), {self.vendor.pk})
+
+    def test_duplicates_and_invalid_rows_are_reported_per_row(self):
+        response, events = self.upload(self.admin, [
+            self.row('A'),
+            self.row('A', slug='other'),
+            self.row('C', slug='a'),
+            self.row('D', price='-1'),
+            self.row('E', category='missing'),
+        ], vendor=str(self.vendor.pk))
+        errors = {error['row']: error['errors'] for error in events[0]['errors']}
+        self.assertEqual(set(errors), {2, 3, 4, 5})
+        self.assertIn('sku', errors[2])
+        self.assertIn('slug', errors[3])
+        self.assertIn('price', errors[4])
+        self.assertIn('category', errors[5])
+        self.assertEqual(list(Product.objects.values_list('sku', flat=True)), ['A'])
+
+    def test_bad_requests(self):
+        response, _ = self.upload(self.admin, [self.row('A')], vendor='abc')
+        self.assertEqual(response.status_code, 400)
+        response, _ = self.upload(self.customer, [self.row('A')])
+        self.assertEqual(response.status_code, 403)
+        self.assertFalse(Product.objects.exists())
+
+
+class RetentionTests(TestCase):
+    @classmethod
+    def setUpTestData(cls):
+        cls.customer = User.objects.create_user('customer', 'customer@example.com', 'pw', is_customer=True)
+        cls.other = User.objects.create_user('other', 'other@example.com', 'pw', is_customer=True)
+
+    def notify(self, user, days_ago, is_read, notification_type='order'):
+        notification = notifications.notify(user, 'Title', 'Message', notification_type)
+        Notification.objects.filter(pk=notification.pk).update(
+            is_read=is_read, created_at=timezone.now() - timedelta(days=days_ago))
+        return notification
+
+    def test_summarizes_and_archives_expired_read_notifications(self):
+        old = [self.notify(self.customer, days, True) for days in (40, 45, 50)]
+        kept = [self.notify(self.customer, 40, False), self.notify(self.customer, 5, True)]
+
+        totals = retention.compact_notifications(days=30, mode='archive')
+        self.assertEqual(totals, {'removed': 3, 'archived': 3, 'summaries': 1})
+        summary = Notification.objects.get(collapsed_count__gt=0)
+        self.assertEqual((summary.recipient_id, summary.notification_type, summary.collapsed_count),
+                         (self.customer.pk, 'order', 3))
+        self.assertTrue(summary.is_read)
+        # Sits where the newest notification it replaces was
+        self.assertEqual(summary.created_at, NotificationArchive.objects.order_by('-created_at')[0].created_at)
+        self.assertEqual(sorted(NotificationArchive.objects.values_list('original_id', flat=True)),
+                         sorted(n.pk for n in old))
+        self.assertEqual(set(Notification.objects.filter(collapsed_count=0).values_list('pk', flat=True)),
+                         {n.pk for n in kept})
+
+        # A later run folds into the existing summary and never compacts summaries themselves
+        self.notify(self.customer, 60, True)
+        totals = retention.compact_notifications(days=30, mode='delete')
+        self.assertEqual(totals, {'removed': 1, 'archived': 0, 'summaries': 0})
+        self.assertEqual(Notification.objects.get(collapsed_count__gt=0).collapsed_count, 4)
+        self.assertEqual(NotificationArchive.objects.count(), 3)
+
+    def test_summary_timestamps_without_returned_ids(self):
+        self.notify(self.customer, 40, True)
+        self.notify(self.other, 50, True)
+        expected = dict(Notification.objects.values_list('recipient_id', 'created_at'))
+        # Like MySQL: bulk_create leaves the new summaries without primary keys
+        with mock.patch.object(type(connection.features), 'can_return_rows_from_bulk_insert', False):
+            retention.compact_notifications(days=30, mode='delete')
+        self.assertEqual(
+            dict(Notification.objects.filter(collapsed_count__gt=0).values_list('recipient_id', 'created_at')),
+            expected,
+        )
+
+    def test_notifications_behind_the_read_watermark_count_as_read(self):
+        behind = self.notify(self.customer, 40, False)
+        unread_elsewhere = self.notify(self.other, 40, False)
+        notifications.mark_all_read(self.customer.pk)
+
+        totals = retention.compact_notifications(days=30, summarize=False)
+        self.assertEqual(totals['removed'], 1)
+        self.assertFalse(Notification.objects.filter(pk=behind.pk).exists())
+        self.assertTrue(Notification.objects.filter(pk=unread_elsewhere.pk).exists())
+        self.assertFalse(Notification.objects.filter(collapsed_count__gt=0).exists())
+
+
+class AsyncViewTests(TestCase):
+    @classmethod
+    def setUpTestData(cls):
+        vendor_user = User.objects.create_user('vendor', 'vendor@example.com', 'pw', is_vendor=True)
+        vendor = Vendor.objects.create(user=vendor_user, business_name='Vendor', approved=True)
+        cls.product = Product.objects.create(
+            name='Kettle', slug='kettle', description='', sku='SKU-1',
+            price=Decimal('20.00'), discount_price=Decimal('15.00'), vendor=vendor,
+        )
+        SystemSettings.objects.update_or_create(pk=1, defaults={'ai_api_key': 'key', 'stripe_secret_key': 'sk'})
+
+    def post(self, body):
+        return AsyncRequestFactory().post('/', json.dumps(body), content_type='application/json')
+
+    async def test_generate_seo_keywords(self):
+        completion = mock.Mock(choices=[mock.Mock(message=mock.Mock(content=' A fine kettle. '))])
+        client = mock.Mock()
+        client.chat.completions.create = mock.AsyncMock(return_value=completion)
+        with mock.patch.object(async_views, '_get_client', return_value=client):
+            response = await async_views.generate_seo_keywords(self.post({'product_name': 'Kettle'}))
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(json.loads(response.content), {'seo_description': 'A fine kettle.'})
+
+        await SystemSettings.objects.filter(pk=1).aupdate(ai_api_key='')
+        response = await async_views.generate_seo_keywords(self.post({'product_name': 'Kettle'}))
+        self.assertEqual(response.status_code, 500)
+
+    async def test_create_payment_intent_prices_from_the_database(self):
+        intent = mock.AsyncMock(return_value={'client_secret': 'secret'})
+        with mock.patch('stripe.PaymentIntent.create_async', intent):
+            response = await async_views.create_payment_intent(self.post({'items': [
+                {'product': self.product.pk, 'quantity': 2, 'product_details': {'current_price': '0.01'}},
+            ]}))
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(json.loads(response.content), {'clientSecret': 'secret', 'calculatedAmount': 3000})
+        self.assertEqual(intent.call_args.kwargs['api_key'], 'sk')
+
+        with mock.patch('stripe.PaymentIntent.create_async', intent):
+            response = await async_views.create_payment_intent(self.post({'items': [{'product': 0}]}))
+        self.assertEqual(response.status_code, 403)
+
+    def test_routes_follow_async_views_setting(self):
+        from . import urls
+        try:
+            with override_settings(ASYNC_VIEWS=True):
+                importlib.reload(urls)
+                self.assertIs(urls.create_payment_intent, async_views.create_payment_intent)
+                self.assertIs(urls.generate_seo_keywords, async_views.generate_seo_keywords)
+        finally:
+            importlib.reload(urls)
+            clear_url_caches()
+        self.assertIs(urls.create_payment_intent, payment_views.create_payment_intent)
+
+    @override_settings(
+        SHOP_NPLUSONE={'ENABLED': True}, SHOP_PERFORMANCE={'ENABLED': True, 'SERVER_TIMING': True},
+        DATABASE_REPLICAS=[],
+    )
+    async def test_project_middleware_runs_natively_async(self):
+        async def view(request):
+            return HttpResponse('{}', content_type='application/json')
+
+        request = AsyncRequestFactory().get('/api/products/')
+        request.user = AnonymousUser()
+        for path in settings.MIDDLEWARE:
+            if not path.startswith(('shop.', 'ecom.')):
+                continue
+            middleware = import_string(path)(view)
+            self.assertTrue(iscoroutinefunction(middleware), path)
+            response = await middleware(request)
+            self.assertEqual(response.status_code, 200, path)
+
+        response = await AsyncClient().get('/api/products/')
+        self.assertEqual(response.status_code, 200)
+        self.assertTrue(response.has_header('X-Request-ID'))
+        self.assertIn('db;dur=', response['Server-Timing'])
+
+
+class FanOutTests(TestCase):
+    @classmethod
+    def setUpTestData(cls):
+        cls.admin = User.objects.create_user('admin', 'admin@example.com', 'pw', is_staff=True)
+        cls.customers = [
+            User.objects.create_user(f'customer{i}', f'c{i}@example.com', 'pw', is_customer=True) for i in range(3)
+        ]
+        notifications.notify(cls.customers[0], 'Earlier', 'Message')
+
+    def broadcast(self, audience='customers', title='Sale', **kwargs):
+        return fanout.fan_out(
+            fanout.resolve_recipients(audience, **kwargs), title, 'Everything must go', chunk_size=2,
+            broadcast_key=fanout.broadcast_key(audience, title, 'Everything must go'),
+        )
+
+    def test_rerunning_a_broadcast_skips_earlier_recipients(self):
+        self.assertEqual(self.broadcast(), {'recipients': 3, 'created': 3, 'skipped': 0})
+        self.assertEqual(self.broadcast(), {'recipients': 3, 'created': 0, 'skipped': 3})
+        # A different announcement goes out again
+        self.assertEqual(self.broadcast(title='New sale')['created'], 3)
+        # Counters include the notifications written in bulk
+        self.assertEqual(notifications.unread_count(self.customers[0].pk), 3)
+        self.assertEqual(notifications.unread_count(self.customers[1].pk), 2)
+
+    def test_product_broadcasts_dedupe_on_the_product(self):
+        vendor_user = User.objects.create_user('vendor', 'vendor@example.com', 'pw', is_vendor=True)
+        vendor = Vendor.objects.create(user=vendor_user, business_name='Vendor')
+        product = Product.objects.create(name='Kettle', slug='kettle', description='', sku='SKU-1',
+                                         price=Decimal('20.00'), vendor=vendor)
+        order = Order.objects.create(user=self.customers[1], order_number='ORD-1', payment_method='card')
+        OrderItem.objects.create(order=order, product=product, price=Decimal('20.00'))
+        related = fanout.related_object_for('product_buyers', product.pk)
+        for created in (1, 0):
+            totals = fanout.fan_out(fanout.resolve_recipients('product_buyers', product_id=product.pk),
+                                    'Recall', 'Please return it', related_object=related)
+            self.assertEqual(totals['created'], created)
+
+    def test_background_job_reports_progress(self):
+        client = APIClient()
+        client.force_authenticate(self.admin)
+        inline = mock.Mock(submit=lambda fn, *args: fn(*args))
+        with mock.patch.object(fanout, '_executor', inline), \
+                mock.patch.object(fanout.connection, 'close'), \
+                self.captureOnCommitCallbacks(execute=True):
+            response = client.post('/api/admin/notifications/broadcast/', {
+                'audience': 'users', 'user_ids': [self.customers[2].pk], 'title': 'Hi', 'message': 'Hello',
+            }, format='json')
+        self.assertEqual(response.status_code, 202)
+        job = client.get(f"/api/admin/notifications/broadcast/{response.data['id']}/").data
+        self.assertEqual((job['status'], job['created']), ('done', 1))
+        self.assertEqual(client.get('/api/admin/notifications/broadcast/missing/').status_code, 404)
+
+
+class ClaimsAuthenticationTests(TestCase):
+    @classmethod
+    def setUpTestData(cls):
+        cls.user = User.objects.create_user('vendor', 'vendor@example.com', 'pw', is_vendor=True)
+
+    def setUp(self):
+        user_cache.clear()
+        self.addCleanup(cache.delete, REVOKED_KEY.format(self.user.pk))
+
+    def token(self, iat_offset=-10):
+        token = CustomTokenObtainPairSerializer.get_token(self.user).access_token
+        # Issued before any revocation made during the test
+        token['iat'] += iat_offset
+        return str(token)
+
+    def authenticate(self, token, method='get'):
+        request = getattr(RequestFactory(), method)('/', HTTP_AUTHORIZATION=f'Bearer {token}')
+        return ClaimsJWTAuthentication().authenticate(Request(request))
+
+    def test_safe_requests_use_claims_without_a_query(self):
+        token = self.token()
+        with self.assertNumQueries(0):
+            user, _ = self.authenticate(token)
+            self.assertIsInstance(user, ClaimsUser)
+            self.assertEqual((user.id, user.username, user.is_vendor, user.is_staff), (self.user.pk, 'vendor', True, False))
+        # Attributes the token doesn't carry load the model once
+        with self.assertNumQueries(1):
+            self.assertEqual(user.email, 'vendor@example.com')
+            self.assertEqual(user.phone, self.user.phone)
+        # Writes always get a fresh model instance
+        user, _ = self.authenticate(token, method='post')
+        self.assertIsInstance(user, User)
+
+    def test_password_and_access_changes_revoke_tokens(self):
+        changes = [
+            lambda user: user.set_password('other'),
+            lambda user: setattr(user, 'is_active', False),
+            lambda user: setattr(user, 'is_staff', True),
+        ]
+        for change in changes:
+            token = self.token()
+            user = User.objects.get(pk=self.user.pk)
+            change(user)
+            user.save()
+            with self.assertRaises(AuthenticationFailed):
+                self.authenticate(token)
+            User.objects.filter(pk=self.user.pk).update(is_active=True, is_staff=False)
+            cache.delete(REVOKED_KEY.format(self.user.pk))
+
+    def test_username_change_keeps_the_session(self):
+        token = self.token()
+        user = User.objects.get(pk=self.user.pk)
+        user.username = 'renamed'
+        user.save()
+        self.assertEqual(self.authenticate(token)[0].pk, self.user.pk)
+
+    def test_login_bookkeeping_skips_the_claims_query(self):
+        user = User.objects.get(pk=self.user.pk)
+        user.last_login = timezone.now()
+        with self.assertNumQueries(1):
+            user.save(update_fields=['last_login'])
+
+
+class TokenBlacklistTests(TestCase):
+    @classmethod
+    def setUpTestData(cls):
+        cls.user = User.objects.create_user('buyer', 'buyer@example.com', 'pw', is_customer=True)
+
+    def setUp(self):
+        token_blacklist.blacklist.reset()
+        self.addCleanup(token_blacklist.blacklist.reset)
+        self.client = APIClient()
+
+    def refresh(self, token):
+        return self.client.post('/api/token/refresh/', {'refresh': str(token)}, format='json')
+
+    def test_rotation_revokes_the_old_token(self):
+        token = RefreshToken.for_user(self.user)
+        response = self.refresh(token)
+        self.assertEqual(response.status_code, 200)
+        self.assertNotEqual(response.data['refresh'], str(token))
+        self.assertTrue(RevokedRefreshToken.objects.filter(jti=token['jti'], user_id=self.user.pk).exists())
+        # The rotated-in token works once
+        self.assertEqual(self.refresh(response.data['refresh']).status_code, 200)
+
+    def test_replayed_token_is_rejected(self):
+        token = RefreshToken.for_user(self.user)
+        self.assertEqual(self.refresh(token).status_code, 200)
+        self.assertEqual(self.refresh(token).status_code, 401)
+        # Another worker whose filter hasn't synced yet hits the unique jti instead
+        with mock.patch.object(token_blacklist.blacklist, 'is_revoked', return_value=False):
+            self.assertEqual(self.refresh(token).status_code, 401)
+        self.assertEqual(RevokedRefreshToken.objects.count(), 1)
+
+    def test_unrevoked_lookup_skips_the_query(self):
+        token_blacklist.blacklist.is_revoked('warm-up')
+        with self.assertNumQueries(0):
+            self.assertFalse(token_blacklist.blacklist.is_revoked('never-issued'))
+
+    def test_logout_blacklists_the_token(self):
+        token = RefreshToken.for_user(self.user)
+        for _ in range(2):
+            response = self.client.post('/api/token/blacklist/', {'refresh': str(token)}, format='json')
+            self.assertEqual(response.status_code, 200)
+        self.assertEqual(self.refresh(token).status_code, 401)
+
+    def test_purge_command_deletes_expired_rows(self):
+        expired, live = RefreshToken.for_user(self.user), RefreshToken.for_user(self.user)
+        token_blacklist.blacklist.revoke(expired)
+        token_blacklist.blacklist.revoke(live)
+        RevokedRefreshToken.objects.filter(jti=expired['jti']).update(expires_at=timezone.now() - timedelta(seconds=1))
+
+        out = StringIO()
+        call_command('purge_token_blacklist', stdout=out)
+        self.assertIn('Purged 1 expired blacklist entries', out.getvalue())
+        self.assertEqual(list(RevokedRefreshToken.objects.values_list('jti', flat=True)), [live['jti']])
+        # The rebuilt filter still knows about the live row
+        self.assertTrue(token_blacklist.blacklist.is_revoked(live['jti']))
+
+
+class FastJSONTests(SimpleTestCase):
+    def assertRendersLikeDRF(self, data):
+        self.assertEqual(FastJSONRenderer().render(data), JSONRenderer().render(data))
+
+    def test_matches_the_stock_renderer(self):
+        moment = timezone.now().replace(microsecond=123456)
+        self.assertRendersLikeDRF({
+            'price': Decimal('19.99'),
+            'total': Decimal('1E+3'),
+            'created': moment,
+            'date': moment.date(),
+            'time': moment.time(),
+            'naive': moment.replace(tzinfo=None),
+            'delay': timedelta(seconds=90),
+            'text': 'line\u2028separator\u2029paragraph',
+            'unicode': 'caf\u00e9 \u2603',
+            'nested': [{'a': None, 'b': [1, 2.5, True]}],
+            'int64': [2 ** 63 - 1, -(2 ** 63)],
+            1: 'non-string key',
+        })
+        # Beyond 64 bits orjson gives up and json.dumps renders the lot
+        self.assertRendersLikeDRF({'big': 2 ** 64 + 1, 'bigs': [10 ** 30, -(2 ** 63) - 1], 'price': Decimal('1.10')})
+
+    def test_exponent_floats_parse_to_the_same_value(self):
+        data = {'small': 1e-07, 'large': 1e+16}
+        self.assertEqual(json.loads(FastJSONRenderer().render(data)), json.loads(JSONRenderer().render(data)))
+
+    def test_non_finite_floats_use_the_stock_renderer(self):
+        for value in (float('nan'), float('inf'), float('-inf')):
+            with self.assertRaises(ValueError):
+                FastJSONRenderer().render({'items': [{'score': value, 'note': None}]})
+
+    def parse(self, body, parser):
+        return parser.parse(io.BytesIO(body), 'application/json', {})
+
+    def test_parser_keeps_large_numbers_exact(self):
+        body = b'{"id": 123456789012345678901234567890, "price": 1.5}'
+        data = self.parse(body, FastJSONParser())
+        self.assertEqual(data, {'id': 123456789012345678901234567890, 'price': 1.5})
+        self.assertEqual(data, self.parse(body, JSONParser()))
+
+    def test_parser_errors_match_the_stock_parser(self):
+        for body in (b'{"a": ', b'{"a": NaN}', b''):
+            with self.assertRaises(ParseError) as fast:
+                self.parse(body, FastJSONParser())
+            with self.assertRaises(ParseError) as stock:
+                self.parse(body, JSONParser())
+            self.assertEqual(str(fast.exception.detail), str(stock.exception.detail))
+
+
+class PerformanceTests(TestCase):
+    @classmethod
+    def setUpTestData(cls):
+        cls.staff = User.objects.create_user('staff', 'staff@example.com', 'pw', is_staff=True)
+        cls.customer = User.objects.create_user('buyer', 'buyer@example.com', 'pw', is_customer=True)
+        vendor_user = User.objects.create_user('vendor', 'vendor@example.com', 'pw', is_vendor=True)
+        vendor = Vendor.objects.create(user=vendor_user, business_name='Vendor', approved=True)
+        cls.product = Product.objects.create(
+            name='Lamp', slug='lamp', description='', sku='SKU-1', price=Decimal('30.00'), vendor=vendor,
+        )
+
+    def metrics(self, user=None, **headers):
+        if user is not None:
+            headers['HTTP_AUTHORIZATION'] = f'Bearer {AccessToken.for_user(user)}'
+        return self.client.get('/api/metrics/', **headers)
+
+    def collect(self):
+        metrics = performance.RequestMetrics()
+        token = performance._current.set(metrics)
+        self.addCleanup(performance._current.reset, token)
+        return metrics
+
+    def test_metrics_endpoint_is_staff_only(self):
+        self.client.get(f'/api/products/id/{self.product.pk}/')
+        self.assertEqual(self.metrics().status_code, 403)
+        self.assertEqual(self.metrics(self.customer).status_code, 403)
+        response = self.metrics(self.staff)
+        self.assertEqual(response.status_code, 200)
+        self.assertTrue(response['Content-Type'].startswith('text/plain; version=0.0.4'))
+        body = response.content.decode()
+        self.assertIn('shop_http_requests_total{route="api/products/id/<int:pk>/",method="GET",status="200"}', body)
+        self.assertIn('shop_http_request_serializer_seconds_count{route="api/products/id/<int:pk>/"}', body)
+
+    @override_settings(SHOP_PERFORMANCE={'METRICS_TOKEN': 'scrape-secret'})
+    def test_metrics_token(self):
+        self.assertEqual(self.metrics(HTTP_AUTHORIZATION='Bearer scrape-secret').status_code, 200)
+        self.assertEqual(self.metrics(HTTP_AUTHORIZATION='Bearer wrong').status_code, 403)
+        # With a token configured, staff JWTs don't get in
+        self.assertEqual(self.metrics(self.staff).status_code, 403)
+
+    @override_settings(SHOP_PERFORMANCE={'SERVER_TIMING': True})
+    def test_server_timing_header(self):
+        response = self.client.get(f'/api/products/id/{self.product.pk}/')
+        self.assertRegex(response['Server-Timing'], r'^total;dur=[\d.]+, db;dur=[\d.]+;desc="\d+ queries", serializer;dur=')
+
+    def test_serializer_mixin_times_the_outermost_serializer(self):
+        metrics = self.collect()
+        ProductSerializer(self.product).data
+        self.assertGreater(metrics.serializer_time, 0)
+        self.assertFalse(metrics.in_serializer)
+        metrics.serializer_time = 0
+        ProductSerializer([self.product, self.product], many=True).data
+        self.assertGreater(metrics.serializer_time, 0)
+        # Nothing is patched onto DRF itself
+        self.assertIsNone(getattr(Serializer.data.fget, '__wrapped__', None))
+
+    def test_cache_backend_counts_hits_and_misses(self):
+        self.assertIsInstance(caches['default'], performance.CountedCacheMixin)
+        cache.set('perf-hit', None)
+        self.addCleanup(cache.delete, 'perf-hit')
+        metrics = self.collect()
+        self.assertIsNone(cache.get('perf-hit', 'default'))
+        self.assertEqual(cache.get('perf-miss', 'default'), 'default')
+        self.assertEqual(cache.get_many(['perf-hit', 'perf-miss']), {'perf-hit': None})
+        self.assertEqual((metrics.cache_hits, metrics.cache_misses), (2, 2))
+
+
+class SalesReportTests(TestCase):
+    @classmethod
+    def setUpTestData(cls):
+        cls.staff = User.objects.create_user('staff', 'staff@example.com', 'pw', is_staff=True)
+        cls.buyer = User.objects.create_user('buyer', 'buyer@example.com', 'pw', is_customer=True)
+        User.objects.create_user('browser', 'browser@example.com', 'pw', is_customer=True)
+        User.objects.create_user('gone', 'gone@example.com', 'pw', is_customer=True, is_active=False)
+        vendor_user = User.objects.create_user('vendor', 'vendor@example.com', 'pw', is_vendor=True)
+        cls.vendor = Vendor.objects.create(user=vendor_user, business_name='Vendor', approved=True)
+        cls.category = Category.objects.create(name='Lighting', slug='lighting')
+        cls.lamp, cls.bulb = Product.objects.bulk_create([
+            Product(name='Lamp', slug='lamp', description='', sku='SKU-1', price=Decimal('30.00'),
+                    vendor=cls.vendor, category=cls.category),
+            Product(name='Bulb', slug='bulb', description='', sku='SKU-2', price=Decimal('2.50'),
+                    vendor=cls.vendor, category=cls.category),
+        ])
+        for number, order_status, shipping, tax, lines in (
+            ('ORD-1', 'C', Decimal('5.00'), Decimal('1.40'),
+             [(cls.lamp, Decimal('30.00'), 2), (cls.bulb, Decimal('2.50'), 4)]),
+            ('ORD-2', 'P', Decimal('0'), Decimal('0'), [(cls.lamp, Decimal('30.00'), 1)]),
+        ):
+            order = Order.objects.create(
+                user=cls.buyer, order_number=number, status=order_status, payment_method='card',
+                shipping_cost=shipping, tax=tax,
+                total=sum(price * quantity for _, price, quantity in lines) + shipping + tax,
+            )
+            OrderItem.objects.bulk_create(
+                OrderItem(order=order, product=product, price=price, quantity=quantity)
+                for product, price, quantity in lines
+            )
+
+    def setUp(self):
+        root = tempfile.TemporaryDirectory()
+        self.addCleanup(root.cleanup)
+        self.root = root.name
+        self.enterContext(override_settings(ANALYTICS_SNAPSHOT_DIR=self.root))
+        self.client = APIClient()
+        self.client.force_authenticate(self.staff)
+
+    def export(self):
+        out = StringIO()
+        call_command('export_sales_snapshot', stdout=out)
+        return out.getvalue()
+
+    def test_report_needs_a_snapshot(self):
+        response = self.client.get('/api/admin/reports/sales/')
+        self.assertEqual(response.status_code, 503)
+        # Snapshots exported before a column was added need a new export
+        self.export()
+        snapshot = analytics.load_latest_snapshot()
+        os.remove(os.path.join(snapshot.path, 'orders.shipping_cents.npy'))
+        analytics._snapshot_cache.clear()
+        self.assertEqual(self.client.get('/api/admin/reports/sales/').status_code, 503)
+
+    def test_export_command_writes_a_snapshot(self):
+        self.assertIn('Exported 2 orders / 3 items', self.export())
+        snapshot = analytics.load_latest_snapshot()
+        self.assertEqual(snapshot.manifest['customer_count'], 2)
+        self.assertEqual(sorted(snapshot.items['amount_cents'].tolist()), [1000, 3000, 6000])
+        # Older snapshots are pruned down to ANALYTICS_SNAPSHOT_KEEP
+        for _ in range(2):
+            self.export()
+        self.assertEqual(len([entry for entry in os.listdir(self.root) if entry.startswith('snapshot-')]), 2)
+
+    def test_report(self):
+        self.export()
+        response = self.client.get('/api/admin/reports/sales/')
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(response.data['summary'], {
+            'revenue': 70.0,
+            'shipping': 5.0,
+            'tax': 1.4,
+            'billed': 76.4,
+            'orders': 1,
+            'average_order_value': 70.0,
+            'buyers': 1,
+            # Only active customer accounts; staff, vendors and deactivated users aren't prospects
+            'customers': 2,
+            'conversion_rate': 0.5,
+        })
+        self.assertEqual(response.data['top_products'], [
+            {'product_id': self.lamp.pk, 'units': 2, 'revenue': 60.0, 'name': 'Lamp'},
+            {'product_id': self.bulb.pk, 'units': 4, 'revenue': 10.0, 'name': 'Bulb'},
+        ])
+        self.assertEqual(response.data['revenue_by_vendor'],
+                         [{'vendor_id': self.vendor.pk, 'revenue': 70.0, 'vendor': 'Vendor'}])
+
+        # Every breakdown adds up to the headline revenue
+        for section in ('revenue_by_day', 'revenue_by_vendor', 'revenue_by_category', 'top_products'):
+            self.assertEqual(sum(row['revenue'] for row in response.data[section]), 70.0)
+
+        pending = self.client.get('/api/admin/reports/sales/', {'status': 'C,P'}).data['summary']
+        self.assertEqual((pending['orders'], pending['revenue']), (2, 100.0))
+        self.assertEqual(self.client.get('/api/admin/reports/sales/', {'start': 'soon'}).status_code, 400)
+
+
+class ProductBulkUpdateTests(TestCase):
+    @classmethod
+    def setUpTestData(cls):
+        cls.staff = User.objects.create_user('staff', 'staff@example.com', 'pw', is_staff=True)
+        vendors = []
+        for name in ('alpha', 'beta'):
+            user = User.objects.create_user(name, f'{name}@example.com', 'pw', is_vendor=True)
+            vendors.append(Vendor.objects.create(user=user, business_name=name, approved=True))
+        cls.vendor, cls.other_vendor = vendors
+        Product.objects.bulk_create(
+            Product(name=f'Product {i}', slug=f'product-{i}', description='', sku=f'SKU-{i}',
+                    price=Decimal('10.00'), stock=1, vendor=vendors[i % 2])
+            for i in range(5)
+        )
+
+    def post(self, user, items):
+        client = APIClient()
+        client.force_authenticate(user)
+        return client.post('/api/products/bulk-update/', {'items': items}, format='json')
+
+    def statuses(self, response):
+        return [result['status'] for result in response.data['results']]
+
+    def test_updates_and_returns_the_new_token(self):
+        response = self.post(self.staff, [{'sku': 'SKU-0', 'price': '12.50', 'stock': 4}])
+        self.assertEqual(response.data['summary'], {'updated': 1})
+        product = Product.objects.get(sku='SKU-0')
+        self.assertEqual((product.price, product.stock), (Decimal('12.50'), 4))
+        self.assertEqual(response.data['results'][0]['updated'], product.updated)
+
+    def test_stale_token_conflicts(self):
+        current = Product.objects.get(sku='SKU-0').updated
+        response = self.post(self.staff, [{'sku': 'SKU-0', 'stock': 7, 'updated': (current - timedelta(seconds=1)).isoformat()}])
+        self.assertEqual(response.data['results'][0], {'sku': 'SKU-0', 'status': 'conflict', 'current_updated': current})
+        self.assertEqual(Product.objects.get(sku='SKU-0').stock, 1)
+
+    def test_vendors_only_update_their_own_products(self):
+        # SKU-0 belongs to alpha, SKU-1 to beta
+        response = self.post(self.vendor.user, [{'sku': 'SKU-0', 'stock': 5}, {'sku': 'SKU-1', 'stock': 5}])
+        self.assertEqual(self.statuses(response), ['updated', 'forbidden'])
+        self.assertEqual(Product.objects.get(sku='SKU-1').stock, 1)
+
+    def test_invalid_entries_do_not_block_the_rest(self):
+        response = self.post(self.staff, [
+            {'sku': 'SKU-0', 'stock': 2},
+            {'sku': 'SKU-0', 'stock': 3},
+            {'sku': 'NOPE', 'stock': 3},
+            {'sku': 'SKU-2'},
+            {'sku': 'SKU-3', 'price': '5.00', 'discount_price': '6.00'},
+        ])
+        self.assertEqual(self.statuses(response), ['updated', 'duplicate', 'not_found', 'invalid', 'invalid'])
+        self.assertIn('Provide at least one of', str(response.data['results'][3]['errors']))
+        self.assertEqual(Product.objects.get(sku='SKU-0').stock, 2)
+
+    def test_payload_spanning_chunks(self):
+        items = [{'sku': f'SKU-{i}', 'stock': 10 + i} for i in range(5)]
+        with CaptureQueriesContext(connection) as queries:
+            results = bulk_updates.apply_bulk_update(items, chunk_size=2)
+        self.assertEqual([result['status'] for result in results], ['updated'] * 5)
+        self.assertEqual(dict(Product.objects.values_list('sku', 'stock')), {f'SKU-{i}': 10 + i for i in range(5)})
+        # One locking SELECT per chunk
+        self.assertEqual(sum(query['sql'].startswith('SELECT') for query in queries.captured_queries), 3)
+
+    def test_customers_and_empty_payloads_are_rejected(self):
+        customer = User.objects.create_user('buyer', 'buyer@example.com', 'pw', is_customer=True)
+        self.assertEqual(self.post(customer, [{'sku': 'SKU-0', 'stock': 1}]).status_code, 403)
+        self.assertEqual(self.post(self.staff, []).status_code, 400)
+
+
+@override_settings(PASSWORD_HASHERS=['django.contrib.auth.hashers.MD5PasswordHasher'])
+class UsernameOrEmailBackendTests(TestCase):
+    @classmethod
+    def setUpTestData(cls):
+        cls.user = User.objects.create_user('alice', 'alice@example.com', 'pw')
+        User.objects.create_user('dormant', 'dormant@example.com', 'pw', is_active=False)
+        User.objects.create_user('twin1', 'twin@example.com', 'pw')
+        User.objects.create_user('twin2', 'twin@example.com', 'pw')
+        # A username that looks like someone else's email
+        cls.lookalike = User.objects.create_user('alice@example.com', 'other@example.com', 'other')
+
+    def test_username_or_email(self):
+        self.assertEqual(authenticate(username='alice', password='pw'), self.user)
+        self.assertEqual(authenticate(username='alice@example.com', password='other'), self.lookalike)
+        self.lookalike.delete()
+        self.assertEqual(authenticate(username='alice@example.com', password='pw'), self.user)
+
+    def test_wrong_password_and_unknown_login(self):
+        self.assertIsNone(authenticate(username='alice', password='nope'))
+        self.assertIsNone(authenticate(username='nobody', password='pw'))
+        self.assertIsNone(authenticate(username='alice', password=None))
+
+    def test_inactive_user(self):
+        self.assertIsNone(authenticate(username='dormant', password='pw'))
+        self.assertIsNone(authenticate(username='dormant@example.com', password='pw'))
+
+    def test_ambiguous_email_is_rejected(self):
+        self.assertIsNone(authenticate(username='twin@example.com', password='pw'))
+        self.assertEqual(authenticate(username='twin1', password='pw').username, 'twin1')
+
+    def test_one_query_per_attempt(self):
+        for login, password in (('alice', 'pw'), ('alice', 'nope'), ('nobody', 'pw'), ('twin@example.com', 'pw')):
+            with self.assertNumQueries(1):
+                authenticate(username=login, password=password)
+
+    def test_unknown_logins_still_hash_the_password(self):
+        with mock.patch('django.contrib.auth.base_user.make_password', return_value='!') as make_password:
+            authenticate(username='nobody', password='pw')
+        make_password.assert_called_once_with('pw')
+
+
+class ExportTests(TestCase):
+    @classmethod
+    def setUpTestData(cls):
+        cls.staff = User.objects.create_user('staff', 'staff@example.com', 'pw', is_staff=True)
+        cls.ann = User.objects.create_user('ann', 'ann@example.com', 'pw', first_name='Ann', is_customer=True)
+        cls.bob = User.objects.create_user('bob', 'bob@example.com', 'pw', first_name='Bob', is_customer=True)
+        User.objects.create_user('cid', 'cid@example.com', 'pw', first_name='Annette', is_active=False)
+        vendors = []
+        for name in ('north', 'south'):
+            user = User.objects.create_user(name, f'{name}@example.com', 'pw', is_vendor=True)
+            vendors.append(Vendor.objects.create(user=user, business_name=name, approved=True))
+        cls.vendor = vendors[0]
+        categories = [Category.objects.create(name=slug, slug=slug) for slug in ('lamps', 'rugs')]
+        Product.objects.bulk_create(
+            Product(name=f'Product {i}', slug=f'product-{i}', description='', sku=f'SKU-{i}',
+                    price=Decimal(10 + 5 * i), discount_price=Decimal(9) if i == 3 else None,
+                    category=categories[i % 2], vendor=vendors[i % 2], active=i != 4)
+            for i in range(6)
+        )
+        for index, user in enumerate((cls.ann, cls.ann, cls.bob)):
+            Order.objects.create(user=user, order_number=f'ORD-{index}', payment_method='card')
+
+    def setUp(self):
+        self.client = APIClient()
+        self.client.force_authenticate(self.staff)
+
+    def export(self, kind, **params):
+        response = self.client.get(f'/api/admin/export/{kind}/', {'output': 'jsonl', **params})
+        self.assertEqual(response.status_code, 200)
+        return [json.loads(line) for line in b''.join(response.streaming_content).decode().splitlines()]
+
+    def listed(self, path, key, **params):
+        response = self.client.get(path, params)
+        self.assertEqual(response.status_code, 200)
+        return sorted(row[key] for row in response.data['results'])
+
+    def test_product_export_matches_the_catalog(self):
+        for params in ({}, {'category': 'lamps'}, {'vendor': str(self.vendor.pk)},
+                       {'min_price': '15', 'max_price': '25'}, {'max_price': '12'}):
+            with self.subTest(**params):
+                exported = sorted(row['id'] for row in self.export('products', active='true', **params))
+                self.assertEqual(exported, self.listed('/api/products/', 'id', **params))
+        # Without active= the export also has the inactive product
+        self.assertEqual(len(self.export('products')), 6)
+
+    def test_order_export_matches_the_admin_list(self):
+        for params in ({}, {'user_id': str(self.ann.pk)}):
+            with self.subTest(**params):
+                exported = sorted(row['order_number'] for row in self.export('orders', **params))
+                self.assertEqual(exported, self.listed('/api/orders/admin/', 'order_number', **params))
+
+    def test_customer_export_matches_the_admin_list(self):
+        for params in ({}, {'search': 'ann'}, {'search': 'ann', 'status': 'active'}, {'status': 'inactive'}):
+            with self.subTest(**params):
+                exported = sorted(row['id'] for row in self.export('customers', **params))
+                self.assertEqual(exported, self.listed('/api/admin/customers/', 'id', **params))
+
+    def test_invalid_filters_are_rejected_before_streaming(self):
+        for kind, params in (('products', {'vendor': 'north'}), ('products', {'min_price': 'NaN'}),
+                             ('orders', {'user_id': 'ann'})):
+            with self.subTest(kind=kind, **params):
+                response = self.client.get(f'/api/admin/export/{kind}/', params)
+                self.assertEqual(response.status_code, 400)
+                self.assertFalse(response.streaming)
+        self.assertEqual(self.client.get('/api/products/', {'max_price': 'cheap'}).status_code, 400)
+
+    def test_command_writes_to_its_stdout(self):
+        out = StringIO()
+        call_command('export_data', 'orders', '--filter', f'user_id={self.bob.pk}', stdout=out)
+        header, *rows = out.getvalue().splitlines()
+        self.assertTrue(header.startswith('order_number,user_id,username'))
+        self.assertEqual([row.split(',')[0] for row in rows], ['ORD-2'])
+        with self.assertRaisesMessage(CommandError, 'Invalid filter'):
+            call_command('export_data', 'orders', '--filter', 'user_id=bob', stdout=StringIO())
+
+
+class LogHandlerTests(SimpleTestCase):
+    def record(self, name='shop.test', level=logging.INFO, msg='hello %s', args=('world',), **extra):
+        record = logging.LogRecord(name, level, __file__, 1, msg, args, None)
+        record.__dict__.update(extra)
+        return record
+
+    def file_handler(self, **kwargs):
+        directory = tempfile.TemporaryDirectory()
+        self.addCleanup(directory.cleanup)
+        path = os.path.join(directory.name, 'debug.log')
+        handler = log_handlers.SizeAndTimeRotatingFileHandler(path, **kwargs)
+        handler.setFormatter(logging.Formatter('%(message)s'))
+        self.addCleanup(handler.close)
+        return handler, path
+
+    def test_rotates_by_size(self):
+        handler, path = self.file_handler(maxBytes=100, backupCount=2)
+        for index in range(20):
+            handler.emit(self.record(msg='line %02d' + 'x' * 30, args=(index,)))
+        self.assertEqual(sorted(os.listdir(os.path.dirname(path))), ['debug.log', 'debug.log.1', 'debug.log.2'])
+        self.assertLessEqual(os.path.getsize(path), 100)
+        with open(path) as fh:
+            self.assertIn('line 19', fh.read())
+
+    def test_rotates_at_midnight(self):
+        handler, path = self.file_handler(maxBytes=10 ** 6, backupCount=3)
+        handler.emit(self.record(msg='yesterday', args=()))
+        handler.rollover_at = time.time() - 1
+        handler.emit(self.record(msg='today', args=()))
+        with open(path + '.1') as fh:
+            self.assertEqual(fh.read(), 'yesterday\n')
+        with open(path) as fh:
+            self.assertEqual(fh.read(), 'today\n')
+        self.assertGreater(handler.rollover_at, time.time())
+
+        daily_off, path = self.file_handler(maxBytes=10 ** 6, daily=False)
+        daily_off.rollover_at = time.time() - 1
+        self.assertFalse(daily_off.shouldRollover(self.record()))
+
+    def test_sampling_filter(self):
+        sampling = log_handlers.SamplingFilter({'noisy': 0.0, 'noisy.keep': 1.0})
+        self.assertFalse(sampling.filter(self.record('noisy.sql', logging.DEBUG)))
+        self.assertTrue(sampling.filter(self.record('noisy.keep.this', logging.DEBUG)))
+        self.assertTrue(sampling.filter(self.record('noisy', logging.INFO)))
+        self.assertTrue(sampling.filter(self.record('noisybut.unrelated', logging.DEBUG)))
+        with mock.patch.object(log_handlers.random, 'random', side_effect=[0.05, 0.5]):
+            sampling = log_handlers.SamplingFilter({'rest_framework': 0.1})
+            kept = [sampling.filter(self.record('rest_framework.x', logging.DEBUG)) for _ in range(2)]
+        self.assertEqual(kept, [True, False])
+
+    def test_json_formatter(self):
+        try:
+            raise ValueError('boom')
+        except ValueError:
+            record = self.record(level=logging.ERROR, duration_ms=1.5, request=object(), request_id='abc')
+            record.exc_info = sys.exc_info()
+        entry = json.loads(log_handlers.JsonFormatter().format(record))
+        self.assertEqual((entry['level'], entry['logger'], entry['message']), ('ERROR', 'shop.test', 'hello world'))
+        self.assertEqual((entry['duration_ms'], entry['request_id']), (1.5, 'abc'))
+        self.assertNotIn('request', entry)
+        self.assertIn('ValueError: boom', entry['exc'])
+        self.assertRegex(entry['ts'], r'^\d{4}-\d\d-\d\dT\d\d:\d\d:\d\d\.\d{3}\+00:00$')
+
+    def test_request_ids(self):
+        ids = []
+        request_filter = log_handlers.RequestIdFilter()
+
+        def view(request):
+            record = self.record()
+            request_filter.filter(record)
+            ids.append(record.request_id)
+            return HttpResponse()
+
+        middleware = log_handlers.RequestLogMiddleware(view)
+        with self.assertLogs('ecom.request', 'INFO') as logs:
+            kept = middleware(RequestFactory().get('/x', HTTP_X_REQUEST_ID='upstream-1'))
+            replaced = middleware(RequestFactory().get('/x', HTTP_X_REQUEST_ID='bad id\n'))
+        self.assertEqual(kept['X-Request-ID'], 'upstream-1')
+        self.assertRegex(replaced['X-Request-ID'], r'^[0-9a-f]{32}$')
+        self.assertEqual(ids, ['upstream-1', replaced['X-Request-ID']])
+        self.assertEqual(logs.records[0].getMessage(), 'GET /x 200')
+        self.assertIsInstance(logs.records[0].duration_ms, float)
+
+        # django.request logs after the middleware has returned; the record carries the request
+        late = self.record(request=mock.Mock(request_id='from-request'))
+        request_filter.filter(late)
+        self.assertEqual(late.request_id, 'from-request')
+
+    def test_queued_handler(self):
+        target = logging.handlers.BufferingHandler(100)
+        target.set_name('log-handler-tests-target')
+        self.addCleanup(target.close)
+        queued = log_handlers.QueuedHandler(handlers=['log-handler-tests-target'])
+        try:
+            raise ValueError('boom')
+        except ValueError:
+            record = self.record(level=logging.ERROR, duration_ms=2)
+            record.exc_info = sys.exc_info()
+        queued.handle(record)
+        queued.stop()
+        received, = target.buffer
+        # Formatted on the caller's thread; extras survive for the JSON formatter
+        self.assertEqual((received.msg, received.args, received.duration_ms), ('hello world', None, 2))
+        self.assertIsNone(received.exc_info)
+        self.assertIn('ValueError: boom', received.exc_text)
+
+        with self.assertRaisesMessage(ValueError, 'not configured yet'):
+            log_handlers.QueuedHandler(handlers=['no-such-handler'])
+
+    def test_full_queue_drops_records(self):
+        queued = log_handlers.QueuedHandler(queue_size=1)
+        queued.enqueue(self.record())
+        queued.enqueue(self.record())
+        self.assertEqual(queued.dropped, 1)
+
+
+@override_settings(SHOP_TRACING={'ENABLED': True, 'SLOW_SPAN_MS': 500})
+class TracingTests(SimpleTestCase):
+    def setUp(self):
+        tracing.reset_counters()
+        self.addCleanup(tracing.reset_counters)
+
+    def test_nested_spans(self):
+        with self.assertLogs('shop.tracing', 'DEBUG') as logs:
+            with tracing.span('checkout', items=3) as outer:
+                with tracing.span('checkout.stripe_call') as inner:
+                    inner.set(amount=3000)
+        inner_record, outer_record = logs.records
+        self.assertEqual((inner_record.span, inner_record.parent_span), ('checkout.stripe_call', 'checkout'))
+        self.assertEqual((outer_record.span, outer_record.parent_span), ('checkout', None))
+        self.assertEqual((inner_record.attr_amount, outer_record.attr_items), (3000, 3))
+        self.assertEqual(inner_record.levelno, logging.DEBUG)
+        self.assertGreaterEqual(outer.duration_ms, inner.duration_ms)
+        self.assertEqual(tracing.get_counters(), {'checkout.ok': 1, 'checkout.stripe_call.ok': 1})
+
+    def test_failed_and_slow_spans(self):
+        with self.assertLogs('shop.tracing', 'DEBUG') as logs, self.assertRaises(KeyError):
+            with tracing.span('lookup'):
+                raise KeyError('sku')
+        record, = logs.records
+        self.assertEqual((record.status, record.attr_error), ('error', 'KeyError'))
+
+        with override_settings(SHOP_TRACING={'ENABLED': True, 'SLOW_SPAN_MS': 0}):
+            with self.assertLogs('shop.tracing', 'INFO'):
+                with tracing.span('lookup'):
+                    pass
+        self.assertEqual(tracing.get_counters(), {'lookup.error': 1, 'lookup.ok': 1})
+
+    def test_counters_reach_the_metrics_endpoint(self):
+        tracing.incr('payments.intent.success')
+        tracing.incr('payments.intent.success', 2)
+        self.assertEqual(tracing.get_counters(), {'payments.intent.success': 3})
+        self.assertIn('shop_trace_events_total{name="payments.intent.success"} 3\n', performance.render_metrics())
+
+    @override_settings(SHOP_TRACING={'ENABLED': False})
+    def test_disabled(self):
+        with self.assertNoLogs('shop.tracing', 'DEBUG'):
+            with tracing.span('checkout', items=3) as noop:
+                noop.set(amount=1)
+        self.assertIs(noop, tracing.NOOP_SPAN)
+        tracing.incr('payments.intent.success')
+        self.assertEqual(tracing.get_counters(), {})
+        self.assertNotIn('shop_trace_events_total', performance.render_metrics())
+
+
+class DatabaseSettingsTests(SimpleTestCase):
+    def load_settings(self, **environ):
+        with mock.patch.dict(os.environ, environ):
+            return runpy.run_path(os.path.join(settings.BASE_DIR, 'ecom', 'settings.py'))
+
+    def test_unknown_engine(self):
+        with self.assertRaisesMessage(ImproperlyConfigured, "Unsupported DJANGO_DB_ENGINE 'oracle'"):
+            self.load_settings(DJANGO_DB_ENGINE='oracle')
+
+    def test_pool_needs_psycopg_3(self):
+        with mock.patch('importlib.util.find_spec', return_value=None):
+            with self.assertRaisesMessage(ImproperlyConfigured, 'psycopg[pool]'):
+                self.load_settings(DJANGO_DB_ENGINE='postgresql', DJANGO_DB_POOL='10')
+        with mock.patch('importlib.util.find_spec', return_value=object()):
+            databases = self.load_settings(DJANGO_DB_ENGINE='postgresql', DJANGO_DB_POOL='10')['DATABASES']
+        self.assertEqual(databases['default']['OPTIONS']['pool']['max_size'], 10)
+        self.assertEqual(databases['default']['CONN_MAX_AGE'], 0)
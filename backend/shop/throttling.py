@@ -0,0 +1,193 @@
+"""
+Token-bucket throttling for the anonymous endpoints (login, registration,
+contact form).
+
+Each bucket holds up to N tokens and refills at N per period, so a rate of
+``'10/min'`` allows bursts of 10 and a sustained 10 requests a minute.  Buckets
+live in a pluggable store configured by ``settings.SHOP_THROTTLE['BACKEND']``:
+
+* ``LocalMemoryBucketStore`` - per-process dict, no I/O (dev, single worker)
+* ``CacheBucketStore`` - Django cache, shared between workers when the cache
+  is (Redis, Memcached, database)
+"""
+import threading
+import time
+
+from django.conf import settings
+from django.core.cache import caches
+from django.utils.module_loading import import_string
+from rest_framework.settings import api_settings
+from rest_framework.throttling import BaseThrottle
+
+DEFAULTS = {
+    'ENABLED': True,
+    'BACKEND': 'shop.throttling.LocalMemoryBucketStore',
+    'CACHE_ALIAS': 'default',
+    'RATES': {},
+}
+
+PERIODS = {'s': 1, 'm': 60, 'h': 3600, 'd': 86400}
+
+
+def get_throttle_settings():
+    return {**DEFAULTS, **getattr(settings, 'SHOP_THROTTLE', {})}
+
+
+def parse_rate(rate):
+    """'10/min' -> (capacity 10, refill 10/60 tokens per second)"""
+    count, period = rate.split('/')
+    capacity = int(count)
+    return capacity, capacity / PERIODS[period.strip()[0]]
+
+
+def get_client_ip(request):
+    """
+    Client address honouring ``REST_FRAMEWORK['NUM_PROXIES']``.
+
+    X-Forwarded-For is only read when NUM_PROXIES says how many trusted
+    reverse proxies appended to it; the entry they added is used, never the
+    client-controlled left end.  Unset, the peer address (REMOTE_ADDR) is used.
+    """
+    x_forwarded_for = request.META.get('HTTP_X_FORWARDED_FOR')
+    num_proxies = api_settings.NUM_PROXIES
+    if x_forwarded_for and num_proxies:
+        addresses = [address.strip() for address in x_forwarded_for.split(',') if address.strip()]
+        if addresses:
+            return addresses[-min(num_proxies, len(addresses))]
+    return request.META.get('REMOTE_ADDR')
+
+
+def _take(tokens, updated, capacity, refill_rate, now):
+    """Refill then try to take one token. Returns (allowed, tokens, wait)."""
+    tokens = min(capacity, tokens + (now - updated) * refill_rate)
+    if tokens >= 1:
+        return True, tokens - 1, 0.0
+    return False, tokens, (1 - tokens) / refill_rate
+
+
+class LocalMemoryBucketStore:
+    max_buckets = 100000
+
+    def __init__(self, **kwargs):
+        self._buckets = {}
+        self._lock = threading.Lock()
+
+    def consume(self, key, capacity, refill_rate):
+        now = time.monotonic()
+        with self._lock:
+            tokens, updated, _ = self._buckets.get(key, (capacity, now, None))
+            allowed, tokens, wait = _take(tokens, updated, capacity, refill_rate, now)
+            if key not in self._buckets and len(self._buckets) >= self.max_buckets:
+                self._evict(now)
+            # Each bucket remembers when it will be full again under its own rate
+            self._buckets[key] = (tokens, now, now + (capacity - tokens) / refill_rate)
+        return allowed, wait
+
+    def _evict(self, now):
+        # Buckets that have refilled completely carry no state worth keeping
+        self._buckets = {key: value for key, value in self._buckets.items() if value[2] > now}
+        if len(self._buckets) >= self.max_buckets:
+            # All still draining: drop the quarter that would be full soonest
+            keep = sorted(self._buckets.items(), key=lambda item: item[1][2])[self.max_buckets // 4:]
+            self._buckets = dict(keep)
+
+    def reset(self):
+        with self._lock:
+            self._buckets.clear()
+
+
+class CacheBucketStore:
+    """
+    Buckets stored in a Django cache.  The read-modify-write is not atomic,
+    so a burst racing across workers may slip a request or two through;
+    that is an acceptable trade for not taking a lock on every login.
+    """
+    key_prefix = 'throttle-bucket:'
+
+    def __init__(self, cache_alias='default', **kwargs):
+        self.cache = caches[cache_alias]
+
+    def consume(self, key, capacity, refill_rate):
+        now = time.time()
+        cache_key = self.key_prefix + key
+        tokens, updated = self.cache.get(cache_key, (capacity, now))
+        allowed, tokens, wait = _take(tokens, updated, capacity, refill_rate, now)
+        self.cache.set(cache_key, (tokens, now), timeout=int(capacity / refill_rate) + 1)
+        return allowed, wait
+
+    def reset(self):
+        pass
+
+
+_store = None
+_store_lock = threading.Lock()
+
+
+def get_bucket_store():
+    global _store
+    if _store is None:
+        with _store_lock:
+            if _store is None:
+                config = get_throttle_settings()
+                _store = import_string(config['BACKEND'])(cache_alias=config['CACHE_ALIAS'])
+    return _store
+
+
+class TokenBucketThrottle(BaseThrottle):
+    """Base class: subclasses set ``scope`` and implement ``get_bucket_key``."""
+    scope = None
+
+    def get_bucket_key(self, request, view):
+        raise NotImplementedError
+
+    def allow_request(self, request, view):
+        config = get_throttle_settings()
+        rate = config['RATES'].get(self.scope)
+        if not config['ENABLED'] or not rate:
+            return True
+
+        key = self.get_bucket_key(request, view)
+        if key is None:
+            return True
+
+        capacity, refill_rate = parse_rate(rate)
+        allowed, self._wait = get_bucket_store().consume(f'{self.scope}:{key}', capacity, refill_rate)
+        return allowed
+
+    def wait(self):
+        return getattr(self, '_wait', None)
+
+
+class IPThrottle(TokenBucketThrottle):
+    def get_bucket_key(self, request, view):
+        return get_client_ip(request)
+
+
+class AccountThrottle(TokenBucketThrottle):
+    """Keyed on the login being attempted, whatever IP it comes from."""
+
+    def get_bucket_key(self, request, view):
+        if not isinstance(request.data, dict):
+            # Not a login the view would accept either; let it answer 400
+            return None
+        login = request.data.get('username') or request.data.get('email')
+        return str(login).strip().lower() if login else None
+
+
+class LoginIPThrottle(IPThrottle):
+    scope = 'login'
+
+
+class LoginAccountThrottle(AccountThrottle):
+    scope = 'login_account'
+
+
+class RegistrationThrottle(IPThrottle):
+    scope = 'register'
+
+
+class ContactThrottle(IPThrottle):
+    scope = 'contact'
+
+
+LOGIN_THROTTLES = [LoginIPThrottle, LoginAccountThrottle]
@@ -0,0 +1,188 @@
+"""
+Refresh-token blacklist without simplejwt's ``token_blacklist`` app.
+
+The stock app records every issued token in ``OutstandingToken`` and probes
+both tables on each refresh, and nothing ever deletes the rows.  Here only
+revoked tokens are stored (``RevokedRefreshToken``), each row carries the
+token's own expiry and is purged once that has passed, so the table is
+bounded by the tokens rotated within one ``REFRESH_TOKEN_LIFETIME``.
+
+Lookups go through an in-process bloom filter first: a token the filter has
+never seen is known not to be revoked without a query.  Rotation itself is
+enforced by the unique ``jti`` column: inserting a jti that is already there
+means the refresh token was replayed, whatever the filter said.
+"""
+import hashlib
+import math
+import threading
+import time
+from datetime import datetime, timezone as dt_timezone
+
+from django.conf import settings
+from django.db import IntegrityError, transaction
+from django.utils import timezone
+from django.utils.translation import gettext_lazy as _
+from rest_framework_simplejwt.exceptions import InvalidToken
+from rest_framework_simplejwt.serializers import TokenBlacklistSerializer, TokenRefreshSerializer
+from rest_framework_simplejwt.settings import api_settings
+
+from .authentication import is_token_revoked
+from .models import RevokedRefreshToken
+
+DEFAULTS = {
+    'BLOOM_CAPACITY': 100000,
+    'BLOOM_ERROR_RATE': 0.001,
+    # Seconds between pulls of rows revoked by other workers
+    'SYNC_INTERVAL': 5,
+    # Seconds between automatic purges of expired rows (per process)
+    'PURGE_INTERVAL': 3600,
+}
+
+
+def get_blacklist_settings():
+    return {**DEFAULTS, **getattr(settings, 'TOKEN_BLACKLIST', {})}
+
+
+class BloomFilter:
+    def __init__(self, capacity, error_rate):
+        self.size = max(8, int(-capacity * math.log(error_rate) / math.log(2) ** 2))
+        self.hash_count = max(1, round(self.size / capacity * math.log(2)))
+        self.bits = bytearray((self.size + 7) // 8)
+
+    def _positions(self, value):
+        # Double hashing: two 64-bit halves of one digest give k positions
+        digest = hashlib.blake2b(value.encode(), digest_size=16).digest()
+        h1 = int.from_bytes(digest[:8], 'little')
+        h2 = int.from_bytes(digest[8:], 'little') | 1
+        return ((h1 + i * h2) % self.size for i in range(self.hash_count))
+
+    def add(self, value):
+        for position in self._positions(value):
+            self.bits[position >> 3] |= 1 << (position & 7)
+
+    def __contains__(self, value):
+        return all(self.bits[position >> 3] & (1 << (position & 7)) for position in self._positions(value))
+
+
+class TokenBlacklist:
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._filter = None
+        self._last_id = 0
+        self._synced_at = 0.0
+        self._purged_at = time.monotonic()
+
+    def _rebuild(self):
+        config = get_blacklist_settings()
+        rows = RevokedRefreshToken.objects.filter(expires_at__gt=timezone.now())
+        count = rows.count()
+        self._filter = BloomFilter(max(config['BLOOM_CAPACITY'], count * 2), config['BLOOM_ERROR_RATE'])
+        self._last_id = 0
+        for pk, jti in rows.order_by('pk').values_list('pk', 'jti').iterator(chunk_size=5000):
+            self._filter.add(jti)
+            self._last_id = pk
+
+    def _sync(self):
+        now = time.monotonic()
+        with self._lock:
+            if self._filter is None:
+                self._rebuild()
+            elif now - self._synced_at >= get_blacklist_settings()['SYNC_INTERVAL']:
+                new_rows = RevokedRefreshToken.objects.filter(pk__gt=self._last_id)\
+                                                      .order_by('pk').values_list('pk', 'jti')
+                for pk, jti in new_rows:
+                    self._filter.add(jti)
+                    self._last_id = pk
+            else:
+                return
+            self._synced_at = now
+
+    def is_revoked(self, jti):
+        self._sync()
+        if jti not in self._filter:
+            return False
+        return RevokedRefreshToken.objects.filter(jti=jti).exists()
+
+    def revoke(self, token):
+        """
+        Blacklist a refresh token.  Returns False if it was already
+        blacklisted, i.e. the token is being replayed.
+        """
+        jti = token[api_settings.JTI_CLAIM]
+        expires_at = datetime.fromtimestamp(token['exp'], tz=dt_timezone.utc)
+        try:
+            with transaction.atomic():
+                RevokedRefreshToken.objects.create(
+                    jti=jti,
+                    user_id=token.get(api_settings.USER_ID_CLAIM),
+                    expires_at=expires_at,
+                )
+        except IntegrityError:
+            return False
+
+        self._sync()
+        with self._lock:
+            self._filter.add(jti)
+        self.purge_if_due()
+        return True
+
+    def purge_if_due(self):
+        if time.monotonic() - self._purged_at >= get_blacklist_settings()['PURGE_INTERVAL']:
+            self.purge()
+
+    def purge(self):
+        """Delete rows for tokens that have expired anyway. Returns the count."""
+        self._purged_at = time.monotonic()
+        deleted, _ = RevokedRefreshToken.objects.filter(expires_at__lte=timezone.now()).delete()
+        if deleted:
+            # Bloom filters cannot forget; start a fresh one on the next lookup
+            with self._lock:
+                self._filter = None
+        return deleted
+
+    def reset(self):
+        with self._lock:
+            self._filter = None
+
+
+blacklist = TokenBlacklist()
+
+
+class BlacklistTokenRefreshSerializer(TokenRefreshSerializer):
+    """
+    ``TOKEN_REFRESH_SERIALIZER``: rejects blacklisted or revoked refresh
+    tokens and blacklists the old token when rotating.
+    """
+
+    def validate(self, attrs):
+        refresh = self.token_class(attrs['refresh'])
+        jti = refresh[api_settings.JTI_CLAIM]
+
+        if blacklist.is_revoked(jti) or is_token_revoked(refresh):
+            raise InvalidToken(_("Token is blacklisted"))
+
+        data = {'access': str(refresh.access_token)}
+
+        if api_settings.ROTATE_REFRESH_TOKENS:
+            if api_settings.BLACKLIST_AFTER_ROTATION and not blacklist.revoke(refresh):
+                raise InvalidToken(_("Token is blacklisted"))
+
+            refresh.set_jti()
+            refresh.set_exp()
+            refresh.set_iat()
+
+            data['refresh'] = str(refresh)
+
+        return data
+
+
+class BlacklistTokenLogoutSerializer(TokenBlacklistSerializer):
+    """
+    ``TOKEN_BLACKLIST_SERIALIZER``: logout.  The stock serializer needs the
+    ``token_blacklist`` app and silently does nothing without it.
+    """
+
+    def validate(self, attrs):
+        # Logging out twice is not a replay; the token is dead either way
+        blacklist.revoke(self.token_class(attrs['refresh']))
+        return {}
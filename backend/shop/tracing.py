@@ -0,0 +1,130 @@
+"""
+Lightweight tracing: timed spans and counters.
+
+    with tracing.span('payments.stripe_call', amount=amount):
+        ...
+    tracing.incr('payments.intent.success')
+
+Finished spans are logged to the ``shop.tracing`` logger (name, duration,
+attributes, parent span; the request id comes from the logging filters) and
+counters are kept in process, readable with ``get_counters()``.  With
+``SHOP_TRACING['ENABLED']`` off, ``span()`` hands back a shared no-op context
+manager and ``incr()`` returns at once, so instrumented code costs a function
+call.  Attributes are logged as given: pass sizes and ids, never payloads.
+"""
+import logging
+import threading
+import time
+from collections import defaultdict
+from contextvars import ContextVar
+
+from django.conf import settings
+from django.core.signals import setting_changed
+
+logger = logging.getLogger(__name__)
+
+DEFAULTS = {
+    'ENABLED': False,
+    # Spans slower than this are logged at INFO instead of DEBUG
+    'SLOW_SPAN_MS': 500,
+}
+
+_config = None
+_current_span = ContextVar('current_span', default=None)
+_counters = defaultdict(int)
+_counters_lock = threading.Lock()
+
+
+def get_tracing_settings():
+    global _config
+    if _config is None:
+        _config = {**DEFAULTS, **getattr(settings, 'SHOP_TRACING', {})}
+    return _config
+
+
+def _reload_settings(setting, **kwargs):
+    global _config
+    if setting == 'SHOP_TRACING':
+        _config = None
+
+
+setting_changed.connect(_reload_settings)
+
+
+def is_enabled():
+    return get_tracing_settings()['ENABLED']
+
+
+class _NoopSpan:
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc, tb):
+        return False
+
+    def set(self, **attrs):
+        pass
+
+
+NOOP_SPAN = _NoopSpan()
+
+
+class Span:
+    def __init__(self, name, attrs):
+        self.name = name
+        self.attrs = attrs
+        self.parent = None
+        self.duration_ms = None
+
+    def set(self, **attrs):
+        self.attrs.update(attrs)
+
+    def __enter__(self):
+        self.parent = _current_span.get()
+        self._token = _current_span.set(self)
+        self._start = time.perf_counter()
+        return self
+
+    def __exit__(self, exc_type, exc, tb):
+        self.duration_ms = round((time.perf_counter() - self._start) * 1000, 3)
+        _current_span.reset(self._token)
+        status = 'ok' if exc_type is None else 'error'
+        level = logging.INFO if self.duration_ms >= get_tracing_settings()['SLOW_SPAN_MS'] else logging.DEBUG
+        if exc_type is not None:
+            self.attrs['error'] = exc_type.__name__
+        logger.log(
+            level, "span %s %s %.3fms", self.name, status, self.duration_ms,
+            extra={
+                'span': self.name,
+                'parent_span': self.parent.name if self.parent else None,
+                'duration_ms': self.duration_ms,
+                'status': status,
+                **{f'attr_{key}': value for key, value in self.attrs.items()},
+            },
+        )
+        incr(f'{self.name}.{status}')
+        return False
+
+
+def span(name, **attrs):
+    """Context manager timing the block as ``name``."""
+    if not get_tracing_settings()['ENABLED']:
+        return NOOP_SPAN
+    return Span(name, attrs)
+
+
+def incr(name, value=1):
+    if not get_tracing_settings()['ENABLED']:
+        return
+    with _counters_lock:
+        _counters[name] += value
+
+
+def get_counters():
+    with _counters_lock:
+        return dict(_counters)
+
+
+def reset_counters():
+    with _counters_lock:
+        _counters.clear()
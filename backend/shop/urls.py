@@ -1,7 +1,8 @@
+from django.conf import settings
 from django.urls import path, include
 from rest_framework_simplejwt.views import TokenRefreshView
 from rest_framework.routers import DefaultRouter
-from rest_framework_simplejwt.views import TokenVerifyView
+from rest_framework_simplejwt.views import TokenBlacklistView, TokenVerifyView
 from .views import (
     # Authentication
     CustomTokenObtainPairView,
@@ -62,8 +63,17 @@ from .views import (
     NotificationListView,
     NotificationMarkAllAsReadView,
     UnreadNotificationCountView,
+    notification_stream,
+    NotificationBroadcastView,
+    NotificationBroadcastStatusView,
     NotificationMarkAsReadView,
     SystemSettingsRetrieveUpdateView,
+    SalesReportView,
+    OrderExportView,
+    CustomerExportView,
+    ProductExportView,
+    ProductImportView,
+    ProductBulkUpdateView,
 
 )
 from . import ai_api_views
@@ -71,6 +81,16 @@ from . import ai_api_views
 router = DefaultRouter()
 router.register(r'addresses', AddressViewSet, basename='address')
 from . import payment_views
+from . import performance
+from . import async_views
+
+# ASGI: waiting on DeepSeek/Stripe holds a coroutine instead of a thread
+if settings.ASYNC_VIEWS:
+    generate_seo_keywords = async_views.generate_seo_keywords
+    create_payment_intent = async_views.create_payment_intent
+else:
+    generate_seo_keywords = ai_api_views.generate_seo_keywords
+    create_payment_intent = payment_views.create_payment_intent
 app_name = 'shop'
 
 urlpatterns = [
@@ -79,6 +99,7 @@ urlpatterns = [
     path('token/', CustomTokenObtainPairView.as_view(), name='token_obtain_pair'),
     path('token/refresh/', TokenRefreshView.as_view(), name='token_refresh'),
     path('token/verify/', TokenVerifyView.as_view(), name='token_verify'),
+    path('token/blacklist/', TokenBlacklistView.as_view(), name='token_blacklist'),
     path('register/', UserRegistrationView.as_view(), name='register'),
     path('register/customer/', CustomerRegistrationView.as_view(), name='register-customer'),
     path('register/vendor/', VendorRegistrationView.as_view(), name='register-vendor'),
@@ -88,6 +109,8 @@ urlpatterns = [
     # Product URLs
     path('products/', ProductListView.as_view(), name='product-list'),
     path('products/create/', ProductCreateView.as_view(), name='product-create'),
+    path('products/import/', ProductImportView.as_view(), name='product-import'),
+    path('products/bulk-update/', ProductBulkUpdateView.as_view(), name='product-bulk-update'),
     path('products/id/<int:pk>/', ProductDetailView.as_view(), name='product-detail-by-id'),
     path('products/slug/<slug:slug>/', ProductDetailView.as_view(), name='product-detail-by-slug'),
 
@@ -137,21 +160,30 @@ urlpatterns = [
     path('admin/recent-activity/', RecentActivityView.as_view(), name='recent-activity'),
     path('admin/customers/', CustomerListView.as_view(), name='admin-customer-list'),
     path('admin/customers/<int:pk>/', CustomerDetailView.as_view(), name='admin-customer-detail'),
+    path('admin/reports/sales/', SalesReportView.as_view(), name='admin-sales-report'),
+    path('admin/export/orders/', OrderExportView.as_view(), name='admin-export-orders'),
+    path('admin/export/customers/', CustomerExportView.as_view(), name='admin-export-customers'),
+    path('admin/export/products/', ProductExportView.as_view(), name='admin-export-products'),
 
     # Notification URLs
     path('notifications/', NotificationListView.as_view(), name='notification-list'),
     path('notifications/<int:notification_id>/read/', NotificationMarkAsReadView.as_view(), name='notification-read'),
     path('notifications/read-all/', NotificationMarkAllAsReadView.as_view(), name='notification-read-all'),
     path('notifications/unread-count/', UnreadNotificationCountView.as_view(), name='notification-unread-count'),
+    path('notifications/stream/', notification_stream, name='notification-stream'),
+    path('admin/notifications/broadcast/', NotificationBroadcastView.as_view(), name='admin-notification-broadcast'),
+    path('admin/notifications/broadcast/<str:job_id>/', NotificationBroadcastStatusView.as_view(), name='admin-notification-broadcast-status'),
     
-    path('generate-seo-keywords/', ai_api_views.generate_seo_keywords, name='generate_seo_keywords'),
+    path('generate-seo-keywords/', generate_seo_keywords, name='generate_seo_keywords'),
     # path('test-seo-keywords/', ai_api_views.test_seo_keywords, name='test_seo_keywords'),
     # path('api-health-check/', ai_api_views.api_health_check, name='api_health_check'),
 
-    path('create-payment-intent/', payment_views.create_payment_intent, name='create_payment_intent'),
+    path('create-payment-intent/', create_payment_intent, name='create_payment_intent'),
 
     path('system-settings/', SystemSettingsRetrieveUpdateView.as_view(), name='system-settings'),
 
+    path('metrics/', performance.metrics_view, name='metrics'),
+
 
     # Include router URLs (addresses)
     path('', include(router.urls)),
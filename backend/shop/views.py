@@ -5,7 +5,7 @@ from rest_framework_simplejwt.views import TokenObtainPairView
 from rest_framework_simplejwt.tokens import RefreshToken
 from django.contrib.auth import get_user_model
 from django.http import Http404
-from django.db.models import Q, Sum
+from django.db.models import Count, Max, Q, Sum
 from .models import (
     Product, Customer, Vendor, Address, Category,
     Order, OrderItem, Cart, CartItem, Coupon,
@@ -19,6 +19,12 @@ from .serializers import (
     CartItemSerializer, CouponSerializer, ProductImageSerializer,
     ProductReviewSerializer, NotificationSerializer, ProductReviewSerializer, ProductReviewCreateSerializer, SystemSettingsSerializer, UserProfileSerializer, PasswordChangeSerializer
 )
+from .filters import ProductOrderingFilter, filter_products, filter_orders, filter_customers
+from .authentication import add_user_claims, get_model_user
+from . import notifications
+from .conditional import ConditionalGetMixin
+from .projections import NOTIFICATION_LIST, ORDER_LIST, PRODUCT_LIST, ProjectedListMixin
+from .throttling import LOGIN_THROTTLES, RegistrationThrottle, ContactThrottle, get_client_ip
 
 User = get_user_model()
 
@@ -42,16 +48,14 @@ User = get_user_model()
 
 class CustomTokenObtainPairView(TokenObtainPairView):
     serializer_class = CustomTokenObtainPairSerializer
+    throttle_classes = LOGIN_THROTTLES
 
-    def post(self, request, *args, **kwargs):
-        # Modify the request data to use 'username' field for both username and email
-        if 'email' in request.data and 'username' not in request.data:
-            request.data._mutable = True
-            request.data['username'] = request.data['email']
-            request.data._mutable = False
-        
-        response = super().post(request, *args, **kwargs)
-        return response
+    def get_serializer(self, *args, **kwargs):
+        # Accept {"email": ...} as an alias for username without mutating request.data
+        data = kwargs.get('data')
+        if data is not None and 'email' in data and 'username' not in data:
+            kwargs['data'] = {'username': data.get('email'), 'password': data.get('password')}
+        return super().get_serializer(*args, **kwargs)
 
 
 
@@ -61,13 +65,14 @@ class CustomTokenObtainPairView(TokenObtainPairView):
 class UserRegistrationView(generics.CreateAPIView):
     serializer_class = UserRegistrationSerializer
     permission_classes = [permissions.AllowAny]
+    throttle_classes = [RegistrationThrottle]
 
     def create(self, request, *args, **kwargs):
         serializer = self.get_serializer(data=request.data)
         serializer.is_valid(raise_exception=True)
         user = serializer.save()
         
-        refresh = RefreshToken.for_user(user)
+        refresh = CustomTokenObtainPairSerializer.get_token(user)
         
         return Response({
             "user": {
@@ -85,6 +90,7 @@ class UserRegistrationView(generics.CreateAPIView):
 class CustomerRegistrationView(generics.CreateAPIView):
     serializer_class = CustomerProfileSerializer
     permission_classes = [permissions.AllowAny]
+    throttle_classes = [RegistrationThrottle]
 
     def create(self, request, *args, **kwargs):
         user_data = request.data.get('user', {})
@@ -101,7 +107,7 @@ class CustomerRegistrationView(generics.CreateAPIView):
         
         Customer.objects.create(user=user)
         
-        refresh = RefreshToken.for_user(user)
+        refresh = CustomTokenObtainPairSerializer.get_token(user)
         
         return Response({
             "user": {
@@ -119,6 +125,7 @@ class CustomerRegistrationView(generics.CreateAPIView):
 class VendorRegistrationView(generics.CreateAPIView):
     serializer_class = VendorProfileSerializer
     permission_classes = [permissions.AllowAny]
+    throttle_classes = [RegistrationThrottle]
 
     def create(self, request, *args, **kwargs):
         user_data = request.data.get('user', {})
@@ -139,7 +146,7 @@ class VendorRegistrationView(generics.CreateAPIView):
             description=request.data.get('description', '')
         )
         
-        refresh = RefreshToken.for_user(user)
+        refresh = CustomTokenObtainPairSerializer.get_token(user)
         
         return Response({
             "user": {
@@ -188,36 +195,26 @@ class PasswordChangeView(generics.GenericAPIView):
 
 
 # ==================== Product Views ====================
-class ProductListView(generics.ListAPIView):
+class ProductListView(ConditionalGetMixin, ProjectedListMixin, generics.ListAPIView):
     serializer_class = ProductSerializer
+    projection = PRODUCT_LIST
     permission_classes = [permissions.AllowAny]
-    filter_backends = [filters.SearchFilter, filters.OrderingFilter]
+    use_replica = True
+    filter_backends = [filters.SearchFilter, ProductOrderingFilter]
     search_fields = ['name', 'description', 'category__name', 'vendor__business_name']
-    ordering_fields = ['price', 'created', 'name']
+    ordering_fields = ['price', 'effective_price', 'created', 'name']
+    # Stable pages; served by the (active, -created) index
+    ordering = ['-created']
 
     def get_queryset(self):
         queryset = Product.objects.filter(active=True)
-        
-        # Filter by category
-        category = self.request.query_params.get('category', None)
-        if category:
-            queryset = queryset.filter(category__slug=category)
-            
-        # Filter by vendor
-        vendor = self.request.query_params.get('vendor', None)
-        if vendor:
-            queryset = queryset.filter(vendor__id=vendor)
-            
-        # Filter by price range
-        min_price = self.request.query_params.get('min_price', None)
-        max_price = self.request.query_params.get('max_price', None)
-        
-        if min_price:
-            queryset = queryset.filter(price__gte=min_price)
-        if max_price:
-            queryset = queryset.filter(price__lte=max_price)
-            
-        return queryset
+        return filter_products(queryset, self.request.query_params)
+
+    def get_version(self):
+        # Review, image and vendor changes bump Product.content_updated (shop/signals.py).
+        # No Last-Modified: a deletion doesn't move the Max(), only the count
+        version = self.filter_queryset(self.get_queryset()).aggregate(count=Count('pk'), updated=Max('content_updated'))
+        return (version['count'], version['updated']), None
 
 # class ProductDetailView(generics.RetrieveAPIView):
 #     queryset = Product.objects.filter(active=True)
@@ -226,33 +223,41 @@ class ProductListView(generics.ListAPIView):
 #     lookup_field = 'slug'
 
 
-class ProductDetailView(generics.RetrieveAPIView):
+class ProductDetailView(ConditionalGetMixin, generics.RetrieveAPIView):
     serializer_class = ProductSerializer
     permission_classes = [permissions.AllowAny]
+    use_replica = True
     
     def get_queryset(self):
         return Product.objects.select_related('vendor', 'category')\
                              .prefetch_related('images', 'reviews')\
                              .filter(active=True)
-    
-    def get_object(self):
-        queryset = self.get_queryset()
-        
+
+    def get_lookup(self):
         # Check which URL pattern was matched
         if 'pk' in self.kwargs:
             # ID-based lookup
-            lookup = {'pk': self.kwargs['pk']}
+            return {'pk': self.kwargs['pk']}
         elif 'slug' in self.kwargs:
             # Slug-based lookup
-            lookup = {'slug': self.kwargs['slug']}
-        else:
-            raise Http404("No valid lookup parameter provided")
+            return {'slug': self.kwargs['slug']}
+        raise Http404("No valid lookup parameter provided")
+    
+    def get_object(self):
+        queryset = self.get_queryset()
+        lookup = self.get_lookup()
         
         try:
             return queryset.get(**lookup)
         except Product.DoesNotExist:
             raise Http404("Product not found")
 
+    def get_version(self):
+        updated = Product.objects.filter(active=True, **self.get_lookup())\
+                                 .values_list('content_updated', flat=True).first()
+        # Unknown products: let get_object() raise the 404
+        return None if updated is None else (updated, updated)
+
 
 class ProductCreateView(generics.CreateAPIView):
     serializer_class = ProductSerializer
@@ -354,11 +359,13 @@ class CategoryListView(generics.ListAPIView):
     queryset = Category.objects.all()
     serializer_class = CategorySerializer
     permission_classes = [permissions.AllowAny]
+    use_replica = True
 
 class CategoryDetailView(generics.RetrieveAPIView):
     queryset = Category.objects.all()
     serializer_class = CategorySerializer
     permission_classes = [permissions.AllowAny]
+    use_replica = True
     lookup_field = 'slug'
 
 # ==================== Address Views ====================
@@ -367,7 +374,7 @@ class AddressViewSet(viewsets.ModelViewSet):
     permission_classes = [permissions.IsAuthenticated]
 
     def get_queryset(self):
-        return Address.objects.filter(user=self.request.user)
+        return Address.objects.filter(user_id=self.request.user.pk)
 
     def perform_create(self, serializer):
         # Set only one default address per type
@@ -384,14 +391,24 @@ class AddressViewSet(viewsets.ModelViewSet):
         serializer.save(user=self.request.user)
 
 # ==================== Cart Views ====================
-class CartDetailView(generics.RetrieveAPIView):
+class CartDetailView(ConditionalGetMixin, generics.RetrieveAPIView):
     serializer_class = CartSerializer
     permission_classes = [permissions.IsAuthenticated]
+    private = True
 
     def get_object(self):
-        cart, created = Cart.objects.get_or_create(user=self.request.user)
+        cart, created = Cart.objects.get_or_create(user_id=self.request.user.pk)
         return cart
 
+    def get_version(self):
+        # Item changes bump Cart.updated; the items embed their products' details and prices
+        cart = Cart.objects.filter(user_id=self.request.user.pk)\
+                           .annotate(products_updated=Max('items__product__content_updated'))\
+                           .values('pk', 'updated', 'products_updated').first()
+        if cart is None:
+            return None
+        return tuple(cart.values()), max(filter(None, (cart['updated'], cart['products_updated'])))
+
 
 
 class CartItemCreateView(generics.CreateAPIView):
@@ -416,27 +433,33 @@ class CartItemUpdateDestroyView(generics.RetrieveUpdateDestroyAPIView):
     permission_classes = [permissions.IsAuthenticated]
 
     def get_queryset(self):
-        cart, created = Cart.objects.get_or_create(user=self.request.user)
+        cart, created = Cart.objects.get_or_create(user_id=self.request.user.pk)
         return CartItem.objects.filter(cart=cart)
 
 # ==================== Order Views ====================
 # Update your OrderListView to ensure proper serialization
-class OrderListView(generics.ListAPIView):
+class OrderListView(ConditionalGetMixin, generics.ListAPIView):
     serializer_class = OrderSerializer
     permission_classes = [permissions.IsAuthenticated]
+    private = True
 
     def get_queryset(self):
-        return Order.objects.filter(user=self.request.user).order_by('-created')
+        return Order.objects.filter(user_id=self.request.user.pk).order_by('-created')
+
+    def get_version(self):
+        version = self.get_queryset().aggregate(count=Count('pk'), updated=Max('updated'))
+        return (version['count'], version['updated']), None
 
     def list(self, request, *args, **kwargs):
         queryset = self.filter_queryset(self.get_queryset())
-        serializer = self.get_serializer(queryset, many=True)
+        # Same output as OrderSerializer, without building model instances
+        orders = ORDER_LIST.render(ORDER_LIST.values(queryset), self.get_serializer_context())
         
         # Return a properly structured response
         return Response({
             'success': True,
-            'count': queryset.count(),
-            'orders': serializer.data  # Make sure this is an array
+            'count': len(orders),
+            'orders': orders  # Make sure this is an array
         })
 
 from decimal import Decimal
@@ -588,32 +611,40 @@ class OrderCreateView(APIView):
 
 
 
-class OrderDetailView(generics.RetrieveAPIView):
+class OrderDetailView(ConditionalGetMixin, generics.RetrieveAPIView):
     serializer_class = OrderSerializer
     permission_classes = [permissions.IsAuthenticated]
+    private = True
 
     def get_queryset(self):
-        return Order.objects.filter(user=self.request.user)
+        return Order.objects.filter(user_id=self.request.user.pk)
+
+    def get_version(self):
+        updated = self.get_queryset().filter(pk=self.kwargs['pk']).values_list('updated', flat=True).first()
+        return None if updated is None else (updated, updated)
 
 # ==================== Vendor Views ====================
 class VendorListView(generics.ListAPIView):
     queryset = Vendor.objects.filter(approved=True)
     serializer_class = VendorProfileSerializer
     permission_classes = [permissions.AllowAny]
+    use_replica = True
 
 class VendorDetailView(generics.RetrieveAPIView):
     queryset = Vendor.objects.filter(approved=True)
     serializer_class = VendorProfileSerializer
     permission_classes = [permissions.AllowAny]
+    use_replica = True
     lookup_field = 'pk'
 
 class VendorProductsView(generics.ListAPIView):
     serializer_class = ProductSerializer
     permission_classes = [permissions.AllowAny]
+    use_replica = True
 
     def get_queryset(self):
         vendor_id = self.kwargs['vendor_id']
-        return Product.objects.filter(vendor__id=vendor_id, active=True)
+        return Product.objects.filter(vendor_id=vendor_id, active=True).order_by('-created')
 
 # ==================== Customer Views ====================
 class CustomerProfileView(generics.RetrieveUpdateAPIView):
@@ -621,7 +652,7 @@ class CustomerProfileView(generics.RetrieveUpdateAPIView):
     permission_classes = [permissions.IsAuthenticated]
 
     def get_object(self):
-        return Customer.objects.get(user=self.request.user)
+        return Customer.objects.get(user_id=self.request.user.pk)
 
 # ==================== Coupon Views ====================
 class CouponValidateView(APIView):
@@ -667,6 +698,7 @@ class ProductReviewCreateView(generics.CreateAPIView):
 class ProductReviewListView(generics.ListAPIView):
     serializer_class = ProductReviewSerializer
     permission_classes = [permissions.AllowAny]
+    use_replica = True
 
     def get_queryset(self):
         product_id = self.kwargs['product_id']
@@ -679,7 +711,7 @@ class UserProfileView(generics.RetrieveUpdateAPIView):
     permission_classes = [permissions.IsAuthenticated]
 
     def get_object(self):
-        return self.request.user
+        return get_model_user(self.request.user)
 
     def get_serializer_class(self):
         # Use different serializers for different actions if needed
@@ -700,6 +732,7 @@ class ContactSubmissionCreateView(generics.CreateAPIView):
     queryset = ContactSubmission.objects.all()
     serializer_class = ContactSubmissionSerializer
     permission_classes = [AllowAny]
+    throttle_classes = [ContactThrottle]
 
     def create(self, request, *args, **kwargs):
         serializer = self.get_serializer(data=request.data)
@@ -723,12 +756,7 @@ class ContactSubmissionCreateView(generics.CreateAPIView):
         )
 
     def get_client_ip(self, request):
-        x_forwarded_for = request.META.get('HTTP_X_FORWARDED_FOR')
-        if x_forwarded_for:
-            ip = x_forwarded_for.split(',')[0]
-        else:
-            ip = request.META.get('REMOTE_ADDR')
-        return ip
+        return get_client_ip(request)
 
 
 class ContactSubmissionListView(generics.ListAPIView):
@@ -750,6 +778,10 @@ from rest_framework_simplejwt.serializers import TokenObtainPairSerializer
 
 
 class MyTokenObtainPairSerializer(TokenObtainPairSerializer):
+    @classmethod
+    def get_token(cls, user):
+        return add_user_claims(super().get_token(user), user)
+
     def validate(self, attrs):
         data = super().validate(attrs)
         data['is_admin'] = self.user.is_staff  # or self.user.is_superuser
@@ -757,6 +789,7 @@ class MyTokenObtainPairSerializer(TokenObtainPairSerializer):
 
 class MyTokenObtainPairView(TokenObtainPairView):
     serializer_class = MyTokenObtainPairSerializer
+    throttle_classes = LOGIN_THROTTLES
 
 
 
@@ -774,6 +807,7 @@ from django.db.models import Count, Sum
 
 class DashboardStatsView(APIView):
     permission_classes = [permissions.IsAdminUser]
+    use_replica = True
 
     def get(self, request):
         total_users = User.objects.count()
@@ -797,6 +831,7 @@ from datetime import timedelta
 
 class RecentActivityView(APIView):
     permission_classes = [permissions.IsAdminUser]
+    use_replica = True
 
     def get(self, request):
         # Get recent user registrations
@@ -917,12 +952,7 @@ class AdminOrderListView(generics.ListAPIView):
     permission_classes = [permissions.IsAdminUser]
     
     def get_queryset(self):
-        queryset = Order.objects.all()
-        user_id = self.request.query_params.get('user_id')
-        if user_id:
-            # Make sure you're filtering correctly
-            queryset = queryset.filter(user__id=user_id)
-        return queryset
+        return filter_orders(Order.objects.all(), self.request.query_params)
     
 
 
@@ -1012,30 +1042,7 @@ class CustomerListView(generics.ListAPIView):
     
     def get_queryset(self):
         queryset = User.objects.filter(is_staff=False)  # or your customer model
-        
-        # Add filtering logic based on query parameters
-        search = self.request.query_params.get('search', None)
-        role = self.request.query_params.get('role', None)
-        status = self.request.query_params.get('status', None)
-        
-        if search:
-            queryset = queryset.filter(
-                Q(first_name__icontains=search) | 
-                Q(last_name__icontains=search) |
-                Q(email__icontains=search)
-            )
-        
-        if role == 'admin':
-            queryset = queryset.filter(is_staff=True)
-        elif role == 'customer':
-            queryset = queryset.filter(is_staff=False)
-        
-        if status == 'active':
-            queryset = queryset.filter(is_active=True)
-        elif status == 'inactive':
-            queryset = queryset.filter(is_active=False)
-        
-        return queryset
+        return filter_customers(queryset, self.request.query_params)
 
 
 
@@ -1109,15 +1116,21 @@ class LimitPagination(PageNumberPagination):
     page_size_query_param = 'limit'
     max_page_size = 100
 
-class NotificationListView(generics.ListAPIView):
+class NotificationListView(ProjectedListMixin, generics.ListAPIView):
     serializer_class = NotificationSerializer
+    projection = NOTIFICATION_LIST
     permission_classes = [permissions.IsAuthenticated]
     pagination_class = LimitPagination
     
     def get_queryset(self):
         return Notification.objects.filter(
-            recipient=self.request.user
+            recipient_id=self.request.user.pk
         ).order_by('-created_at')
+
+    def get_serializer_context(self):
+        context = super().get_serializer_context()
+        context['read_watermark'] = notifications.get_read_watermark(self.request.user.pk)
+        return context
     
 
 
@@ -1126,39 +1139,25 @@ class NotificationMarkAsReadView(APIView):
     permission_classes = [permissions.IsAuthenticated]
     
     def post(self, request, notification_id):
-        try:
-            notification = Notification.objects.get(
-                id=notification_id,
-                recipient=request.user
-            )
-            notification.is_read = True
-            notification.save()
+        if notifications.mark_read(request.user.pk, notification_id):
             return Response({'status': 'success'})
-        except Notification.DoesNotExist:
-            return Response(
-                {'error': 'Notification not found'},
-                status=status.HTTP_404_NOT_FOUND
-            )
+        return Response(
+            {'error': 'Notification not found'},
+            status=status.HTTP_404_NOT_FOUND
+        )
 
 class NotificationMarkAllAsReadView(APIView):
     permission_classes = [permissions.IsAuthenticated]
     
     def post(self, request):
-        Notification.objects.filter(
-            recipient=request.user,
-            is_read=False
-        ).update(is_read=True)
+        notifications.mark_all_read(request.user.pk)
         return Response({'status': 'success'})
 
 class UnreadNotificationCountView(APIView):
     permission_classes = [permissions.IsAuthenticated]
     
     def get(self, request):
-        count = Notification.objects.filter(
-            recipient=request.user,
-            is_read=False
-        ).count()
-        return Response({'count': count})
+        return Response({'count': notifications.unread_count(request.user.pk)})
     
 
 
@@ -1291,3 +1290,294 @@ class SystemSettingsRetrieveUpdateView(generics.RetrieveUpdateAPIView):
 
 
 
+# ==================== Report Views ====================
+from datetime import date
+from . import analytics
+
+
+class SalesReportView(APIView):
+    """
+    Revenue, AOV, conversion and top sellers computed from the latest
+    columnar snapshot (see ``export_sales_snapshot``), never from live tables.
+    """
+    permission_classes = [permissions.IsAdminUser]
+
+    def get(self, request):
+        try:
+            start = self._parse_date(request.query_params.get('start'))
+            end = self._parse_date(request.query_params.get('end'))
+            top = int(request.query_params.get('top', 10))
+        except ValueError:
+            return Response(
+                {"error": "Use YYYY-MM-DD for start/end and an integer for top"},
+                status=status.HTTP_400_BAD_REQUEST
+            )
+        statuses = request.query_params.get('status', 'C').split(',')
+
+        try:
+            snapshot = analytics.load_latest_snapshot()
+        except analytics.SnapshotNotFound as e:
+            return Response(
+                {"error": str(e), "details": "Run `manage.py export_sales_snapshot` first"},
+                status=status.HTTP_503_SERVICE_UNAVAILABLE
+            )
+
+        report = analytics.build_sales_report(
+            snapshot, start=start, end=end, statuses=statuses, top=max(top, 1)
+        )
+        self._attach_names(report)
+        return Response(report)
+
+    def _parse_date(self, value):
+        return date.fromisoformat(value) if value else None
+
+    def _attach_names(self, report):
+        # Only the handful of ids present in the report are looked up
+        lookups = (
+            ('revenue_by_vendor', 'vendor_id', 'vendor', Vendor.objects.all(), 'business_name'),
+            ('revenue_by_category', 'category_id', 'category', Category.objects.all(), 'name'),
+            ('top_products', 'product_id', 'name', Product.objects.all(), 'name'),
+        )
+        for section, key, label, queryset, field in lookups:
+            ids = [row[key] for row in report[section] if row[key] is not None]
+            names = dict(queryset.filter(pk__in=ids).values_list('pk', field))
+            for row in report[section]:
+                row[label] = names.get(row[key])
+
+
+# ==================== Export Views ====================
+from django.http import StreamingHttpResponse
+from . import exports
+
+
+class DataExportView(APIView):
+    """
+    Stream orders, customers or products as CSV or JSONL.
+    Accepts the same filters as the matching admin list view, plus
+    ``output=csv|jsonl``.
+    """
+    permission_classes = [permissions.IsAdminUser]
+    use_replica = True
+    export_kind = None
+
+    def get(self, request):
+        export_format = request.query_params.get('output', 'csv')
+        if export_format not in exports.EXPORT_FORMATS:
+            return Response(
+                {"error": f"output must be one of {', '.join(exports.EXPORT_FORMATS)}"},
+                status=status.HTTP_400_BAD_REQUEST
+            )
+
+        response = StreamingHttpResponse(
+            exports.stream_export(self.export_kind, export_format, request.query_params),
+            content_type=exports.content_type_for(export_format),
+        )
+        filename = f"{self.export_kind}-{timezone.now():%Y%m%d-%H%M%S}.{export_format}"
+        response['Content-Disposition'] = f'attachment; filename="{filename}"'
+        return response
+
+
+class OrderExportView(DataExportView):
+    export_kind = 'orders'
+
+
+class CustomerExportView(DataExportView):
+    export_kind = 'customers'
+
+
+class ProductExportView(DataExportView):
+    export_kind = 'products'
+
+
+# ==================== Bulk Import Views ====================
+import json
+from rest_framework.exceptions import PermissionDenied
+from . import imports
+
+
+class ProductImportView(APIView):
+    """
+    Upload a CSV or JSONL file of products (multipart field ``file``).
+    Progress is streamed back as one JSON line per batch, including
+    per-row validation errors, followed by a final ``done`` line.
+    Staff may import for any vendor, vendors only into their own store.
+    """
+    permission_classes = [permissions.IsAuthenticated]
+    parser_classes = [MultiPartParser, FormParser]
+
+    def post(self, request):
+        if not (request.user.is_staff or request.user.is_vendor):
+            raise PermissionDenied("Only staff and vendors can import products")
+
+        upload = request.FILES.get('file')
+        if not upload:
+            return Response(
+                {"error": "A CSV or JSONL file is required"},
+                status=status.HTTP_400_BAD_REQUEST
+            )
+
+        import_format = request.data.get('import_format') or imports.detect_format(upload.name)
+        if import_format not in imports.IMPORT_FORMATS:
+            return Response(
+                {"error": f"import_format must be one of {', '.join(imports.IMPORT_FORMATS)}"},
+                status=status.HTTP_400_BAD_REQUEST
+            )
+
+        try:
+            batch_size = int(request.data.get('batch_size', imports.DEFAULT_BATCH_SIZE))
+        except ValueError:
+            return Response(
+                {"error": "batch_size must be an integer"},
+                status=status.HTTP_400_BAD_REQUEST
+            )
+
+        # Vendors import into their own store; staff may pick one
+        if request.user.is_staff:
+            try:
+                vendor = int(request.data['vendor']) if request.data.get('vendor') else None
+            except ValueError:
+                return Response(
+                    {"error": "vendor must be an integer"},
+                    status=status.HTTP_400_BAD_REQUEST
+                )
+        else:
+            vendor = request.user.pk
+
+        importer = imports.ProductImporter(
+            vendor=vendor,
+            batch_size=max(1, min(batch_size, 5000)),
+            dry_run=str(request.data.get('dry_run', '')).lower() in ('1', 'true'),
+            lock_vendor=not request.user.is_staff,
+        )
+        rows = imports.read_rows(imports.open_text(upload.file), import_format)
+        events = (json.dumps(event, default=str) + '\n' for event in importer.run(rows))
+        return StreamingHttpResponse(events, content_type='application/x-ndjson')
+
+
+# ==================== Bulk Update Views ====================
+from . import bulk_updates
+
+
+class ProductBulkUpdateView(APIView):
+    """
+    Update price, discount_price, stock and active for many SKUs at once:
+    ``{"items": [{"sku": "...", "stock": 10, "updated": "<timestamp>"}, ...]}``.
+    Staff can update any product, vendors only their own.
+    """
+    permission_classes = [permissions.IsAuthenticated]
+
+    def post(self, request):
+        user = request.user
+        if not (user.is_staff or user.is_vendor):
+            raise PermissionDenied("Only staff and vendors can update products")
+
+        items = request.data.get('items') if isinstance(request.data, dict) else request.data
+        if not isinstance(items, list) or not items:
+            return Response(
+                {"error": "items must be a non-empty list"},
+                status=status.HTTP_400_BAD_REQUEST
+            )
+
+        vendor_id = None if user.is_staff else user.pk
+        results = bulk_updates.apply_bulk_update(items, vendor_id=vendor_id)
+        return Response({
+            'summary': bulk_updates.summarize(results),
+            'results': results,
+        })
+
+
+
+from .serializers import NotificationBroadcastSerializer
+from . import fanout
+
+
+class NotificationBroadcastView(APIView):
+    """
+    Queue a notification for a whole audience (all users, customers,
+    vendors, staff, buyers of a product or a list of users).  The fan-out
+    runs in the background; poll the returned job for progress (job state
+    lives in the cache, which must be shared between workers).
+    """
+    permission_classes = [permissions.IsAdminUser]
+
+    def post(self, request):
+        serializer = NotificationBroadcastSerializer(data=request.data)
+        serializer.is_valid(raise_exception=True)
+        job = fanout.submit_fan_out(**serializer.validated_data)
+        return Response(job, status=status.HTTP_202_ACCEPTED)
+
+
+class NotificationBroadcastStatusView(APIView):
+    permission_classes = [permissions.IsAdminUser]
+
+    def get(self, request, job_id):
+        job = fanout.get_job(job_id)
+        if job is None:
+            return Response({'error': 'Job not found'}, status=status.HTTP_404_NOT_FOUND)
+        return Response(job)
+
+
+
+# ==================== Notification Stream ====================
+import asyncio
+import time
+from asgiref.sync import sync_to_async
+from django.core.handlers.asgi import ASGIRequest
+from django.http import JsonResponse
+from rest_framework_simplejwt.exceptions import TokenError
+from rest_framework_simplejwt.settings import api_settings as jwt_settings
+from rest_framework_simplejwt.tokens import AccessToken
+from .authentication import ais_token_revoked
+
+
+async def _notification_events(user_id, expires_at):
+    queue = notifications.broker.subscribe(user_id)
+    heartbeat = notifications.heartbeat_interval()
+    try:
+        count = await sync_to_async(notifications.unread_count)(user_id)
+        yield notifications.format_event('count', {'count': count})
+        # End the stream when the token expires; EventSource reconnects with a fresh one
+        while time.time() < expires_at:
+            try:
+                event, data = await asyncio.wait_for(queue.get(), timeout=heartbeat)
+            except asyncio.TimeoutError:
+                event = 'count'
+                data = {'count': await sync_to_async(notifications.unread_count)(user_id)}
+            yield notifications.format_event(event, data)
+    finally:
+        notifications.broker.unsubscribe(user_id, queue)
+
+
+async def notification_stream(request):
+    """
+    Server-sent events with new notifications and unread counts.  EventSource
+    cannot send headers, so the access token may be passed as ``?token=``.
+    Needs the ASGI app (ecom/asgi.py); under WSGI every open stream would pin
+    a worker.
+    """
+    if not isinstance(request, ASGIRequest):
+        return JsonResponse({'error': 'Notification streaming requires the ASGI server'}, status=501)
+
+    raw_token = request.GET.get('token')
+    auth_header = request.headers.get('Authorization', '')
+    if not raw_token and auth_header.startswith('Bearer '):
+        raw_token = auth_header[len('Bearer '):]
+    if not raw_token:
+        # AccessToken(None) would mint a new, userless token rather than fail
+        return JsonResponse({'error': 'Authentication credentials were not provided'}, status=401)
+    try:
+        token = AccessToken(raw_token)
+    except TokenError:
+        return JsonResponse({'error': 'Invalid or expired token'}, status=401)
+    if jwt_settings.USER_ID_CLAIM not in token:
+        return JsonResponse({'error': 'Invalid or expired token'}, status=401)
+    if await ais_token_revoked(token):
+        return JsonResponse({'error': 'Token has been revoked'}, status=401)
+
+    response = StreamingHttpResponse(
+        _notification_events(token[jwt_settings.USER_ID_CLAIM], token['exp']),
+        content_type='text/event-stream',
+    )
+    response['Cache-Control'] = 'no-cache'
+    response['X-Accel-Buffering'] = 'no'
+    return response